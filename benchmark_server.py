@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+HTTP load benchmark for the price tracker API
+Drives a running server with keep-alive client threads and reports
+throughput and latency percentiles, e.g. to compare the development
+server against SERVER_WORKERS pre-fork mode
+"""
+
+import argparse
+import http.client
+import json
+import sys
+import threading
+import time
+from urllib.parse import urlsplit
+
+def login(host, port, username, password):
+    """Fetch a bearer token from /api/auth/login"""
+    conn = http.client.HTTPConnection(host, port, timeout=30)
+    conn.request("POST", "/api/auth/login", json.dumps({"username": username, "password": password}),
+                 {"Content-Type": "application/json"})
+    response = conn.getresponse()
+    body = json.loads(response.read())
+    conn.close()
+    if response.status != 200:
+        raise RuntimeError(f"login failed: {response.status} {body}")
+    return body["token"]
+
+def client(host, port, paths, headers, deadline, latencies, errors):
+    """One keep-alive connection issuing requests round-robin over ``paths`` until ``deadline``"""
+    conn = http.client.HTTPConnection(host, port, timeout=30)
+    i = 0
+    while time.perf_counter() < deadline:
+        path = paths[i % len(paths)]
+        i += 1
+        start = time.perf_counter()
+        try:
+            conn.request("GET", path, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            if response.status >= 400:
+                errors.append(response.status)
+        except (OSError, http.client.HTTPException) as e:
+            errors.append(type(e).__name__)
+            conn.close()
+            conn = http.client.HTTPConnection(host, port, timeout=30)
+            continue
+        latencies.append(time.perf_counter() - start)
+    conn.close()
+
+def percentile(ordered, q):
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--url", default="http://127.0.0.1:5000", help="server base URL")
+    parser.add_argument("--paths", default="/api/products/e1,/api/search/suggest?q=lap,/api/ready",
+                        help="comma-separated GET paths, requested round-robin")
+    parser.add_argument("--concurrency", type=int, default=16, help="client threads (one connection each)")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds of load after warm-up")
+    parser.add_argument("--warmup", type=float, default=2.0)
+    parser.add_argument("--username", default="admin")
+    parser.add_argument("--password", default="admin123")
+    args = parser.parse_args()
+
+    url = urlsplit(args.url)
+    host, port = url.hostname, url.port or 80
+    headers = {"Authorization": f"Bearer {login(host, port, args.username, args.password)}"}
+    paths = [path.strip() for path in args.paths.split(",") if path.strip()]
+
+    results = {}
+    for phase, seconds in (("warmup", args.warmup), ("measured", args.duration)):
+        latencies, errors = [], []
+        deadline = time.perf_counter() + seconds
+        threads = [threading.Thread(target=client, args=(host, port, paths, headers, deadline, latencies, errors))
+                   for _ in range(args.concurrency)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        results[phase] = (latencies, errors, time.perf_counter() - start)
+
+    latencies, errors, elapsed = results["measured"]
+    if not latencies:
+        print(f"❌ No successful requests ({len(errors)} errors)")
+        return 1
+    ordered = sorted(latencies)
+    print(f"📏 {args.concurrency} connections x {args.duration:.0f}s against {args.url}")
+    print(f"⚡ {len(ordered) / elapsed:,.0f} req/s ({len(ordered)} requests, {len(errors)} errors)")
+    print(f"⏱️  p50 {percentile(ordered, 0.50) * 1000:.2f} ms   p95 {percentile(ordered, 0.95) * 1000:.2f} ms   "
+          f"p99 {percentile(ordered, 0.99) * 1000:.2f} ms")
+    return 1 if errors else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
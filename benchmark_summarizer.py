@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Summarizer inference profile benchmark
+Compares an optimized profile (int8 or distilled) against the fp32 baseline:
+per-text latency on CPU and ROUGE-L agreement with the baseline summaries
+"""
+
+import argparse
+import json
+import statistics
+import sys
+import time
+from price_tracker_config import CONFIG
+from price_tracker_models import load_summarizer, parse_cpu_list
+
+SAMPLE_TEXTS = [
+    "I bought this wireless mouse for my home office after my old one started double clicking. "
+    "Setup took less than a minute, the receiver stores inside the battery compartment, and the "
+    "scroll wheel is smooth without feeling loose. Battery life has been excellent so far: three "
+    "weeks of daily use and the indicator still shows full. My only complaint is that the side "
+    "buttons are a little too easy to press by accident when picking the mouse up.",
+    "The running shoes fit true to size and the cushioning is noticeably softer than my previous "
+    "pair. After about eighty kilometres the outsole shows very little wear, although the upper has "
+    "started to crease near the toe box. They breathe well in warm weather but are not water "
+    "resistant at all, so puddles mean wet socks. For the price they are a solid everyday trainer, "
+    "though serious racers may want something lighter.",
+    "This blender handles frozen fruit and ice without stalling, which my old one never managed. "
+    "It is loud, louder than expected, and the lid needs to be pressed down firmly or it rattles. "
+    "Cleaning is easy because the blade assembly comes out, and the jug is dishwasher safe. The "
+    "preset smoothie programme works well but the pulse button is positioned awkwardly. Overall it "
+    "is good value and has replaced two other appliances in our kitchen.",
+    "The desk lamp has three colour temperatures and five brightness levels, and it remembers the "
+    "last setting when switched back on. The arm is sturdy and holds its position, but the base is "
+    "wide and takes up more desk space than the photos suggest. The built-in USB port charges a "
+    "phone slowly. Light is even with no visible flicker, which has helped with eye strain during "
+    "long evenings of reading and work.",
+    "These noise cancelling headphones are comfortable for long flights and the cancellation removes "
+    "most engine rumble, though voices still come through. Sound quality is warm with strong bass, "
+    "perhaps too strong for classical music. The companion app offers an equalizer that fixes this. "
+    "Battery lasts roughly thirty hours. The carrying case is bulky, and the touch controls "
+    "occasionally register a tap when adjusting the fit.",
+    "The cookware set arrived well packed and every pan sits flat on our induction hob. The "
+    "non-stick coating releases eggs without oil, but the manufacturer warns against metal utensils "
+    "and high heat, so longevity remains to be seen. Handles stay cool on the stovetop but get hot "
+    "in the oven. Lids fit snugly. The frying pan is slightly smaller than listed, which was a minor "
+    "disappointment given how often we use it.",
+]
+
+def rouge_l_f1(candidate: str, reference: str) -> float:
+    """ROUGE-L F1 over lowercase word tokens (longest common subsequence)"""
+    cand, ref = candidate.lower().split(), reference.lower().split()
+    if not cand or not ref:
+        return 0.0
+    previous = [0] * (len(ref) + 1)
+    for word in cand:
+        current = [0]
+        for j, ref_word in enumerate(ref):
+            current.append(previous[j] + 1 if word == ref_word else max(previous[j + 1], current[j]))
+        previous = current
+    lcs = previous[-1]
+    if lcs == 0:
+        return 0.0
+    precision, recall = lcs / len(cand), lcs / len(ref)
+    return 2 * precision * recall / (precision + recall)
+
+def time_summaries(pipe, texts, runs):
+    """Summarize each text ``runs`` times; returns (summaries, per-text latencies in seconds)"""
+    pipe(texts[0], max_length=130, min_length=30, do_sample=False, truncation=True)   # warm-up
+    summaries, latencies = [], []
+    for text in texts:
+        for _ in range(runs):
+            start = time.perf_counter()
+            summary = pipe(text, max_length=130, min_length=30, do_sample=False, truncation=True)
+            latencies.append(time.perf_counter() - start)
+        summaries.append(summary[0]['summary_text'])
+    return summaries, latencies
+
+def describe(name, latencies):
+    ordered = sorted(latencies)
+    p95 = ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))]
+    print(f"  {name:<10} median {statistics.median(ordered) * 1000:8.1f} ms   p95 {p95 * 1000:8.1f} ms")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--profile", choices=["int8", "distilled"], default="int8")
+    parser.add_argument("--model", default=CONFIG["summarizer_model"], help="fp32 baseline checkpoint")
+    parser.add_argument("--distilled-path", default=CONFIG["summarizer_distilled_path"])
+    parser.add_argument("--texts", help="JSON file with a list of texts (defaults to built-in product reviews)")
+    parser.add_argument("--runs", type=int, default=3, help="timed runs per text")
+    parser.add_argument("--threads", type=int, default=CONFIG["torch_num_threads"])
+    parser.add_argument("--cpus", default=CONFIG["torch_cpu_affinity"], help='CPU list to pin to, e.g. "0-3"')
+    parser.add_argument("--local-files-only", action="store_true", default=CONFIG["model_local_files_only"])
+    parser.add_argument("--min-speedup", type=float, default=0.0, help="exit non-zero below this speedup")
+    parser.add_argument("--min-rouge", type=float, default=0.0, help="exit non-zero below this mean ROUGE-L")
+    args = parser.parse_args()
+
+    texts = SAMPLE_TEXTS
+    if args.texts:
+        with open(args.texts, 'r') as f:
+            texts = [text for text in json.load(f) if len(text) >= 100]
+
+    options = dict(local_files_only=args.local_files_only, num_threads=args.threads,
+                   cpu_affinity=parse_cpu_list(args.cpus))
+    candidate_model = args.distilled_path if args.profile == "distilled" else args.model
+    if not candidate_model:
+        parser.error("--distilled-path (or SUMMARIZER_DISTILLED_PATH) is required for the distilled profile")
+
+    print(f"📏 Benchmarking {args.profile} against fp32 on {len(texts)} texts x {args.runs} runs")
+    baseline_summaries, baseline_latencies = time_summaries(load_summarizer(args.model, "fp32", **options),
+                                                            texts, args.runs)
+    summaries, latencies = time_summaries(load_summarizer(candidate_model, args.profile, **options),
+                                          texts, args.runs)
+
+    describe("fp32", baseline_latencies)
+    describe(args.profile, latencies)
+    speedup = statistics.median(baseline_latencies) / statistics.median(latencies)
+    scores = [rouge_l_f1(summary, reference) for summary, reference in zip(summaries, baseline_summaries)]
+    rouge = statistics.mean(scores)
+    print(f"⚡ Speedup (median latency): {speedup:.2f}x")
+    print(f"🎯 ROUGE-L agreement with fp32: mean {rouge:.3f}, min {min(scores):.3f}")
+
+    if speedup < args.min_speedup or rouge < args.min_rouge:
+        print("❌ Profile below the requested speedup/agreement thresholds")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
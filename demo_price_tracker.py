@@ -31,17 +31,9 @@ def demo_price_analysis():
         {"product_id": "f1", "date": "2025-08-20", "price": 2450}
     ]
     
-    # Convert to PriceData objects
+    # Append into the columnar price history store
     for entry in test_data:
-        product_id = entry['product_id']
-        if product_id not in agent.price_history:
-            agent.price_history[product_id] = []
-        
-        agent.price_history[product_id].append(PriceData(
-            product_id=product_id,
-            date=entry['date'],
-            price=entry['price']
-        ))
+        agent.price_history.add(entry['product_id'], entry['date'], entry['price'])
     
     # Show analysis results
     print("\n📊 Price Analysis Results:")
@@ -138,7 +130,7 @@ def demo_data_loading():
         # Show price range
         all_prices = []
         for product_data in agent.price_history.values():
-            all_prices.extend([p.price for p in product_data])
+            all_prices.extend(product_data.prices.tolist())
         
         print(f"   Price range: Rs. {min(all_prices):,} - Rs. {max(all_prices):,}")
         
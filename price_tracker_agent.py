@@ -14,42 +14,54 @@ Features:
 
 import json
 import asyncio
+import gzip
+import heapq
 import logging
+import multiprocessing
+import os
+import shutil
+import sqlite3
 import hashlib
-import hmac
-import base64
-import socket
+import sys
+import tempfile
 import threading
-from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Tuple
+import time
+import uuid
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, Union
 from dataclasses import dataclass
-from pathlib import Path
 import numpy as np
-import pandas as pd
-from sklearn.linear_model import LinearRegression
-from sklearn.preprocessing import StandardScaler
-import requests
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
-import openai
-from transformers import pipeline
-import spacy
 from cryptography.fernet import Fernet
 import jwt
 
+from price_tracker_config import CONFIG
+from price_tracker_storage import (
+    PriceHistoryStore,
+    PriceSeries,
+    SQLitePriceStore,
+    batch_trend_stats,
+    file_stamp,
+    iter_json_records,
+    iter_lines,
+    sqlite_path_from_url,
+    to_epoch_day
+)
+from price_tracker_retrieval import ProductCatalog, ProductSearchIndex, ProductVectorIndex, TieredCache
+from price_tracker_models import InsightBatcher, ModelManager, load_summarizer, parse_cpu_list, summarizer_model_id
+from price_tracker_bus import CommunicationManager, RemoteAgent, latency_summary
+from price_tracker_serving import serve
+
+# openai, transformers (torch) and spaCy are imported on first use inside LLMAgent,
+# so the analysis, storage and security paths stay cheap to import.
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Configuration
-CONFIG = {
-    "openai_api_key": "your-openai-api-key-here",
-    "jwt_secret": "your-jwt-secret-here",
-    "encryption_key": Fernet.generate_key(),
-    "port": 5000,
-    "host": "0.0.0.0"
-}
-
 # Initialize encryption
 cipher = Fernet(CONFIG["encryption_key"])
 
@@ -63,30 +75,164 @@ class PriceData:
     trend: str = "stable"
     confidence: float = 0.0
 
+class TokenStore:
+    """Active session tokens, evicted in expiry order under a hard cap"""
+    
+    def __init__(self, max_tokens: int = 100000, verify_ttl: float = 30):
+        self.max_tokens = max_tokens
+        self.verify_ttl = verify_ttl
+        self._expiry: Dict[str, float] = {}
+        self._heap: List[Tuple[float, str]] = []
+        self._verified: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self.expirations = 0
+        self.evictions = 0
+        self.verify_hits = 0
+        self.verify_misses = 0
+    
+    def _drop(self, token: str):
+        del self._expiry[token]
+        self._verified.pop(token, None)
+    
+    def _pop_earliest(self) -> Optional[Tuple[float, str]]:
+        # Heap entries for discarded or re-added tokens are stale and skipped
+        while self._heap:
+            expires_at, token = heapq.heappop(self._heap)
+            if self._expiry.get(token) == expires_at:
+                self._drop(token)
+                return expires_at, token
+        return None
+    
+    def _purge(self, now: float):
+        # Pop only entries that are already due, so a stale head never takes a live token with it
+        while self._heap and self._heap[0][0] <= now:
+            expires_at, token = heapq.heappop(self._heap)
+            if self._expiry.get(token) == expires_at:
+                self._drop(token)
+                self.expirations += 1
+    
+    def add(self, token: str, expires_at: float):
+        """Track ``token`` until ``expires_at`` (epoch seconds)"""
+        with self._lock:
+            self._purge(time.time())
+            if token not in self._expiry:
+                while len(self._expiry) >= self.max_tokens and self._pop_earliest() is not None:
+                    self.evictions += 1
+            self._expiry[token] = expires_at
+            heapq.heappush(self._heap, (expires_at, token))
+            if len(self._heap) > 2 * len(self._expiry) + 64:
+                self._heap = [(exp, tok) for tok, exp in self._expiry.items()]
+                heapq.heapify(self._heap)
+    
+    def discard(self, token: str):
+        with self._lock:
+            if token in self._expiry:
+                self._drop(token)
+    
+    def __contains__(self, token: str) -> bool:
+        with self._lock:
+            expires_at = self._expiry.get(token)
+            return expires_at is not None and expires_at > time.time()
+    
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._expiry)
+    
+    def is_verified(self, token: str) -> bool:
+        """True if ``token`` is active and its signature was checked within ``verify_ttl``"""
+        now = time.time()
+        with self._lock:
+            if self._verified.get(token, 0.0) > now:
+                self.verify_hits += 1
+                return True
+            self.verify_misses += 1
+            return False
+    
+    def mark_verified(self, token: str):
+        now = time.time()
+        with self._lock:
+            expires_at = self._expiry.get(token)
+            if expires_at is not None and self.verify_ttl > 0:
+                self._verified[token] = min(now + self.verify_ttl, expires_at)
+    
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.verify_hits + self.verify_misses
+            return {
+                "active_tokens": len(self._expiry),
+                "expirations": self.expirations,
+                "evictions": self.evictions,
+                "verify_cache_hits": self.verify_hits,
+                "verify_cache_misses": self.verify_misses,
+                "verify_cache_hit_rate": round(self.verify_hits / lookups, 3) if lookups else 0.0
+            }
+
 class SecurityManager:
     """Handles authentication, input sanitization, and encryption"""
     
+    TOKEN_LIFETIME = timedelta(hours=24)
+    
     def __init__(self):
-        self.active_tokens = set()
+        self.active_tokens = TokenStore(
+            max_tokens=CONFIG["max_active_tokens"],
+            verify_ttl=CONFIG["token_verify_cache_ttl"]
+        )
+        
+        # Server worker processes share issued tokens through SQLite, so any worker accepts them
+        self._sessions = None
+        self._sessions_lock = threading.Lock()
+        if CONFIG["session_db"]:
+            self._sessions = sqlite3.connect(CONFIG["session_db"], check_same_thread=False, isolation_level=None)
+            self._sessions.execute("PRAGMA journal_mode=WAL")
+            self._sessions.execute(
+                "CREATE TABLE IF NOT EXISTS sessions (token_hash TEXT PRIMARY KEY, expires_at REAL NOT NULL)"
+            )
+    
+    @staticmethod
+    def _token_hash(token: str) -> str:
+        return hashlib.sha256(token.encode("utf-8")).hexdigest()
+    
+    def _load_shared_session(self, token: str) -> bool:
+        """Adopt a token issued by another worker process; False if it was never issued"""
+        if self._sessions is None:
+            return False
+        with self._sessions_lock:
+            row = self._sessions.execute("SELECT expires_at FROM sessions WHERE token_hash = ?",
+                                         (self._token_hash(token),)).fetchone()
+        if row is None or row[0] <= time.time():
+            return False
+        self.active_tokens.add(token, row[0])
+        return True
     
     def authenticate_user(self, username: str, password: str) -> Optional[str]:
         """Authenticate user and return JWT token"""
         # In production, use proper user database
         if username == "admin" and password == "admin123":
             token = jwt.encode(
-                {"username": username, "exp": datetime.utcnow() + timedelta(hours=24)},
+                {"username": username, "exp": datetime.utcnow() + self.TOKEN_LIFETIME},
                 CONFIG["jwt_secret"],
                 algorithm="HS256"
             )
-            self.active_tokens.add(token)
+            expires_at = time.time() + self.TOKEN_LIFETIME.total_seconds()
+            self.active_tokens.add(token, expires_at)
+            if self._sessions is not None:
+                with self._sessions_lock:
+                    self._sessions.execute("DELETE FROM sessions WHERE expires_at <= ?", (time.time(),))
+                    self._sessions.execute("INSERT OR REPLACE INTO sessions (token_hash, expires_at) VALUES (?, ?)",
+                                           (self._token_hash(token), expires_at))
             return token
         return None
     
     def verify_token(self, token: str) -> bool:
         """Verify JWT token"""
+        if self.active_tokens.is_verified(token):
+            return True
         try:
             payload = jwt.decode(token, CONFIG["jwt_secret"], algorithms=["HS256"])
-            return token in self.active_tokens
+            if token not in self.active_tokens and not self._load_shared_session(token):
+                return False
+            self.active_tokens.mark_verified(token)
+            return True
         except jwt.ExpiredSignatureError:
             self.active_tokens.discard(token)
             return False
@@ -111,114 +257,672 @@ class SecurityManager:
 class LLMAgent:
     """LLM-powered agent for natural language processing and analysis"""
     
+    INSIGHT_MODEL = "gpt-3.5-turbo"
+    INSIGHT_SYSTEM_PROMPT = "You are a price analysis expert. Provide insights about price trends."
+    
     def __init__(self):
-        self.openai_client = openai.OpenAI(api_key=CONFIG["openai_api_key"])
-        self.nlp_pipeline = pipeline("summarization", model="facebook/bart-large-cnn")
+        import openai
+        
+        self.openai_client = openai.OpenAI(api_key=CONFIG["openai_api_key"], base_url=CONFIG["openai_base_url"])
+        self.insight_batcher = InsightBatcher(
+            self.openai_client,
+            self.INSIGHT_MODEL,
+            self.INSIGHT_SYSTEM_PROMPT,
+            window=CONFIG["llm_batch_window_ms"] / 1000,
+            max_wait=CONFIG["llm_batch_max_wait_ms"] / 1000,
+            max_batch=CONFIG["llm_batch_size"],
+            timeout=CONFIG["agent_timeout"]
+        )
+        self.insight_cache = TieredCache(
+            max_entries=CONFIG["llm_cache_size"],
+            ttl=CONFIG["llm_cache_ttl"],
+            disk_path=CONFIG["llm_cache_path"]
+        )
+        
+        # Summarization and NER models are loaded on first use and unloaded when idle
+        self.models = ModelManager(
+            idle_timeout=CONFIG["model_idle_timeout"],
+            memory_limit=int(CONFIG["model_memory_limit_mb"] * 2**20)
+        )
+        self.models.register("summarizer", self._load_summarizer, size_bytes=1600 * 2**20)
+        self.models.register("ner", self._load_ner, size_bytes=50 * 2**20)
+        if CONFIG["model_warmup"]:
+            self.models.warm_up(*CONFIG["model_warmup"])
         
-        # Load spaCy model for NER
+        # Summaries and entities are cached by content hash; keys carry the model that produced them
+        self.nlp_cache = TieredCache(
+            max_entries=CONFIG["nlp_cache_size"],
+            ttl=CONFIG["nlp_cache_ttl"],
+            disk_path=CONFIG["nlp_cache_path"]
+        )
+        self.nlp_model_ids = {
+            "summary": summarizer_model_id(CONFIG["summarizer_profile"], CONFIG["summarizer_model"],
+                                           CONFIG["summarizer_distilled_path"]),
+            "entities": CONFIG["ner_model"]
+        }
+        for kind, model_id in self.nlp_model_ids.items():
+            if self.nlp_cache.peek(f"model:{kind}") != model_id:
+                self.invalidate_nlp_cache(kind)
+    
+    def _nlp_key(self, kind: str, text: str) -> str:
+        return f"{kind}:" + TieredCache.make_key(self.nlp_model_ids[kind], text)
+    
+    def invalidate_nlp_cache(self, kind: Optional[str] = None):
+        """Drop cached summaries and/or entities, e.g. after swapping a model"""
+        for name in [kind] if kind else list(self.nlp_model_ids):
+            self.nlp_cache.clear(prefix=f"{name}:")
+            self.nlp_cache.set(f"model:{name}", self.nlp_model_ids[name], ttl=10 * 365 * 86400)
+    
+    @staticmethod
+    def _load_summarizer():
+        profile = CONFIG["summarizer_profile"]
+        return load_summarizer(
+            CONFIG["summarizer_distilled_path"] if profile == "distilled" else CONFIG["summarizer_model"],
+            profile=profile,
+            local_files_only=CONFIG["model_local_files_only"],
+            num_threads=CONFIG["torch_num_threads"],
+            cpu_affinity=parse_cpu_list(CONFIG["torch_cpu_affinity"])
+        )
+    
+    @staticmethod
+    def _load_ner():
+        import spacy
         try:
-            self.nlp = spacy.load("en_core_web_sm")
+            return spacy.load(CONFIG["ner_model"])
         except OSError:
-            logger.warning("spaCy model not found. Install with: python -m spacy download en_core_web_sm")
-            self.nlp = None
+            logger.warning(f"spaCy model not found. Install with: python -m spacy download {CONFIG['ner_model']}")
+            return None
     
-    def analyze_price_trends(self, price_data: List[PriceData]) -> str:
-        """Analyze price trends using LLM"""
-        try:
-            # Create summary of price data
-            summary = f"Product prices over time: {len(price_data)} data points. "
-            summary += f"Price range: {min(p.price for p in price_data)} to {max(p.price for p in price_data)}. "
-            
-            # Calculate trend
-            prices = [p.price for p in price_data]
-            if len(prices) > 1:
-                trend = "increasing" if prices[-1] > prices[0] else "decreasing" if prices[-1] < prices[0] else "stable"
-                summary += f"Overall trend: {trend}."
-            
-            # Use LLM for analysis
-            response = self.openai_client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": "You are a price analysis expert. Provide insights about price trends."},
-                    {"role": "user", "content": f"Analyze this price data: {summary}"}
-                ],
-                max_tokens=150
-            )
-            
-            return response.choices[0].message.content
-        except Exception as e:
-            logger.error(f"LLM analysis failed: {e}")
-            return "Price trend analysis unavailable"
+    @property
+    def nlp_pipeline(self):
+        """Hugging Face summarization pipeline (loaded on first access)"""
+        return self.models.get("summarizer")
+    
+    @property
+    def nlp(self):
+        """spaCy NER pipeline (loaded on first access, None if not installed)"""
+        return self.models.get("ner")
+    
+    def analyze_price_trends(self, price_data: PriceSeries, timeout: Optional[float] = None) -> str:
+        """Analyze price trends using LLM (``timeout`` bounds the API call, in seconds; errors propagate)"""
+        # Create summary of price data
+        prices = price_data.prices
+        summary = f"Product prices over time: {len(prices)} data points. "
+        summary += f"Price range: {prices.min():g} to {prices.max():g}. "
+        
+        # Calculate trend
+        if len(prices) > 1:
+            trend = "increasing" if prices[-1] > prices[0] else "decreasing" if prices[-1] < prices[0] else "stable"
+            summary += f"Overall trend: {trend}."
+        
+        # The summary only changes when new prices arrive, so identical prompts are served from cache
+        cache_key = TieredCache.make_key(self.INSIGHT_MODEL, self.INSIGHT_SYSTEM_PROMPT, summary)
+        cached = self.insight_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
+        # Use LLM for analysis, micro-batched with concurrent requests when enabled
+        if CONFIG["llm_batch_window_ms"] > 0:
+            insight = self.insight_batcher.submit(summary).result(timeout=timeout)
+        else:
+            insight = self.insight_batcher.request_one(summary, timeout=timeout)
+        self.insight_cache.set(cache_key, insight)
+        return insight
     
     def extract_entities(self, text: str) -> List[str]:
         """Extract named entities using spaCy NER"""
-        if not self.nlp:
-            return []
+        return [entity["text"] for entity in self.extract_entities_many([text])[0]]
+    
+    # Components NER depends on; everything else (parser, tagger, lemmatizer, ...) is skipped
+    NER_COMPONENTS = ("tok2vec", "ner", "entity_ruler")
+    
+    def extract_entities_many(self, texts: Iterable[str], n_process: Optional[int] = None,
+                              batch_size: Optional[int] = None) -> List[List[Dict]]:
+        """Extract entities (text, label, character span) from many texts with nlp.pipe"""
+        texts = list(texts)
+        results: List[Optional[List[Dict]]] = [self.nlp_cache.get(self._nlp_key("entities", text)) for text in texts]
+        pending = [i for i, result in enumerate(results) if result is None]
+        if not pending:
+            return results
+        
+        nlp = self.nlp
+        if not nlp:
+            return [result if result is not None else [] for result in results]
         
-        doc = self.nlp(text)
-        entities = [ent.text for ent in doc.ents]
-        return entities
+        disable = [name for name in nlp.pipe_names if name not in self.NER_COMPONENTS]
+        docs = nlp.pipe(
+            [texts[i] for i in pending],
+            disable=disable,
+            n_process=n_process or CONFIG["ner_processes"],
+            batch_size=batch_size or CONFIG["ner_batch_size"]
+        )
+        for i, doc in zip(pending, docs):
+            results[i] = [{"text": ent.text, "label": ent.label_, "start": ent.start_char, "end": ent.end_char}
+                          for ent in doc.ents]
+            self.nlp_cache.set(self._nlp_key("entities", texts[i]), results[i])
+        return results
     
     def summarize_text(self, text: str) -> str:
         """Summarize text using Hugging Face pipeline"""
+        return self.summarize_many([text])[0]
+    
+    @staticmethod
+    def _token_lengths(pipe, texts: List[str]) -> List[int]:
+        tokenizer = getattr(pipe, "tokenizer", None)
+        if tokenizer is None:
+            return [len(text) for text in texts]
+        encoded = tokenizer(texts, truncation=True)["input_ids"]
+        return [len(ids) for ids in encoded]
+    
+    def summarize_many(self, texts: List[str], batch_size: Optional[int] = None) -> List[str]:
+        """Summarize many texts in batches of similar token length, in input order"""
+        batch_size = max(1, batch_size or CONFIG["summarizer_batch_size"])
+        results: List[Optional[str]] = [
+            text if len(text) < 100 else self.nlp_cache.get(self._nlp_key("summary", text)) for text in texts
+        ]
+        pending = [i for i, result in enumerate(results) if result is None]
+        if not pending:
+            return results
+        
         try:
-            if len(text) < 100:
-                return text
-            
-            summary = self.nlp_pipeline(text, max_length=130, min_length=30, do_sample=False)
-            return summary[0]['summary_text']
+            pipe = self.nlp_pipeline
+            lengths = self._token_lengths(pipe, [texts[i] for i in pending])
         except Exception as e:
             logger.error(f"Summarization failed: {e}")
-            return text[:100] + "..."
+            for i in pending:
+                results[i] = texts[i][:100] + "..."
+            return results
+        
+        # Sorting by token length keeps padding inside each batch to a minimum
+        pending = [i for _, i in sorted(zip(lengths, pending))]
+        for start in range(0, len(pending), batch_size):
+            batch = pending[start:start + batch_size]
+            try:
+                summaries = pipe([texts[i] for i in batch], max_length=130, min_length=30, do_sample=False,
+                                 truncation=True, batch_size=len(batch))
+                for i, summary in zip(batch, summaries):
+                    results[i] = summary['summary_text']
+                    self.nlp_cache.set(self._nlp_key("summary", texts[i]), results[i])
+            except Exception as e:
+                logger.error(f"Summarization failed: {e}")
+                for i in batch:
+                    results[i] = texts[i][:100] + "..."
+        return results
+    
+    async def handle_message(self, message_data: Dict):
+        """Serve bus requests: ``summarize``, ``summarize_many``, ``extract_entities`` and ``entities_many``"""
+        message = message_data["message"]
+        kind = message.get("type")
+        if kind == "summarize":
+            return await asyncio.to_thread(self.summarize_text, message["text"])
+        if kind == "summarize_many":
+            return await asyncio.to_thread(self.summarize_many, message["texts"])
+        if kind == "extract_entities":
+            return await asyncio.to_thread(self.extract_entities, message["text"])
+        if kind == "entities_many":
+            return await asyncio.to_thread(self.extract_entities_many, message["texts"])
+        return {"error": f"Unsupported message type {kind!r}"}
+
+class InsightJobManager:
+    """Runs LLM insight requests as background jobs with bounded concurrency"""
+    
+    def __init__(self, llm_agent: "LLMAgent", max_workers: int = 10, timeout: float = 30,
+                 max_pending: int = 1000, retention: float = 300, db_path: str = ""):
+        self.llm_agent = llm_agent
+        self.timeout = timeout
+        self.max_pending = max_pending
+        self.retention = retention
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm-insight")
+        self._jobs: Dict[str, Dict] = {}
+        self._cond = threading.Condition()
+        
+        self._db = None
+        self._db_lock = threading.Lock()
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None, timeout=10)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS insight_jobs (id TEXT PRIMARY KEY, state TEXT NOT NULL, finished_at REAL)"
+            )
+    
+    def _prune(self, now: float):
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job["finished_at"] is not None and now - job["finished_at"] > self.retention]
+        for job_id in expired:
+            del self._jobs[job_id]
+        if self._db is not None:
+            with self._db_lock:
+                self._db.execute("DELETE FROM insight_jobs WHERE finished_at < ?", (now - self.retention,))
+    
+    def _publish(self, state: Dict):
+        if self._db is not None:
+            with self._db_lock:
+                self._db.execute("INSERT OR REPLACE INTO insight_jobs (id, state, finished_at) VALUES (?, ?, ?)",
+                                 (state["id"], json.dumps(state), state["finished_at"]))
+    
+    def _load_shared(self, job_id: str) -> Optional[Dict]:
+        """State of a job started by another process (None if unknown or not shared)"""
+        if self._db is None:
+            return None
+        with self._db_lock:
+            row = self._db.execute("SELECT state FROM insight_jobs WHERE id = ?", (job_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+    
+    def submit(self, product_id: str, price_data: PriceSeries) -> Optional[str]:
+        """Queue an insight job; returns its ID, or None if the queue is full"""
+        now = time.time()
+        with self._cond:
+            self._prune(now)
+            pending = sum(1 for job in self._jobs.values() if job["finished_at"] is None)
+            if pending >= self.max_pending:
+                return None
+            job_id = uuid.uuid4().hex
+            job = self._jobs[job_id] = {
+                "id": job_id,
+                "product_id": product_id,
+                "status": "pending",
+                "llm_insights": None,
+                "error": None,
+                "created_at": now,
+                "finished_at": None
+            }
+            state = dict(job)
+        self._publish(state)
+        self._executor.submit(self._run, job, price_data)
+        return job_id
+    
+    def _run(self, job: Dict, price_data: PriceSeries):
+        with self._cond:
+            job["status"] = "running"
+            state = dict(job)
+        self._publish(state)
+        error = None
+        try:
+            insight = self.llm_agent.analyze_price_trends(price_data, timeout=self.timeout)
+            status = "done"
+        except Exception as e:
+            logger.error(f"Insight job {job['id']} failed: {e}")
+            insight, status, error = None, "failed", str(e) or type(e).__name__
+        with self._cond:
+            job["llm_insights"] = insight
+            job["status"] = status
+            job["error"] = error
+            job["finished_at"] = time.time()
+            state = dict(job)
+            self._cond.notify_all()
+        self._publish(state)
+    
+    def get(self, job_id: str) -> Optional[Dict]:
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job:
+                return dict(job)
+        return self._load_shared(job_id)
+    
+    def wait(self, job_id: str, timeout: Optional[float] = None) -> Optional[Dict]:
+        """Block until the job finishes (or ``timeout`` passes) and return its state"""
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                self._cond.wait_for(lambda: job["finished_at"] is not None, timeout=timeout)
+                return dict(job)
+        
+        # Started by another process: poll the shared table
+        deadline = None if timeout is None else time.monotonic() + timeout
+        state = self._load_shared(job_id)
+        while state is not None and state["finished_at"] is None:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                break
+            time.sleep(0.1 if remaining is None else min(0.1, remaining))
+            state = self._load_shared(job_id)
+        return state
+    
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+# Per-process state of WorkerPool workers, set up by _init_pool_worker
+_pool_state: Dict = {}
+
+def _init_pool_worker(snapshot_path: str, warm_models: Tuple[str, ...]):
+    """Pool worker initializer: map the price snapshot and load models before the first task"""
+    _pool_state["snapshot_path"] = snapshot_path
+    _pool_price_agent()
+    if warm_models:
+        _pool_llm_agent().models.warm_up(*warm_models)
+
+def _pool_price_agent() -> "PriceAnalysisAgent":
+    # Remap when the parent has rewritten (replaced) the snapshot since this worker last looked
+    path = _pool_state.get("snapshot_path")
+    stamp = file_stamp(path) if path else None
+    if "price_agent" not in _pool_state or _pool_state.get("snapshot_stamp") != stamp:
+        agent = PriceAnalysisAgent()
+        if stamp is not None:
+            agent.load_snapshot(path)
+        _pool_state["price_agent"], _pool_state["snapshot_stamp"] = agent, stamp
+    return _pool_state["price_agent"]
+
+def _pool_llm_agent() -> "LLMAgent":
+    if "llm_agent" not in _pool_state:
+        _pool_state["llm_agent"] = LLMAgent()
+    return _pool_state["llm_agent"]
+
+def _pool_ready() -> int:
+    time.sleep(0.05)                                         # keep this worker busy so the others get one too
+    return os.getpid()
+
+def pool_analyze_batch(product_ids: Optional[List[str]], category: Optional[str]) -> List[Dict]:
+    return _pool_price_agent().analyze_batch(product_ids, category)
+
+def pool_summarize_many(texts: List[str]) -> List[str]:
+    return _pool_llm_agent().summarize_many(texts)
+
+def pool_extract_entities_many(texts: List[str]) -> List[List[Dict]]:
+    return _pool_llm_agent().extract_entities_many(texts)
+
+class WorkerPool:
+    """Process pool for CPU-bound analysis and NLP work, off the request threads"""
+    
+    def __init__(self, workers: int, max_pending: int = 256, timeout: float = 30, snapshot_path: str = "",
+                 warm_models: Iterable[str] = (), start_method: Optional[str] = None):
+        from concurrent.futures import ProcessPoolExecutor
+        
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.snapshot_path = snapshot_path
+        self._executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context(start_method or CONFIG["agent_start_method"]),
+            initializer=_init_pool_worker,
+            initargs=(snapshot_path, tuple(warm_models))
+        )
+        self._lock = threading.Lock()
+        self._pending = 0
+        self.submitted = 0
+        self.rejected = 0
+        self.completed = 0
+        self.failed = 0
+        self.timeouts = 0
+        self._latencies: "deque[float]" = deque(maxlen=1024)
+    
+    def warm_up(self) -> List[int]:
+        """Start every worker now instead of on first use; returns their PIDs"""
+        futures = [self._executor.submit(_pool_ready) for _ in range(self.workers)]
+        return sorted({future.result() for future in futures})
+    
+    def _done(self, started: float, future: Future):
+        with self._lock:
+            self._pending -= 1
+            if future.cancelled() or future.exception() is not None:
+                self.failed += 1
+            else:
+                self.completed += 1
+                self._latencies.append(time.monotonic() - started)
+    
+    def submit(self, fn: Callable, *args) -> Optional[Future]:
+        """Queue ``fn(*args)`` on a worker; None if the pool is saturated"""
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.rejected += 1
+                return None
+            self._pending += 1
+            self.submitted += 1
+        started = time.monotonic()
+        try:
+            future = self._executor.submit(fn, *args)
+        except Exception:
+            with self._lock:
+                self._pending -= 1
+            raise
+        future.add_done_callback(lambda future: self._done(started, future))
+        return future
+    
+    def result(self, future: Future, timeout: Optional[float] = None):
+        """Wait for a submitted task; raises TimeoutError after the task timeout"""
+        try:
+            return future.result(timeout=self.timeout if timeout is None else timeout)
+        except TimeoutError:
+            future.cancel()                                  # only helps if it hasn't started yet
+            with self._lock:
+                self.timeouts += 1
+            raise
+    
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "pending": self._pending,
+                "max_pending": self.max_pending,
+                "submitted": self.submitted,
+                "rejected": self.rejected,
+                "completed": self.completed,
+                "failed": self.failed,
+                "timeouts": self.timeouts,
+                "latency_ms": latency_summary(list(self._latencies))
+            }
+    
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
 
 class PriceAnalysisAgent:
     """Agent responsible for price analysis and predictions"""
     
-    def __init__(self):
-        self.scaler = StandardScaler()
-        self.model = LinearRegression()
-        self.price_history = {}
+    def __init__(self, store: Optional[PriceHistoryStore] = None):
+        self.price_history = store if store is not None else PriceHistoryStore()
+        self._lock = threading.Lock()
+        self._listeners: List[Callable[[Optional[List[str]]], None]] = []
+        self.version = 0                                     # bumped on every change to the history
+    
+    def add_listener(self, callback: Callable[[Optional[List[str]]], None]):
+        """Call ``callback(product_ids)`` after prices change (``None`` means the whole history)"""
+        self._listeners.append(callback)
     
-    def load_price_data(self, file_path: str):
-        """Load price history data from JSON file"""
+    def _notify(self, product_ids: Optional[List[str]] = None):
+        self.version += 1
+        for callback in self._listeners:
+            try:
+                callback(product_ids)
+            except Exception as e:
+                logger.error(f"Price listener failed: {e}")
+    
+    def load_price_data(self, file_path: str, chunk_size: int = 1 << 20, memory_limit: int = 64 << 20,
+                        progress: Optional[Callable[[int, int, int], None]] = None) -> int:
+        """Stream price history from a JSON array or NDJSON file (optionally gzipped); returns the points loaded"""
+        # Rough cost of one pending (product_id, date, price) tuple before it is columnized
+        pending_point_bytes = 200
+        batch_points = max(1000, (memory_limit - 2 * chunk_size) // pending_point_bytes)
+        loaded = 0
+        
         try:
-            with open(file_path, 'r') as f:
-                data = json.load(f)
-            
-            # Group by product_id
-            for entry in data:
-                product_id = entry['product_id']
-                if product_id not in self.price_history:
-                    self.price_history[product_id] = []
+            total_bytes = os.path.getsize(file_path)
+            with open(file_path, 'rb') as raw:
+                compressed = raw.read(2) == b"\x1f\x8b"
+                raw.seek(0)
+                stream = gzip.GzipFile(fileobj=raw, mode='rb') if compressed else raw
+                
+                batch = []
+                for entry in iter_json_records(stream, chunk_size):
+                    batch.append((entry['product_id'], entry['date'], entry['price']))
+                    if len(batch) >= batch_points:
+                        with self._lock:
+                            loaded += self.price_history.add_many(batch)
+                        batch = []
+                        if progress:
+                            progress(raw.tell(), total_bytes, loaded)
+                        logger.debug(f"Loaded {loaded} price points ({raw.tell() * 100 // max(total_bytes, 1)}%)")
                 
-                self.price_history[product_id].append(PriceData(
-                    product_id=product_id,
-                    date=entry['date'],
-                    price=entry['price']
-                ))
+                with self._lock:
+                    loaded += self.price_history.add_many(batch)
+                    self.price_history.shrink_to_fit()
+                if progress:
+                    progress(total_bytes, total_bytes, loaded)
             
-            logger.info(f"Loaded price data for {len(self.price_history)} products")
+            logger.info(f"Loaded {loaded} price points for {len(self.price_history)} products "
+                        f"({self.price_history.nbytes / 1e6:.1f} MB in memory)")
         except Exception as e:
             logger.error(f"Failed to load price data: {e}")
+        
+        if loaded:
+            self._notify()
+        return loaded
+    
+    def latest_prices(self, product_ids: Optional[Iterable[str]] = None) -> List[Tuple[str, int, float]]:
+        """``(product_id, day, price)`` of each product's newest point"""
+        with self._lock:
+            return list(self.price_history.latest_points(product_ids))
+    
+    def save_snapshot(self, path: str) -> bool:
+        """Persist the price history as a binary snapshot; False if the store doesn't support snapshots"""
+        with self._lock:
+            if not self.price_history.supports_snapshots:
+                return False
+            self.price_history.save_snapshot(path)
+            return True
+    
+    def load_snapshot(self, path: str, source_path: Optional[str] = None) -> bool:
+        """Replace the price history with a memory-mapped snapshot; False if it is missing or stale"""
+        try:
+            if not self.price_history.supports_snapshots or not os.path.exists(path):
+                return False
+            if source_path and os.path.exists(source_path) and os.path.getmtime(source_path) > os.path.getmtime(path):
+                logger.info(f"Price snapshot {path} is older than {source_path}, re-importing")
+                return False
+            
+            store = PriceHistoryStore.load_snapshot(path)
+            with self._lock:
+                self.price_history = store
+            logger.info(f"Mapped price snapshot {path}: {store.total_points} points for {len(store)} products")
+            self._notify()
+            return True
+        except Exception as e:
+            logger.error(f"Failed to load price snapshot: {e}")
+            return False
+    
+    def refresh_store(self) -> bool:
+        """Pick up prices other processes wrote to a shared SQLite store; True if anything changed"""
+        store = self.price_history
+        if isinstance(store, SQLitePriceStore) and store.refresh():
+            self._notify()
+            return True
+        return False
+    
+    def ingest_prices(self, entries: Iterable[Dict]) -> Dict:
+        """Ingest ``{product_id, date, price}`` points into the live history"""
+        grouped: Dict[str, Tuple[List[int], List[float]]] = {}
+        rejected = 0
+        errors = []
+        for entry in entries:
+            try:
+                product_id = entry['product_id']
+                day = to_epoch_day(entry['date'])
+                price = float(entry['price'])
+                if not isinstance(product_id, str) or not product_id or not np.isfinite(price) or price <= 0:
+                    raise ValueError("invalid product_id or price")
+            except (KeyError, TypeError, ValueError) as e:
+                rejected += 1
+                if len(errors) < 10:
+                    errors.append(f"{entry!r}: {e}")
+                continue
+            
+            bucket = grouped.get(product_id)
+            if bucket is None:
+                bucket = grouped[product_id] = ([], [])
+            bucket[0].append(day)
+            bucket[1].append(price)
+        
+        accepted = updated = duplicates = 0
+        store = self.price_history
+        with self._lock:
+            for product_id, (days, prices) in grouped.items():
+                series = store.get(product_id)
+                if all(a < b for a, b in zip(days, days[1:])) and (not series or days[0] > series.days[-1]):
+                    # Fast path: a strictly newer block, merged in one vectorized step
+                    store.extend(product_id, np.array(days, dtype=np.int32), np.array(prices, dtype=np.float64))
+                    accepted += len(days)
+                    continue
+                
+                for day, price in zip(days, prices):
+                    old_price = store.insert(product_id, day, price)
+                    if old_price is None:
+                        accepted += 1
+                    elif old_price == price:
+                        duplicates += 1
+                    else:
+                        updated += 1
+            store.flush()
+        
+        if grouped:
+            self._notify(list(grouped))
+        return {
+            "accepted": accepted,
+            "updated": updated,
+            "duplicates": duplicates,
+            "rejected": rejected,
+            "errors": errors
+        }
+    
+    def ingest_ndjson(self, lines: Iterable[Union[str, bytes]], batch_size: int = 10000) -> Dict:
+        """Ingest newline-delimited JSON price points in batches"""
+        totals = {"accepted": 0, "updated": 0, "duplicates": 0, "rejected": 0, "errors": []}
+        
+        def flush(batch):
+            result = self.ingest_prices(batch)
+            for key in ("accepted", "updated", "duplicates", "rejected"):
+                totals[key] += result[key]
+            totals["errors"].extend(result["errors"][:10 - len(totals["errors"])])
+        
+        batch = []
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                batch.append(json.loads(line))
+            except ValueError as e:
+                totals["rejected"] += 1
+                if len(totals["errors"]) < 10:
+                    totals["errors"].append(f"invalid JSON line: {e}")
+                continue
+            if len(batch) >= batch_size:
+                flush(batch)
+                batch = []
+        if batch:
+            flush(batch)
+        
+        return totals
+    
+    def snapshot_series(self, product_id: str) -> Optional[PriceSeries]:
+        """Copy of a product's series taken under the lock, safe to read on another thread"""
+        series = self.price_history.get(product_id)
+        if series is None:
+            return None
+        with self._lock:
+            return series.copy()
     
     def analyze_product_trends(self, product_id: str) -> Dict:
         """Analyze price trends for a specific product"""
-        if product_id not in self.price_history:
+        series = self.price_history.get(product_id)
+        if series is None:
             return {"error": "Product not found"}
         
-        prices = self.price_history[product_id]
-        if len(prices) < 2:
-            return {"error": "Insufficient data for analysis"}
-        
-        # Sort by date
-        prices.sort(key=lambda x: x.date)
+        with self._lock:
+            if len(series) < 2:
+                return {"error": "Insufficient data for analysis"}
+            
+            # Series are kept sorted by date on insert
+            price_values = series.prices
+            current_price = float(price_values[-1])
+            previous_price = float(price_values[-2])
+            data_points = len(series)
+            
+            # Volatility and the linear prediction come from the running stats
+            volatility = series.volatility
+            _, prediction_confidence, predicted_price = series.linear_fit(horizon_days=7)
         
-        # Calculate basic statistics
-        price_values = [p.price for p in prices]
-        current_price = price_values[-1]
-        previous_price = price_values[-2]
         price_change = current_price - previous_price
-        price_change_percent = (price_change / previous_price) * 100
+        # Loaded or seeded history may still hold a zero price, where a percentage is undefined
+        price_change_percent = round(price_change / previous_price * 100, 2) if previous_price else None
         
         # Determine trend
         if price_change > 0:
@@ -228,54 +932,82 @@ class PriceAnalysisAgent:
         else:
             trend = "stable"
         
-        # Calculate volatility
-        volatility = np.std(price_values)
-        
-        # Simple prediction using linear regression
-        try:
-            dates_numeric = [(datetime.strptime(p.date, "%Y-%m-%d") - datetime(2025, 8, 1)).days for p in prices]
-            X = np.array(dates_numeric).reshape(-1, 1)
-            y = np.array(price_values)
-            
-            X_scaled = self.scaler.fit_transform(X)
-            self.model.fit(X_scaled, y)
-            
-            # Predict next price (7 days ahead)
-            next_date = max(dates_numeric) + 7
-            next_date_scaled = self.scaler.transform([[next_date]])
-            predicted_price = self.model.predict(next_date_scaled)[0]
-            
-            prediction_confidence = self.model.score(X_scaled, y)
-        except Exception as e:
-            logger.error(f"Prediction failed: {e}")
-            predicted_price = current_price
-            prediction_confidence = 0.0
-        
         return {
             "product_id": product_id,
             "current_price": current_price,
             "previous_price": previous_price,
             "price_change": price_change,
-            "price_change_percent": round(price_change_percent, 2),
+            "price_change_percent": price_change_percent,
             "trend": trend,
             "volatility": round(volatility, 2),
             "predicted_price": round(predicted_price, 2),
             "prediction_confidence": round(prediction_confidence, 3),
-            "data_points": len(prices)
+            "data_points": data_points
         }
     
+    def load_categories(self, file_path: str):
+        """Tag price series with categories from the products JSON file"""
+        try:
+            with open(file_path, 'r') as f:
+                products = json.load(f)
+            
+            with self._lock:
+                for product in products:
+                    if product['id'] in self.price_history:
+                        self.price_history.set_category(product['id'], product.get('category', ''))
+                self.price_history.flush()
+        except Exception as e:
+            logger.error(f"Failed to load product categories: {e}")
+    
+    def analyze_batch(self, product_ids: Optional[List[str]] = None, category: Optional[str] = None) -> List[Dict]:
+        """Analyze many products in one vectorized pass"""
+        if product_ids is None:
+            with self._lock:
+                product_ids = self.price_history.product_ids(category)
+        
+        results: Dict[str, Dict] = {}
+        analyzable = []
+        for product_id in product_ids:
+            series = self.price_history.get(product_id)
+            if series is None:
+                results[product_id] = {"product_id": product_id, "error": "Product not found"}
+            elif len(series) < 2:
+                results[product_id] = {"product_id": product_id, "error": "Insufficient data for analysis"}
+            else:
+                analyzable.append(product_id)
+        
+        if analyzable:
+            with self._lock:
+                found_ids, offsets, days, prices = self.price_history.to_flat(analyzable)
+            stats = batch_trend_stats(offsets, days, prices)
+            trend_names = {1: "increasing", -1: "decreasing", 0: "stable"}
+            columns = {key: values.tolist() for key, values in stats.items()}
+            for i, product_id in enumerate(found_ids):
+                results[product_id] = {
+                    "product_id": product_id,
+                    "current_price": columns["current_price"][i],
+                    "previous_price": columns["previous_price"][i],
+                    "price_change": columns["price_change"][i],
+                    "price_change_percent": (round(columns["price_change_percent"][i], 2)
+                                             if columns["previous_price"][i] else None),
+                    "trend": trend_names[columns["trend"][i]],
+                    "volatility": round(columns["volatility"][i], 2),
+                    "predicted_price": round(columns["predicted_price"][i], 2),
+                    "prediction_confidence": round(columns["r_squared"][i], 3),
+                    "data_points": columns["data_points"][i]
+                }
+        
+        return [results[product_id] for product_id in product_ids]
+    
     def get_price_alerts(self, threshold_percent: float = 5.0) -> List[Dict]:
         """Get price alerts for significant changes"""
         alerts = []
+        with self._lock:
+            latest = list(self.price_history.latest_pairs())
         
-        for product_id, prices in self.price_history.items():
-            if len(prices) < 2:
-                continue
-            
-            prices.sort(key=lambda x: x.date)
-            current_price = prices[-1].price
-            previous_price = prices[-2].price
-            
+        for product_id, current_price, previous_price in latest:
+            if not previous_price:
+                continue                                     # no percentage change from a zero price
             price_change_percent = abs((current_price - previous_price) / previous_price) * 100
             
             if price_change_percent >= threshold_percent:
@@ -289,140 +1021,287 @@ class PriceAnalysisAgent:
                 })
         
         return alerts
+    
+    async def handle_message(self, message_data: Dict):
+        """Serve bus requests: ``analyze``, ``analyze_batch`` and ``alerts``"""
+        message = message_data["message"]
+        kind = message.get("type")
+        if kind == "analyze":
+            return await asyncio.to_thread(self.analyze_product_trends, message["product_id"])
+        if kind == "analyze_batch":
+            return await asyncio.to_thread(self.analyze_batch, message.get("product_ids"), message.get("category"))
+        if kind == "alerts":
+            return await asyncio.to_thread(self.get_price_alerts, message.get("threshold", 5.0))
+        return {"error": f"Unsupported message type {kind!r}"}
 
 class InformationRetrievalAgent:
     """Agent responsible for retrieving and organizing information"""
     
-    def __init__(self):
-        self.cache = {}
-        self.cache_ttl = 3600  # 1 hour
-    
-    def search_products(self, query: str) -> List[Dict]:
-        """Search for products based on query"""
-        # In a real system, this would search a product database
-        # For now, return mock results
-        return [
-            {"id": "e1", "name": "Wireless Mouse", "category": "Electronics"},
-            {"id": "f1", "name": "Men's T-Shirt", "category": "Fashion"},
-            {"id": "bp1", "name": "Facial Cleanser", "category": "Beauty"}
-        ]
+    def __init__(self, products_path: Optional[str] = None, price_agent: Optional["PriceAnalysisAgent"] = None):
+        # Search results, similar products and market insights, keyed "<namespace>:..."
+        self.cache = TieredCache(CONFIG["ir_cache_size"], CONFIG["ir_cache_ttl"],
+                                 namespace_ttls=CONFIG["ir_cache_ttls"])
+        self.catalog = ProductCatalog(CONFIG["price_bands"])
+        self.catalog.load(products_path or CONFIG["products_path"])
+        self.search_index = ProductSearchIndex(max_dense_postings=CONFIG["search_max_postings"])
+        self.search_index.add_products(self.catalog)
+        self.vector_index = self._load_vectors(products_path or CONFIG["products_path"])
+        
+        # Keep each record's latest price in step with the price history
+        self.price_agent = price_agent
+        if price_agent is not None:
+            price_agent.add_listener(self._on_prices_changed)
+            self._on_prices_changed(None)
+    
+    def _on_prices_changed(self, product_ids: Optional[List[str]]):
+        if product_ids is not None:
+            product_ids = [product_id for product_id in product_ids if product_id in self.catalog]
+            if not product_ids:
+                return
+        self.catalog.sync_prices(self.price_agent.latest_prices(product_ids), product_ids)
+    
+    def _load_vectors(self, products_path: str) -> ProductVectorIndex:
+        """Map the persisted product vectors, rebuilding them if stale or missing"""
+        path, dim = CONFIG["product_vectors_path"], CONFIG["vector_dim"]
+        if path and os.path.exists(f"{path}.npy"):
+            try:
+                stale = os.path.exists(products_path) and os.path.getmtime(products_path) > os.path.getmtime(f"{path}.npy")
+                if not stale:
+                    index = ProductVectorIndex.load(path)
+                    if index.dim == dim and len(index) == len(self.catalog) and all(pid in self.catalog for pid in index.product_ids):
+                        logger.info(f"Mapped {len(index)} product vectors from {path}.npy")
+                        return index
+                logger.info(f"Product vectors {path}.npy are out of date, rebuilding")
+            except Exception as e:
+                logger.warning(f"Failed to load product vectors: {e}")
+        
+        index = ProductVectorIndex(dim)
+        index.build(self.catalog)
+        if path:
+            try:
+                index.save(path)
+            except OSError as e:
+                logger.warning(f"Could not persist product vectors to {path}: {e}")
+        return index
+    
+    def add_products(self, products: List[Dict]):
+        """Add or update catalog products and index them for search"""
+        self.catalog.add_products(products)
+        self.search_index.add_products(self.catalog.get(str(product["id"])) for product in products)
+        self.vector_index.add(self.catalog.get(str(product["id"])) for product in products)
+        # Records were replaced, so anything that may hold the old ones goes
+        for namespace in ("search", "similar", "insights"):
+            self.cache.clear(f"{namespace}:")
+        if self.price_agent is not None:
+            self._on_prices_changed([str(product["id"]) for product in products])
+    
+    def search_products(self, query: str, limit: int = 20) -> List[Dict]:
+        """Search for products, best BM25 match first"""
+        query = " ".join(query.lower().split())
+        return list(self.cache.get_or_compute(
+            f"search:{limit}:{query}",
+            lambda: [self.catalog.get(product_id) for product_id, _ in self.search_index.search(query, limit)]
+        ))
+    
+    def suggest(self, prefix: str, limit: int = 10) -> List[str]:
+        """Typeahead completions for the last word being typed"""
+        words = prefix.split()
+        if not words or prefix[-1:].isspace():
+            return []
+        return self.search_index.suggest(words[-1], limit)
+    
+    def similar_products(self, product_id: str, limit: int = 10) -> List[Dict]:
+        """Products most like ``product_id``, each with its cosine ``similarity``"""
+        # Only the ranking is cached; records are joined on read so latest prices stay current
+        ranked = self.cache.get_or_compute(f"similar:{limit}:{product_id}",
+                                           lambda: tuple(self.vector_index.similar(product_id, limit)))
+        return [dict(self.catalog.get(pid), similarity=round(score, 4)) for pid, score in ranked]
     
     def get_product_details(self, product_id: str) -> Optional[Dict]:
         """Get detailed information about a product"""
-        # Mock product database
-        products = {
-            "e1": {"name": "Wireless Mouse", "category": "Electronics", "description": "High-precision wireless mouse"},
-            "f1": {"name": "Men's T-Shirt", "category": "Fashion", "description": "Comfortable cotton t-shirt"},
-            "bp1": {"name": "Facial Cleanser", "category": "Beauty", "description": "Gentle facial cleanser"}
-        }
-        
-        return products.get(product_id)
+        return self.catalog.get(product_id)
     
     def get_market_insights(self) -> Dict:
         """Get general market insights"""
-        return {
-            "total_products": 100,
-            "categories": ["Electronics", "Fashion", "Kitchen & Dining", "Beauty & Personal Care", "Home & Living"],
-            "price_range": {"min": 300, "max": 350000},
+        return self.cache.get_or_compute("insights:market", lambda: {
+            "total_products": len(self.catalog),
+            "categories": list(self.catalog.categories),
+            "price_range": self.catalog.price_range,
             "market_trend": "stable",
-            "last_updated": datetime.now().isoformat()
-        }
-
-class CommunicationManager:
-    """Manages communication between agents and external systems"""
-    
-    def __init__(self, host: str = "localhost", port: int = 5000):
-        self.host = host
-        self.port = port
-        self.agents = {}
-        self.message_queue = asyncio.Queue()
-        self._running = False
-    
-    def register_agent(self, agent_id: str, agent):
-        """Register an agent for communication"""
-        self.agents[agent_id] = agent
-        logger.info(f"Registered agent: {agent_id}")
-    
-    async def send_message(self, from_agent: str, to_agent: str, message: Dict):
-        """Send message between agents"""
-        if to_agent in self.agents:
-            await self.message_queue.put({
-                "from": from_agent,
-                "to": to_agent,
-                "message": message,
-                "timestamp": datetime.now().isoformat()
-            })
-            logger.info(f"Message sent from {from_agent} to {to_agent}")
-        else:
-            logger.warning(f"Agent {to_agent} not found")
+            "last_updated": self.catalog.last_updated or datetime.now().isoformat()
+        })
     
-    async def broadcast_message(self, from_agent: str, message: Dict):
-        """Broadcast message to all agents"""
-        for agent_id in self.agents:
-            if agent_id != from_agent:
-                await self.send_message(from_agent, agent_id, message)
-    
-    async def process_messages(self):
-        """Process message queue"""
-        self._running = True
-        try:
-            while self._running:
-                try:
-                    # Use wait_for to allow cancellation
-                    message_data = await asyncio.wait_for(
-                        self.message_queue.get(), 
-                        timeout=1.0
-                    )
-                    
-                    to_agent = message_data["to"]
-                    
-                    if to_agent in self.agents:
-                        # Process message based on agent type
-                        agent = self.agents[to_agent]
-                        if hasattr(agent, 'handle_message'):
-                            await agent.handle_message(message_data)
-                    
-                    self.message_queue.task_done()
-                    
-                except asyncio.TimeoutError:
-                    # Continue loop on timeout
-                    continue
-                except asyncio.CancelledError:
-                    logger.info("Message processing cancelled")
-                    break
-                except Exception as e:
-                    logger.error(f"Error processing message: {e}")
-                    
-        finally:
-            self._running = False
-    
-    def stop(self):
-        """Stop the communication manager"""
-        self._running = False
+    async def handle_message(self, message_data: Dict):
+        """Serve bus requests: ``product_details``, ``search``, ``similar`` and ``insights``"""
+        message = message_data["message"]
+        kind = message.get("type")
+        if kind == "product_details":
+            return self.get_product_details(message["product_id"])
+        if kind == "search":
+            return await asyncio.to_thread(self.search_products, message["query"], message.get("limit", 20))
+        if kind == "similar":
+            return await asyncio.to_thread(self.similar_products, message["product_id"], message.get("limit", 10))
+        if kind == "insights":
+            return self.get_market_insights()
+        return {"error": f"Unsupported message type {kind!r}"}
 
 class PriceTrackerSystem:
     """Main system coordinating all agents"""
     
-    def __init__(self):
+    def __init__(self, server_worker: bool = False):
+        self.server_worker = server_worker
         self.security_manager = SecurityManager()
         self.llm_agent = LLMAgent()
-        self.price_analysis_agent = PriceAnalysisAgent()
-        self.info_retrieval_agent = InformationRetrievalAgent()
+        self.price_analysis_agent = PriceAnalysisAgent(self.create_price_store())
+        self.info_retrieval_agent = InformationRetrievalAgent(price_agent=self.price_analysis_agent)
         self.communication_manager = CommunicationManager()
+        self.insight_jobs = InsightJobManager(
+            self.llm_agent,
+            max_workers=CONFIG["max_concurrent_agents"],
+            timeout=CONFIG["agent_timeout"],
+            db_path=CONFIG["jobs_db"]
+        )
         
         # Register agents
         self.communication_manager.register_agent("security", self.security_manager)
-        self.communication_manager.register_agent("llm", self.llm_agent)
+        if "llm" in CONFIG["remote_agents"]:
+            # Summarization and NER run in their own process so they don't compete with requests for the GIL
+            self.communication_manager.register_agent("llm", RemoteAgent(LLMAgent, "llm"))
+        else:
+            self.communication_manager.register_agent("llm", self.llm_agent)
+        for name in set(CONFIG["remote_agents"]) - {"llm"}:
+            logger.warning(f"REMOTE_AGENTS: {name} cannot run out of process, keeping it local")
         self.communication_manager.register_agent("price_analysis", self.price_analysis_agent)
         self.communication_manager.register_agent("info_retrieval", self.info_retrieval_agent)
         
         # Load price data
-        self.price_analysis_agent.load_price_data("frontend/src/data/pricehistory.json")
+        self._snapshot_version: Optional[int] = None
+        self._snapshot_stamp: Optional[Tuple[int, int]] = None
+        self._price_sync_lock = threading.RLock()
+        if self.load_price_history(self.price_analysis_agent):
+            self._snapshot_version = self.price_analysis_agent.version
+            self._snapshot_stamp = file_stamp(CONFIG["price_snapshot_path"])
+        
+        # CPU-heavy analysis and NLP can go to worker processes that map the same snapshot
+        self.worker_pool: Optional[WorkerPool] = None
+        if CONFIG["pool_workers"] > 0:
+            self.worker_pool = WorkerPool(
+                CONFIG["pool_workers"],
+                max_pending=CONFIG["pool_max_pending"],
+                timeout=CONFIG["pool_task_timeout"],
+                snapshot_path=CONFIG["price_snapshot_path"] if self._snapshot_version is not None else "",
+                warm_models=CONFIG["pool_warm_models"]
+            )
+            logger.info(f"Worker pool ready: processes {self.worker_pool.warm_up()}")
+        
+        # Pool workers only see the snapshot, so rewrite it shortly after ingests instead of bypassing the pool
+        self._snapshot_lock = threading.Lock()
+        self._snapshot_timer: Optional[threading.Timer] = None
+        self.snapshot_refreshes = 0
+        self.pool_bypassed = 0
+        # (server workers rewrite it on every ingest already, see _ingest_shared)
+        if self.worker_pool is not None and self.worker_pool.snapshot_path and not server_worker:
+            self.price_analysis_agent.add_listener(self._schedule_snapshot)
         
         # Initialize Flask app
         self.app = Flask(__name__)
         CORS(self.app)
         self.setup_routes()
+        self.draining = False                                # set while shutting down so /api/ready fails
+        if server_worker:
+            @self.app.before_request
+            def sync_prices():
+                self.sync_price_history()
+    
+    def _schedule_snapshot(self, product_ids: Optional[List[str]] = None):
+        """Rewrite the snapshot ``SNAPSHOT_DEBOUNCE`` seconds after the first of a burst of changes"""
+        with self._snapshot_lock:
+            if self._snapshot_timer is not None:
+                return
+            self._snapshot_timer = threading.Timer(CONFIG["snapshot_debounce"], self._refresh_snapshot)
+            self._snapshot_timer.daemon = True
+            self._snapshot_timer.start()
+    
+    def _refresh_snapshot(self):
+        with self._snapshot_lock:
+            self._snapshot_timer = None
+        # Read before saving: changes made during the save bump the version again and schedule another one
+        version = self.price_analysis_agent.version
+        try:
+            if self.price_analysis_agent.save_snapshot(self.worker_pool.snapshot_path):
+                self._snapshot_version = version
+                self.snapshot_refreshes += 1
+        except OSError as e:
+            logger.warning(f"Could not refresh price snapshot: {e}")
+    
+    def sync_price_history(self) -> bool:
+        """Pick up prices another server worker wrote; True if the history changed"""
+        agent = self.price_analysis_agent
+        if not agent.price_history.supports_snapshots:
+            return agent.refresh_store()
+        path = CONFIG["price_snapshot_path"]
+        if self._snapshot_stamp is None or file_stamp(path) == self._snapshot_stamp:
+            return False
+        with self._price_sync_lock:
+            stamp = file_stamp(path)
+            if stamp == self._snapshot_stamp or not agent.load_snapshot(path):
+                return False
+            self._snapshot_stamp, self._snapshot_version = stamp, agent.version
+            return True
+    
+    def _ingest_shared(self, lines: Iterable[bytes]) -> Optional[Dict]:
+        """Ingest into the shared snapshot under an inter-process lock; None if there is no snapshot"""
+        import fcntl
+        
+        if self._snapshot_stamp is None:
+            return None
+        path = CONFIG["price_snapshot_path"]
+        with open(f"{path}.lock", "a") as lock_file, self._price_sync_lock:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            self.sync_price_history()
+            agent = self.price_analysis_agent
+            result = agent.ingest_ndjson(lines)
+            if result["accepted"] or result["updated"]:
+                agent.save_snapshot(path)
+                self._snapshot_stamp, self._snapshot_version = file_stamp(path), agent.version
+        return result
+    
+    @staticmethod
+    def create_price_store() -> PriceHistoryStore:
+        """Use the SQLite store when DATABASE_URL points at one, else the in-memory store"""
+        database_url = CONFIG["database_url"]
+        if database_url:
+            path = sqlite_path_from_url(database_url)
+            if path:
+                logger.info(f"Using SQLite price store at {path}")
+                return SQLitePriceStore(path, cache_size=CONFIG["price_cache_products"])
+            logger.warning(f"Unsupported DATABASE_URL {database_url}, using in-memory price store")
+        return PriceHistoryStore()
+    
+    @staticmethod
+    def load_price_history(agent: PriceAnalysisAgent) -> bool:
+        """Populate the price store; True when the history matches the on-disk snapshot"""
+        history_path = "frontend/src/data/pricehistory.json"
+        products_path = CONFIG["products_path"]
+        
+        if not agent.price_history.supports_snapshots:
+            # The database is the source of truth once it has been seeded
+            if len(agent.price_history) == 0:
+                agent.load_price_data(history_path)
+                agent.load_categories(products_path)
+            return False
+        
+        # Map the binary snapshot, importing the JSON only when it is missing or stale
+        snapshot_path = CONFIG["price_snapshot_path"]
+        if agent.load_snapshot(snapshot_path, source_path=history_path):
+            return True
+        agent.load_price_data(history_path)
+        agent.load_categories(products_path)
+        try:
+            return agent.save_snapshot(snapshot_path)
+        except OSError as e:
+            logger.warning(f"Could not write price snapshot: {e}")
+            return False
     
     def setup_routes(self):
         """Setup Flask API routes"""
@@ -436,10 +1315,25 @@ class PriceTrackerSystem:
                 "endpoints": {
                     "home": "/",
                     "login": "/api/auth/login",
+                    "ready": "/api/ready",
                     "analyze": "/api/analyze/<product_id>",
+                    "analyze_batch": "/api/analyze/batch",
+                    "summarize": "/api/nlp/summarize",
+                    "entities": "/api/nlp/entities",
+                    "job": "/api/jobs/<job_id>",
+                    "job_events": "/api/jobs/<job_id>/events",
                     "alerts": "/api/alerts",
+                    "ingest": "/api/prices/ingest",
+                    "products": "/api/products?category=&band=",
+                    "product": "/api/products/<product_id>",
+                    "similar": "/api/products/<product_id>/similar?k=",
                     "search": "/api/search",
-                    "insights": "/api/insights"
+                    "suggest": "/api/search/suggest?q=",
+                    "insights": "/api/insights",
+                    "cache_stats": "/api/stats/cache",
+                    "agent_stats": "/api/stats/agents",
+                    "model_stats": "/api/stats/models",
+                    "pool_stats": "/api/stats/pool"
                 },
                 "usage": "Use /api/auth/login to get a token, then use other endpoints with Authorization: Bearer <token>"
             })
@@ -455,18 +1349,178 @@ class PriceTrackerSystem:
             # Sanitize input
             product_id = self.security_manager.sanitize_input(product_id)
             
-            # Get analysis
-            analysis = self.price_analysis_agent.analyze_product_trends(product_id)
+            # A copy, since ingest keeps writing the live series while the insight job reads it
+            price_data = self.price_analysis_agent.snapshot_series(product_id)
+            if price_data is None:
+                return jsonify({"error": "Product not found"})
+            if len(price_data) < 2:
+                return jsonify({"error": "Insufficient data for analysis"})
+            
+            # LLM insights run on the bounded insight pool, never on this worker thread unbounded;
+            # they start first so the model call overlaps the analysis and catalog lookup
+            job_id = self.insight_jobs.submit(product_id, price_data)
+            
+            # Price analysis and catalog lookup in parallel over the agent bus
+            try:
+                analysis, product = self.communication_manager.call_many([
+                    ("price_analysis", {"type": "analyze", "product_id": product_id}),
+                    ("info_retrieval", {"type": "product_details", "product_id": product_id})
+                ], timeout=CONFIG["agent_timeout"])
+            except TimeoutError as e:
+                return jsonify({"error": str(e)}), 504
+            if "error" in analysis:
+                return jsonify(analysis)
+            analysis["product"] = product
             
-            # Use LLM for additional insights
-            if "error" not in analysis:
-                llm_insights = self.llm_agent.analyze_price_trends(
-                    self.price_analysis_agent.price_history.get(product_id, [])
-                )
-                analysis["llm_insights"] = llm_insights
+            if job_id is None:
+                analysis["llm_insights"] = "Price trend analysis unavailable"
+                return jsonify(analysis)
             
+            # ?async=1 returns the numbers now and the insight later via polling or SSE
+            if request.args.get('async', '').lower() in ('1', 'true', 'yes'):
+                analysis["llm_job"] = {
+                    "id": job_id,
+                    "status_url": f"/api/jobs/{job_id}",
+                    "events_url": f"/api/jobs/{job_id}/events"
+                }
+                return jsonify(analysis), 202
+            
+            job = self.insight_jobs.wait(job_id, timeout=CONFIG["agent_timeout"])
+            analysis["llm_insights"] = job["llm_insights"] or "Price trend analysis unavailable"
+            analysis["llm_status"] = job["status"] if job["finished_at"] is not None else "timeout"
             return jsonify(analysis)
         
+        @self.app.route('/api/jobs/<job_id>', methods=['GET'])
+        def get_job(job_id):
+            """Poll a background LLM insight job"""
+            token = request.headers.get('Authorization', '').replace('Bearer ', '')
+            if not self.security_manager.verify_token(token):
+                return jsonify({"error": "Unauthorized"}), 401
+            
+            job = self.insight_jobs.get(job_id)
+            if job is None:
+                return jsonify({"error": "Job not found"}), 404
+            return jsonify(job)
+        
+        @self.app.route('/api/jobs/<job_id>/events', methods=['GET'])
+        def stream_job(job_id):
+            """Server-Sent Events stream that delivers the insight when it is ready"""
+            # EventSource cannot set headers, so the token may also come as ?token=
+            token = request.headers.get('Authorization', '').replace('Bearer ', '') or request.args.get('token', '')
+            if not self.security_manager.verify_token(token):
+                return jsonify({"error": "Unauthorized"}), 401
+            
+            job = self.insight_jobs.get(job_id)
+            if job is None:
+                return jsonify({"error": "Job not found"}), 404
+            
+            def events():
+                yield f"event: {job['status']}\ndata: {json.dumps(job)}\n\n"
+                if job["finished_at"] is None:
+                    final = self.insight_jobs.wait(job_id, timeout=CONFIG["agent_timeout"])
+                    if final["finished_at"] is None:
+                        final["status"] = "timeout"
+                    yield f"event: {final['status']}\ndata: {json.dumps(final)}\n\n"
+            
+            return Response(events(), mimetype="text/event-stream", headers={"Cache-Control": "no-cache"})
+        
+        @self.app.route('/api/analyze/batch', methods=['POST'])
+        def analyze_batch():
+            """Analyze many products (by ID list or category) in one pass"""
+            token = request.headers.get('Authorization', '').replace('Bearer ', '')
+            if not self.security_manager.verify_token(token):
+                return jsonify({"error": "Unauthorized"}), 401
+            
+            data = request.get_json(silent=True) or {}
+            product_ids = data.get('product_ids')
+            category = data.get('category')
+            if product_ids is not None:
+                if not isinstance(product_ids, list):
+                    return jsonify({"error": "product_ids must be a list"}), 400
+                product_ids = [self.security_manager.sanitize_input(str(pid)) for pid in product_ids]
+            if category is not None:
+                # Only compared against known categories; sanitizing would strip the "&" in names
+                category = str(category)
+            
+            # Worker processes see the snapshot, so they're only used while it matches the live history
+            # (it is rewritten shortly after each ingest; until then the batch runs here)
+            use_pool = self.worker_pool is not None and self._snapshot_version == self.price_analysis_agent.version
+            if self.worker_pool is not None and not use_pool:
+                self.pool_bypassed += 1
+            if use_pool:
+                future = self.worker_pool.submit(pool_analyze_batch, product_ids, category)
+                if future is None:
+                    return jsonify({"error": "Analysis queue is full, try again later"}), 503
+                try:
+                    results = self.worker_pool.result(future)
+                except TimeoutError:
+                    return jsonify({"error": "Analysis timed out"}), 504
+            else:
+                results = self.price_analysis_agent.analyze_batch(product_ids, category)
+            return jsonify({"results": results, "count": len(results)})
+        
+        def run_nlp(pool_task, message_type: str):
+            data = request.get_json(silent=True) or {}
+            texts = data.get('texts')
+            if not isinstance(texts, list) or not all(isinstance(text, str) for text in texts):
+                return jsonify({"error": "texts must be a list of strings"}), 400
+            if len(texts) > 64:
+                return jsonify({"error": "At most 64 texts per request"}), 400
+            
+            if self.worker_pool is None:
+                try:
+                    return jsonify({"results": self.communication_manager.call(
+                        "llm", {"type": message_type, "texts": texts}, timeout=CONFIG["agent_timeout"])})
+                except TimeoutError:
+                    return jsonify({"error": "NLP request timed out"}), 504
+            future = self.worker_pool.submit(pool_task, texts)
+            if future is None:
+                return jsonify({"error": "NLP queue is full, try again later"}), 503
+            try:
+                return jsonify({"results": self.worker_pool.result(future)})
+            except TimeoutError:
+                return jsonify({"error": "NLP request timed out"}), 504
+        
+        @self.app.route('/api/nlp/summarize', methods=['POST'])
+        def summarize():
+            """Summarize a batch of texts"""
+            token = request.headers.get('Authorization', '').replace('Bearer ', '')
+            if not self.security_manager.verify_token(token):
+                return jsonify({"error": "Unauthorized"}), 401
+            
+            return run_nlp(pool_summarize_many, "summarize_many")
+        
+        @self.app.route('/api/nlp/entities', methods=['POST'])
+        def entities():
+            """Named entities for a batch of texts"""
+            token = request.headers.get('Authorization', '').replace('Bearer ', '')
+            if not self.security_manager.verify_token(token):
+                return jsonify({"error": "Unauthorized"}), 401
+            
+            return run_nlp(pool_extract_entities_many, "entities_many")
+        
+        @self.app.route('/api/prices/ingest', methods=['POST'])
+        def ingest_prices():
+            """Ingest an NDJSON batch of {product_id, date, price} points"""
+            token = request.headers.get('Authorization', '').replace('Bearer ', '')
+            if not self.security_manager.verify_token(token):
+                return jsonify({"error": "Unauthorized"}), 401
+            
+            if self.server_worker and self.price_analysis_agent.price_history.supports_snapshots:
+                # Spool the body first so a slow client doesn't hold the cross-worker ingest lock
+                with tempfile.SpooledTemporaryFile(max_size=8 << 20) as body:
+                    shutil.copyfileobj(request.stream, body, 1 << 20)
+                    body.seek(0)
+                    result = self._ingest_shared(iter_lines(body))
+                if result is None:
+                    return jsonify({"error": "Shared price snapshot unavailable"}), 503
+            else:
+                # Read the body in chunks rather than buffering it whole
+                result = self.price_analysis_agent.ingest_ndjson(iter_lines(request.stream))
+            applied = result["accepted"] + result["updated"] + result["duplicates"]
+            status = 400 if result["rejected"] and not applied else 200
+            return jsonify(result), status
+        
         @self.app.route('/api/alerts', methods=['GET'])
         def get_alerts():
             """Get price alerts"""
@@ -488,9 +1542,67 @@ class PriceTrackerSystem:
             data = request.get_json()
             query = self.security_manager.sanitize_input(data.get('query', ''))
             
-            results = self.info_retrieval_agent.search_products(query)
+            limit = min(int(data.get('limit', 20)), 100)
+            
+            results = self.info_retrieval_agent.search_products(query, limit)
             return jsonify(results)
         
+        @self.app.route('/api/search/suggest', methods=['GET'])
+        def suggest():
+            """Typeahead completions for a partial query"""
+            token = request.headers.get('Authorization', '').replace('Bearer ', '')
+            if not self.security_manager.verify_token(token):
+                return jsonify({"error": "Unauthorized"}), 401
+            
+            query = request.args.get('q', '')
+            limit = min(request.args.get('limit', 10, type=int), 50)
+            return jsonify({"query": query, "suggestions": self.info_retrieval_agent.suggest(query, limit)})
+        
+        @self.app.route('/api/products', methods=['GET'])
+        def list_products():
+            """List catalog products by category and/or price band"""
+            token = request.headers.get('Authorization', '').replace('Bearer ', '')
+            if not self.security_manager.verify_token(token):
+                return jsonify({"error": "Unauthorized"}), 401
+            
+            catalog = self.info_retrieval_agent.catalog
+            category = request.args.get('category')
+            band = request.args.get('band')
+            if category is not None:
+                products = catalog.by_category(category)
+                if band is not None:
+                    products = [product for product in products if product["price_band"] == band]
+            elif band is not None:
+                products = catalog.by_price_band(band)
+            else:
+                products = list(catalog)
+            return jsonify({"products": list(products), "price_bands": catalog.band_labels})
+        
+        @self.app.route('/api/products/<product_id>', methods=['GET'])
+        def get_product(product_id):
+            """Catalog record for a product, joined with its latest tracked price"""
+            token = request.headers.get('Authorization', '').replace('Bearer ', '')
+            if not self.security_manager.verify_token(token):
+                return jsonify({"error": "Unauthorized"}), 401
+            
+            product = self.info_retrieval_agent.get_product_details(product_id)
+            if product is None:
+                return jsonify({"error": f"Unknown product {product_id}"}), 404
+            return jsonify(product)
+        
+        @self.app.route('/api/products/<product_id>/similar', methods=['GET'])
+        def similar_products(product_id):
+            """Products most similar to a product by text vector cosine similarity"""
+            token = request.headers.get('Authorization', '').replace('Bearer ', '')
+            if not self.security_manager.verify_token(token):
+                return jsonify({"error": "Unauthorized"}), 401
+            
+            if self.info_retrieval_agent.get_product_details(product_id) is None:
+                return jsonify({"error": f"Unknown product {product_id}"}), 404
+            limit = min(request.args.get('k', 10, type=int), 100)
+            return jsonify({"product_id": product_id,
+                            "similar": self.info_retrieval_agent.similar_products(product_id, limit)})
+        
         @self.app.route('/api/insights', methods=['GET'])
         def get_insights():
             """Get market insights"""
@@ -501,6 +1613,54 @@ class PriceTrackerSystem:
             insights = self.info_retrieval_agent.get_market_insights()
             return jsonify(insights)
         
+        @self.app.route('/api/stats/cache', methods=['GET'])
+        def cache_stats():
+            """Cache hit/miss statistics"""
+            token = request.headers.get('Authorization', '').replace('Bearer ', '')
+            if not self.security_manager.verify_token(token):
+                return jsonify({"error": "Unauthorized"}), 401
+            
+            return jsonify({
+                "llm_insights": self.llm_agent.insight_cache.stats(),
+                "nlp": self.llm_agent.nlp_cache.stats(),
+                "retrieval": self.info_retrieval_agent.cache.stats(),
+                "auth_tokens": self.security_manager.active_tokens.stats(),
+                "llm_batching": self.llm_agent.insight_batcher.stats()
+            })
+        
+        @self.app.route('/api/stats/agents', methods=['GET'])
+        def agent_stats():
+            """Per-agent message queue depth, throughput and latency"""
+            token = request.headers.get('Authorization', '').replace('Bearer ', '')
+            if not self.security_manager.verify_token(token):
+                return jsonify({"error": "Unauthorized"}), 401
+            
+            return jsonify(self.communication_manager.stats())
+        
+        @self.app.route('/api/stats/models', methods=['GET'])
+        def model_stats():
+            """Model load state and load/unload timings"""
+            token = request.headers.get('Authorization', '').replace('Bearer ', '')
+            if not self.security_manager.verify_token(token):
+                return jsonify({"error": "Unauthorized"}), 401
+            
+            return jsonify(self.llm_agent.models.stats())
+        
+        @self.app.route('/api/stats/pool', methods=['GET'])
+        def pool_stats():
+            """Worker process pool queue, outcomes and task latency"""
+            token = request.headers.get('Authorization', '').replace('Bearer ', '')
+            if not self.security_manager.verify_token(token):
+                return jsonify({"error": "Unauthorized"}), 401
+            
+            if self.worker_pool is None:
+                return jsonify({"enabled": False})
+            return jsonify(dict(self.worker_pool.stats(), enabled=True, snapshot={
+                "in_sync": self._snapshot_version == self.price_analysis_agent.version,
+                "refreshes": self.snapshot_refreshes,
+                "batches_bypassed": self.pool_bypassed
+            }))
+        
         @self.app.route('/api/auth/login', methods=['POST'])
         def login():
             """User authentication"""
@@ -514,6 +1674,13 @@ class PriceTrackerSystem:
             else:
                 return jsonify({"error": "Invalid credentials"}), 401
         
+        @self.app.route('/api/ready', methods=['GET'])
+        def ready():
+            """Readiness probe: 200 while serving, 503 once draining for shutdown"""
+            if self.draining:
+                return jsonify({"status": "draining", "pid": os.getpid()}), 503
+            return jsonify({"status": "ready", "pid": os.getpid()})
+        
         @self.app.route('/api/test', methods=['GET'])
         def test_endpoint():
             """Test endpoint to verify server is working"""
@@ -524,6 +1691,17 @@ class PriceTrackerSystem:
                 "agents": list(self.communication_manager.agents.keys())
             })
     
+    def shutdown(self):
+        """Stop background workers: agent bus, insight jobs and the process pool"""
+        self.draining = True
+        with self._snapshot_lock:
+            if self._snapshot_timer is not None:
+                self._snapshot_timer.cancel()
+        self.communication_manager.close()
+        self.insight_jobs.shutdown()
+        if self.worker_pool is not None:
+            self.worker_pool.shutdown()
+    
     async def start_system(self):
         """Start the price tracker system"""
         logger.info("Starting Price Tracker System...")
@@ -548,10 +1726,21 @@ class PriceTrackerSystem:
         except KeyboardInterrupt:
             logger.info("Shutting down Price Tracker System...")
 
+def prepare_shared_state():
+    """Write the price snapshot (or seed the database) and product vectors once, before workers fork"""
+    store = PriceTrackerSystem.create_price_store()
+    PriceTrackerSystem.load_price_history(PriceAnalysisAgent(store))
+    if isinstance(store, SQLitePriceStore):
+        store.close()                                        # SQLite connections must not cross a fork
+    InformationRetrievalAgent()
+
 async def main():
     """Main function"""
     system = PriceTrackerSystem()
     await system.start_system()
 
 if __name__ == "__main__":
+    if CONFIG["server_workers"] > 0:
+        sys.exit(serve(lambda: PriceTrackerSystem(server_worker=True), prepare_shared_state,
+                       CONFIG["server_workers"], CONFIG["server_threads"]))
     asyncio.run(main())
@@ -0,0 +1,516 @@
+"""
+Agent communication bus
+In-process message channels, RPC and out-of-process agents over Unix sockets
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import pickle
+import struct
+import itertools
+import socket
+import tempfile
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+from price_tracker_config import CONFIG
+
+logger = logging.getLogger(__name__)
+
+def latency_summary(samples: List[float]) -> Dict:
+    """avg/p95/max in milliseconds of latency samples given in seconds"""
+    if not samples:
+        return {"avg": 0.0, "p95": 0.0, "max": 0.0}
+    ordered = sorted(samples)
+    return {
+        "avg": round(sum(ordered) / len(ordered) * 1000, 3),
+        "p95": round(ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))] * 1000, 3),
+        "max": round(ordered[-1] * 1000, 3)
+    }
+
+FRAME_HEADER = struct.Struct("!I")
+MAX_FRAME_BYTES = 256 << 20
+
+def encode_frame(obj) -> bytes:
+    """Pickle ``obj`` behind a 4-byte big-endian length prefix"""
+    payload = pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+    if len(payload) > MAX_FRAME_BYTES:
+        raise ValueError(f"Frame of {len(payload)} bytes exceeds the {MAX_FRAME_BYTES} byte limit")
+    return FRAME_HEADER.pack(len(payload)) + payload
+
+async def read_frame(reader: asyncio.StreamReader):
+    """Read one ``encode_frame`` frame; raises IncompleteReadError at EOF"""
+    (size,) = FRAME_HEADER.unpack(await reader.readexactly(FRAME_HEADER.size))
+    if size > MAX_FRAME_BYTES:
+        raise ValueError(f"Frame of {size} bytes exceeds the {MAX_FRAME_BYTES} byte limit")
+    return pickle.loads(await reader.readexactly(size))
+
+def _serve_agent(factory: Callable[[], object], socket_path: str):
+    """Worker process entry point: build the agent and serve it on ``socket_path``"""
+    logging.basicConfig(level=logging.INFO)
+    agent = factory()
+    asyncio.run(_agent_server(agent, socket_path, os.getppid()))
+
+async def _agent_server(agent, socket_path: str, parent_pid: int):
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        write_lock = asyncio.Lock()
+        tasks = set()
+        
+        async def run(request_id: int, message_data: Dict):
+            try:
+                reply = (request_id, True, await agent.handle_message(message_data))
+            except Exception as e:
+                reply = (request_id, False, e)
+            try:
+                frame = encode_frame(reply)
+            except Exception as e:
+                frame = encode_frame((request_id, False, RuntimeError(f"Unpicklable reply from agent: {e}")))
+            async with write_lock:
+                writer.write(frame)
+                await writer.drain()
+        
+        try:
+            while True:
+                request_id, message_data = await read_frame(reader)
+                task = asyncio.create_task(run(request_id, message_data))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            for task in tasks:
+                task.cancel()
+            writer.close()
+    
+    server = await asyncio.start_unix_server(handle, path=socket_path)
+    async with server:
+        # Exit with the parent even if it dies without terminating us
+        while os.getppid() == parent_pid:
+            await asyncio.sleep(1)
+
+class RemoteAgent:
+    """Proxy that runs an agent in a worker process behind a Unix domain socket"""
+    
+    def __init__(self, factory: Callable[[], object], name: str, socket_dir: Optional[str] = None,
+                 start_method: Optional[str] = None, startup_timeout: float = 120, max_backoff: float = 30):
+        self.factory = factory
+        self.name = name
+        self.socket_dir = socket_dir or CONFIG["agent_socket_dir"] or tempfile.gettempdir()
+        self.socket_path = os.path.join(self.socket_dir, f"agent-{name}-{os.getpid()}-{uuid.uuid4().hex[:8]}.sock")
+        self.startup_timeout = startup_timeout
+        self.max_backoff = max_backoff
+        self._context = multiprocessing.get_context(start_method or CONFIG["agent_start_method"])
+        self._process = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._write_lock: Optional[asyncio.Lock] = None
+        self._start_lock: Optional[asyncio.Lock] = None
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._request_ids = itertools.count()
+        self._failures = 0
+        self._lost = False
+        self._closed = False
+        self.restarts = 0
+    
+    @property
+    def pid(self) -> Optional[int]:
+        return self._process.pid if self._process is not None else None
+    
+    def is_alive(self) -> bool:
+        return self._process is not None and self._process.is_alive()
+    
+    def _spawn(self):
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        self._process = self._context.Process(target=_serve_agent, args=(self.factory, self.socket_path),
+                                              name=f"agent-{self.name}", daemon=True)
+        self._process.start()
+        logger.info(f"Started {self.name} agent worker (pid {self._process.pid})")
+    
+    async def _connect(self):
+        """Connect to the worker, spawning it first if it isn't running"""
+        if self._lost and self.is_alive():
+            # A dropped connection almost always means the worker is exiting; let it finish
+            # so we don't reconnect to a socket that is about to go away
+            await asyncio.to_thread(self._process.join, 1)
+        if not self.is_alive():
+            if self._process is not None:
+                self._process.join(0)
+                self.restarts += 1
+                backoff = min(self.max_backoff, 0.5 * 2 ** (self._failures - 1)) if self._failures else 0
+                logger.warning(f"{self.name} agent worker exited ({self._process.exitcode}), "
+                               f"restarting in {backoff:.1f}s")
+                await asyncio.sleep(backoff)
+            self._failures += 1
+            await asyncio.to_thread(self._spawn)
+        
+        deadline = time.monotonic() + self.startup_timeout
+        while True:
+            try:
+                self._reader, self._writer = await asyncio.open_unix_connection(self.socket_path)
+                break
+            except (FileNotFoundError, ConnectionRefusedError):
+                if not self.is_alive():
+                    raise ConnectionError(f"{self.name} agent worker exited during startup")
+                if time.monotonic() > deadline:
+                    self._process.terminate()
+                    raise ConnectionError(f"{self.name} agent worker did not start within {self.startup_timeout}s")
+                await asyncio.sleep(0.05)
+        self._lost = False
+        asyncio.get_running_loop().create_task(self._read_replies(self._reader), name=f"agent-{self.name}-replies")
+    
+    async def _read_replies(self, reader: asyncio.StreamReader):
+        try:
+            while True:
+                request_id, ok, value = await read_frame(reader)
+                self._failures = 0
+                future = self._pending.pop(request_id, None)
+                if future is None or future.done():
+                    continue                                 # caller timed out
+                if ok:
+                    future.set_result(value)
+                else:
+                    future.set_exception(value)
+        except (asyncio.IncompleteReadError, ConnectionError, OSError) as e:
+            current = reader is self._reader
+            if current:
+                self._reader = self._writer = None
+                self._lost = True
+            pending, self._pending = self._pending, {}
+            for future in pending.values():
+                if not future.done():
+                    future.set_exception(ConnectionError(f"Lost connection to {self.name} agent worker"))
+            if current and not self._closed:
+                logger.warning(f"Connection to {self.name} agent worker closed: {e!r}")
+                asyncio.get_running_loop().create_task(self._supervise(), name=f"agent-{self.name}-restart")
+    
+    async def _supervise(self):
+        """Bring a crashed worker back without waiting for the next message"""
+        async with self._start_lock:
+            if self._closed or (self._writer is not None and not self._writer.is_closing()):
+                return
+            try:
+                await self._connect()
+            except ConnectionError as e:
+                logger.error(f"Failed to restart {self.name} agent worker: {e}")
+    
+    async def handle_message(self, message_data: Dict):
+        """Forward a bus message to the worker and return its reply"""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Asyncio primitives belong to one loop; reconnect from the new one
+            self._loop, self._reader, self._writer = loop, None, None
+            self._write_lock, self._start_lock = asyncio.Lock(), asyncio.Lock()
+            self._pending = {}
+        async with self._start_lock:
+            if self._closed:
+                raise ConnectionError(f"{self.name} agent is closed")
+            if self._writer is None or self._writer.is_closing():
+                await self._connect()
+        
+        request_id = next(self._request_ids)
+        future = loop.create_future()
+        self._pending[request_id] = future
+        try:
+            async with self._write_lock:
+                self._writer.write(encode_frame((request_id, message_data)))
+                await self._writer.drain()
+            return await future
+        finally:
+            self._pending.pop(request_id, None)
+    
+    def close(self):
+        """Stop the worker process and remove its socket"""
+        self._closed = True
+        if self._writer is not None and self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._writer.close)
+        if self._process is not None:
+            self._process.terminate()
+            self._process.join(5)
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+    
+    def stats(self) -> Dict:
+        return {
+            "pid": self.pid,
+            "alive": self.is_alive(),
+            "restarts": self.restarts,
+            "in_flight": len(self._pending),
+            "socket": self.socket_path
+        }
+
+class _AgentChannel:
+    """Bounded inbox, worker tasks and metrics for one registered agent"""
+    
+    __slots__ = ("agent", "queue", "workers", "tasks", "sent", "rejected", "processed", "errors",
+                 "max_depth", "latencies", "waits", "requests", "timeouts", "expired", "round_trips")
+    
+    def __init__(self, agent, queue_size: int, workers: int):
+        self.agent = agent
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.workers = workers
+        self.tasks: List[asyncio.Task] = []
+        self.sent = 0
+        self.rejected = 0
+        self.processed = 0
+        self.errors = 0
+        self.max_depth = 0
+        self.latencies: "deque[float]" = deque(maxlen=1024)   # handle_message seconds, most recent
+        self.waits: "deque[float]" = deque(maxlen=1024)       # seconds spent queued
+        self.requests = 0
+        self.timeouts = 0
+        self.expired = 0                                      # deadline passed while queued
+        self.round_trips: "deque[float]" = deque(maxlen=1024) # request() send-to-reply seconds
+    
+    def stats(self) -> Dict:
+        return {
+            "queue_depth": self.queue.qsize(),
+            "queue_size": self.queue.maxsize,
+            "max_queue_depth": self.max_depth,
+            "workers": self.workers,
+            "sent": self.sent,
+            "rejected": self.rejected,
+            "processed": self.processed,
+            "errors": self.errors,
+            "latency_ms": latency_summary(list(self.latencies)),
+            "queue_wait_ms": latency_summary(list(self.waits)),
+            "requests": {
+                "count": self.requests,
+                "timeouts": self.timeouts,
+                "expired": self.expired,
+                "latency_ms": latency_summary(list(self.round_trips))
+            }
+        }
+
+class CommunicationManager:
+    """Manages communication between agents and external systems"""
+    
+    def __init__(self, host: str = "localhost", port: int = 5000, queue_size: Optional[int] = None,
+                 workers: Optional[int] = None, backpressure: Optional[str] = None):
+        self.host = host
+        self.port = port
+        self.agents = {}
+        self.queue_size = CONFIG["agent_queue_size"] if queue_size is None else queue_size
+        self.workers = CONFIG["agent_workers"] if workers is None else workers
+        self.backpressure = backpressure or CONFIG["agent_backpressure"]
+        if self.backpressure not in ("block", "reject"):
+            raise ValueError(f"Unknown backpressure mode {self.backpressure!r}, expected 'block' or 'reject'")
+        self._channels: Dict[str, _AgentChannel] = {}
+        self._running = False
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._stopped: Optional[asyncio.Event] = None
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._loop_lock = threading.Lock()
+    
+    def register_agent(self, agent_id: str, agent, workers: Optional[int] = None, queue_size: Optional[int] = None):
+        """Register an agent for communication"""
+        self.agents[agent_id] = agent
+        previous = self._channels.get(agent_id)
+        if self._running and previous is not None:
+            for task in previous.tasks:
+                task.cancel()
+        if not callable(getattr(agent, 'handle_message', None)):
+            self._channels.pop(agent_id, None)
+            logger.info(f"Registered agent: {agent_id} (no message handler, not reachable over the bus)")
+            return
+        channel = _AgentChannel(agent, self.queue_size if queue_size is None else queue_size,
+                                self.workers if workers is None else workers)
+        self._channels[agent_id] = channel
+        if self._running:
+            self._start_workers(agent_id, channel)
+        logger.info(f"Registered agent: {agent_id} ({channel.workers} workers, queue {channel.queue.maxsize})")
+    
+    async def send_message(self, from_agent: str, to_agent: str, message: Dict,
+                           block: Optional[bool] = None, correlation_id: Optional[str] = None,
+                           deadline: Optional[float] = None) -> bool:
+        """Send message between agents; False if the agent is unknown or its queue is full"""
+        channel = self._channels.get(to_agent)
+        if channel is None:
+            if to_agent in self.agents:
+                logger.warning(f"Agent {to_agent} does not handle messages")
+            else:
+                logger.warning(f"Agent {to_agent} not found")
+            return False
+        
+        message_data = {
+            "from": from_agent,
+            "to": to_agent,
+            "message": message,
+            "timestamp": datetime.now().isoformat()
+        }
+        if correlation_id is not None:
+            message_data["correlation_id"] = correlation_id
+            message_data["deadline"] = deadline
+        item = (time.monotonic(), message_data)
+        if block is None:
+            block = self.backpressure == "block"
+        if block:
+            await channel.queue.put(item)
+        else:
+            try:
+                channel.queue.put_nowait(item)
+            except asyncio.QueueFull:
+                channel.rejected += 1
+                logger.warning(f"Queue for {to_agent} is full, rejected message from {from_agent}")
+                return False
+        channel.sent += 1
+        channel.max_depth = max(channel.max_depth, channel.queue.qsize())
+        logger.debug(f"Message sent from {from_agent} to {to_agent}")
+        return True
+    
+    async def request(self, to_agent: str, message: Dict, timeout: Optional[float] = None,
+                      from_agent: str = "system"):
+        """Send ``message`` and await the agent's reply; raises TimeoutError after ``timeout`` seconds"""
+        channel = self._channels.get(to_agent)
+        if channel is None:
+            reason = "does not handle messages" if to_agent in self.agents else "not found"
+            raise RuntimeError(f"Agent {to_agent} {reason}")
+        timeout = CONFIG["agent_timeout"] if timeout is None else timeout
+        correlation_id = uuid.uuid4().hex
+        reply = asyncio.get_running_loop().create_future()
+        self._pending[correlation_id] = reply
+        channel.requests += 1
+        started = time.monotonic()
+        try:
+            # The deadline covers queueing too, so a blocked put counts against it
+            sent = await asyncio.wait_for(
+                self.send_message(from_agent, to_agent, message, correlation_id=correlation_id,
+                                  deadline=time.time() + timeout),
+                timeout
+            )
+            if not sent:
+                raise RuntimeError(f"Agent {to_agent} rejected the request")
+            return await asyncio.wait_for(reply, max(0.0, timeout - (time.monotonic() - started)))
+        except asyncio.TimeoutError:
+            channel.timeouts += 1
+            raise TimeoutError(f"No reply from {to_agent} within {timeout}s") from None
+        finally:
+            self._pending.pop(correlation_id, None)
+            channel.round_trips.append(time.monotonic() - started)
+    
+    async def broadcast_message(self, from_agent: str, message: Dict) -> Dict[str, bool]:
+        """Broadcast message to every agent that handles messages; returns whether each was queued"""
+        recipients = [agent_id for agent_id in self._channels if agent_id != from_agent]
+        results = await asyncio.gather(*(self.send_message(from_agent, agent_id, message)
+                                         for agent_id in recipients))
+        return dict(zip(recipients, results))
+    
+    async def _worker(self, agent_id: str, channel: _AgentChannel):
+        handler = channel.agent.handle_message
+        while True:
+            enqueued_at, message_data = await channel.queue.get()
+            started = time.monotonic()
+            channel.waits.append(started - enqueued_at)
+            reply = self._pending.get(message_data.get("correlation_id"))
+            try:
+                if "correlation_id" in message_data and (reply is None or reply.done()):
+                    channel.expired += 1                     # the requester already gave up
+                    continue
+                deadline = message_data.get("deadline")
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    channel.expired += 1
+                    reply.set_exception(TimeoutError(f"Deadline passed before {agent_id} handled the request"))
+                    continue
+                result = await asyncio.wait_for(handler(message_data), remaining)
+                channel.processed += 1
+                if reply is not None and not reply.done():
+                    reply.set_result(result)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                channel.errors += 1
+                if reply is not None and not reply.done():
+                    reply.set_exception(e)
+                else:
+                    logger.error(f"Error processing message for {agent_id}: {e}")
+            finally:
+                channel.latencies.append(time.monotonic() - started)
+                channel.queue.task_done()
+    
+    def _start_workers(self, agent_id: str, channel: _AgentChannel):
+        channel.tasks = [self._loop.create_task(self._worker(agent_id, channel), name=f"agent-{agent_id}-{i}")
+                         for i in range(channel.workers)]
+    
+    async def process_messages(self):
+        """Run every agent's workers until ``stop()`` is called or this task is cancelled"""
+        self._loop = asyncio.get_running_loop()
+        self._stopped = asyncio.Event()
+        self._running = True
+        for agent_id, channel in self._channels.items():
+            self._start_workers(agent_id, channel)
+        try:
+            await self._stopped.wait()
+        except asyncio.CancelledError:
+            logger.info("Message processing cancelled")
+        finally:
+            self._running = False
+            tasks = [task for channel in self._channels.values() for task in channel.tasks]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            for channel in self._channels.values():
+                channel.tasks = []
+    
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        """The running bus loop, started on a daemon thread if nothing runs it yet"""
+        with self._loop_lock:
+            if self._running and self._loop is not None and self._loop.is_running():
+                return self._loop
+            started = threading.Event()
+            
+            async def serve():
+                processor = asyncio.create_task(self.process_messages())
+                await asyncio.sleep(0)                       # let it set _loop and start workers
+                started.set()
+                await processor
+            
+            threading.Thread(target=asyncio.run, args=(serve(),), name="agent-bus", daemon=True).start()
+            started.wait()
+            return self._loop
+    
+    def call_many(self, requests: List[Tuple[str, Dict]], timeout: Optional[float] = None) -> List:
+        """Blocking fan-out from a non-bus thread; returns the replies in order and raises the first failure"""
+        timeout = CONFIG["agent_timeout"] if timeout is None else timeout
+        
+        async def fan_out():
+            return await asyncio.gather(*(self.request(agent_id, message, timeout) for agent_id, message in requests))
+        
+        return asyncio.run_coroutine_threadsafe(fan_out(), self._ensure_loop()).result()
+    
+    def call(self, to_agent: str, message: Dict, timeout: Optional[float] = None):
+        """Blocking ``request`` from a non-bus thread"""
+        return self.call_many([(to_agent, message)], timeout)[0]
+    
+    async def join(self):
+        """Wait until every queued message has been handled"""
+        await asyncio.gather(*(channel.queue.join() for channel in self._channels.values()))
+    
+    def stats(self) -> Dict:
+        """Per-agent queue depth, throughput and latency"""
+        stats = {}
+        for agent_id, channel in self._channels.items():
+            stats[agent_id] = channel.stats()
+            if isinstance(channel.agent, RemoteAgent):
+                stats[agent_id]["process"] = channel.agent.stats()
+        return stats
+    
+    def close(self):
+        """Stop the bus and any out-of-process agent workers"""
+        self.stop()
+        for channel in self._channels.values():
+            if isinstance(channel.agent, RemoteAgent):
+                channel.agent.close()
+    
+    def stop(self):
+        """Stop the communication manager"""
+        self._running = False
+        if self._loop is not None and self._stopped is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._stopped.set)
@@ -0,0 +1,72 @@
+"""
+Price Tracker configuration
+Settings read from the environment, shared by every module
+"""
+
+import os
+from cryptography.fernet import Fernet
+
+CONFIG = {
+    "openai_api_key": "your-openai-api-key-here",
+    "jwt_secret": "your-jwt-secret-here",
+    "encryption_key": Fernet.generate_key(),
+    "port": int(os.getenv("PORT", "5000")),
+    "host": os.getenv("HOST", "0.0.0.0"),
+    "server_workers": int(os.getenv("SERVER_WORKERS", "0")),
+    "server_threads": int(os.getenv("SERVER_THREADS", "8")),
+    "graceful_timeout": float(os.getenv("GRACEFUL_TIMEOUT", "30")),
+    "ready_file": os.getenv("READY_FILE", ""),
+    "session_db": os.getenv("SESSION_DB", ""),
+    "jobs_db": os.getenv("JOBS_DB", ""),
+    "products_path": os.getenv("PRODUCTS_PATH", "frontend/src/data/products.json"),
+    "price_bands": [float(edge) for edge in os.getenv("PRICE_BANDS", "1000,5000,20000,50000").split(",") if edge.strip()],
+    "product_vectors_path": os.getenv("PRODUCT_VECTORS_PATH", "product_vectors"),
+    "vector_dim": int(os.getenv("VECTOR_DIM", "256")),
+    "price_snapshot_path": os.getenv("PRICE_SNAPSHOT_PATH", "price_history.snap"),
+    "database_url": os.getenv("DATABASE_URL", ""),
+    "price_cache_products": int(os.getenv("PRICE_CACHE_PRODUCTS", "10000")),
+    "llm_cache_size": int(os.getenv("LLM_CACHE_SIZE", "1000")),
+    "llm_cache_ttl": float(os.getenv("LLM_CACHE_TTL", "3600")),
+    "llm_cache_path": os.getenv("LLM_CACHE_PATH", ""),
+    "nlp_cache_size": int(os.getenv("NLP_CACHE_SIZE", "10000")),
+    "nlp_cache_ttl": float(os.getenv("NLP_CACHE_TTL", str(30 * 86400))),
+    "nlp_cache_path": os.getenv("NLP_CACHE_PATH", ""),
+    "search_max_postings": int(os.getenv("SEARCH_MAX_POSTINGS", "65536")),
+    "ir_cache_size": int(os.getenv("IR_CACHE_SIZE", "5000")),
+    "ir_cache_ttl": float(os.getenv("IR_CACHE_TTL", "3600")),
+    "ir_cache_ttls": {name.strip(): float(ttl) for name, _, ttl in
+                      (item.partition("=") for item in os.getenv("IR_CACHE_TTLS", "search=300,insights=60").split(","))
+                      if name.strip()},
+    "openai_base_url": os.getenv("OPENAI_BASE_URL") or None,
+    "llm_batch_window_ms": float(os.getenv("LLM_BATCH_WINDOW_MS", "5")),
+    "llm_batch_max_wait_ms": float(os.getenv("LLM_BATCH_MAX_WAIT_MS", "50")),
+    "llm_batch_size": int(os.getenv("LLM_BATCH_SIZE", "20")),
+    "summarizer_model": os.getenv("SUMMARIZER_MODEL", "facebook/bart-large-cnn"),
+    "summarizer_batch_size": int(os.getenv("SUMMARIZER_BATCH_SIZE", "8")),
+    "summarizer_profile": os.getenv("SUMMARIZER_PROFILE", "fp32"),
+    "summarizer_distilled_path": os.getenv("SUMMARIZER_DISTILLED_PATH", ""),
+    "model_local_files_only": os.getenv("MODEL_LOCAL_FILES_ONLY", "false").lower() in ("1", "true", "yes"),
+    "torch_num_threads": int(os.getenv("TORCH_NUM_THREADS", "0")),
+    "torch_cpu_affinity": os.getenv("TORCH_CPU_AFFINITY", ""),
+    "ner_model": os.getenv("NER_MODEL", "en_core_web_sm"),
+    "ner_batch_size": int(os.getenv("NER_BATCH_SIZE", "256")),
+    "ner_processes": int(os.getenv("NER_PROCESSES", "1")),
+    "model_idle_timeout": float(os.getenv("MODEL_IDLE_TIMEOUT", "900")),
+    "model_memory_limit_mb": float(os.getenv("MODEL_MEMORY_LIMIT_MB", "0")),
+    "model_warmup": [name for name in os.getenv("MODEL_WARMUP", "").split(",") if name.strip()],
+    "max_active_tokens": int(os.getenv("MAX_ACTIVE_TOKENS", "100000")),
+    "token_verify_cache_ttl": float(os.getenv("TOKEN_VERIFY_CACHE_TTL", "30")),
+    "agent_timeout": float(os.getenv("AGENT_TIMEOUT", "30")),
+    "agent_queue_size": int(os.getenv("AGENT_QUEUE_SIZE", "1000")),
+    "agent_workers": int(os.getenv("AGENT_WORKERS", "2")),
+    "agent_backpressure": os.getenv("AGENT_BACKPRESSURE", "block"),
+    "pool_workers": int(os.getenv("POOL_WORKERS", "0")),
+    "pool_max_pending": int(os.getenv("POOL_MAX_PENDING", "256")),
+    "pool_task_timeout": float(os.getenv("POOL_TASK_TIMEOUT", "30")),
+    "pool_warm_models": [name.strip() for name in os.getenv("POOL_WARM_MODELS", "").split(",") if name.strip()],
+    "snapshot_debounce": float(os.getenv("SNAPSHOT_DEBOUNCE", "2")),
+    "remote_agents": [name.strip() for name in os.getenv("REMOTE_AGENTS", "").split(",") if name.strip()],
+    "agent_start_method": os.getenv("AGENT_START_METHOD", "spawn"),
+    "agent_socket_dir": os.getenv("AGENT_SOCKET_DIR", ""),
+    "max_concurrent_agents": int(os.getenv("MAX_CONCURRENT_AGENTS", "10"))
+}
@@ -0,0 +1,330 @@
+"""
+Model loading for the NLP agents
+Lazy model manager, summarizer profiles and LLM request batching
+"""
+
+import logging
+import json
+import gc
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+class InsightBatcher:
+    """Coalesces concurrent price-insight requests into multi-product prompts"""
+    
+    def __init__(self, client, model: str, system_prompt: str, window: float = 0.005,
+                 max_wait: float = 0.05, max_batch: int = 20, max_workers: int = 4,
+                 timeout: Optional[float] = None):
+        self.client = client
+        self.model = model
+        self.system_prompt = system_prompt
+        self.window = window
+        self.max_wait = max_wait
+        self.max_batch = max_batch
+        self.timeout = timeout
+        self._queue: List[Tuple[str, Future]] = []
+        self._cond = threading.Condition()
+        self._last_arrival = 0.0
+        self._thread = None
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm-batch")
+        self.requests = 0
+        self.completions = 0
+        self.fallbacks = 0
+    
+    def _complete(self, messages: List[Dict], max_tokens: int, timeout: Optional[float]) -> str:
+        kwargs = {"timeout": timeout} if timeout is not None else {}
+        with self._cond:
+            self.completions += 1
+        response = self.client.chat.completions.create(
+            model=self.model, messages=messages, max_tokens=max_tokens, **kwargs
+        )
+        return response.choices[0].message.content
+    
+    def request_one(self, summary: str, timeout: Optional[float] = None) -> str:
+        """Single-product completion (the unbatched prompt)"""
+        return self._complete([
+            {"role": "system", "content": self.system_prompt},
+            {"role": "user", "content": f"Analyze this price data: {summary}"}
+        ], max_tokens=150, timeout=timeout)
+    
+    def request_many(self, summaries: List[str], timeout: Optional[float] = None) -> Dict[int, str]:
+        """One completion for several products; returns insights by summary index"""
+        keyed = {f"p{i}": summary for i, summary in enumerate(summaries)}
+        reply = self._complete([
+            {"role": "system", "content": self.system_prompt + " You will be given several products keyed by ID. "
+                                          "Reply with only a JSON object mapping each ID to its insight."},
+            {"role": "user", "content": f"Analyze this price data for each product: {json.dumps(keyed)}"}
+        ], max_tokens=min(150 * len(summaries), 4000), timeout=timeout)
+        
+        reply = reply.strip()
+        if reply.startswith("```"):
+            reply = reply.strip("`").removeprefix("json").strip()
+        parsed = json.loads(reply)
+        if not isinstance(parsed, dict):
+            raise ValueError("batched reply is not a JSON object")
+        return {int(key[1:]): value for key, value in parsed.items()
+                if key in keyed and isinstance(value, str) and value.strip()}
+    
+    def submit(self, summary: str) -> Future:
+        """Queue a summary for the next batch; the future resolves to its insight"""
+        future = Future()
+        with self._cond:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._collect, name="llm-batcher", daemon=True)
+                self._thread.start()
+            self._queue.append((summary, future))
+            self._last_arrival = time.monotonic()
+            self.requests += 1
+            self._cond.notify()
+        return future
+    
+    def _collect(self):
+        while True:
+            with self._cond:
+                while not self._queue:
+                    self._cond.wait()
+                first_arrival = time.monotonic()
+                while len(self._queue) < self.max_batch:
+                    deadline = min(self._last_arrival + self.window, first_arrival + self.max_wait)
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch = self._queue[:self.max_batch]
+                del self._queue[:self.max_batch]
+            self._executor.submit(self._dispatch, batch)
+    
+    def _dispatch(self, batch: List[Tuple[str, Future]]):
+        # Identical summaries share one slot in the prompt
+        waiting: Dict[str, List[Future]] = {}
+        for summary, future in batch:
+            waiting.setdefault(summary, []).append(future)
+        summaries = list(waiting)
+        
+        insights: Dict[int, str] = {}
+        if len(summaries) > 1:
+            try:
+                insights = self.request_many(summaries, self.timeout)
+            except Exception as e:
+                logger.warning(f"Batched insight request failed, falling back to single requests: {e}")
+        
+        for i, summary in enumerate(summaries):
+            try:
+                if i not in insights:
+                    if len(summaries) > 1:
+                        with self._cond:
+                            self.fallbacks += 1
+                    insights[i] = self.request_one(summary, self.timeout)
+                result, error = insights[i], None
+            except Exception as e:
+                result, error = None, e
+            for future in waiting[summary]:
+                if error is None:
+                    future.set_result(result)
+                else:
+                    future.set_exception(error)
+    
+    def stats(self) -> Dict:
+        return {"requests": self.requests, "completions": self.completions, "fallbacks": self.fallbacks}
+
+def estimate_model_bytes(model) -> int:
+    """Parameter memory of a torch model or Hugging Face pipeline (0 if unknown)"""
+    module = getattr(model, "model", model)
+    state_dict = getattr(module, "state_dict", None)
+    if not callable(state_dict):
+        return 0
+    try:
+        # state_dict (unlike parameters()) includes quantized Linear weights, packed as (weight, bias) tuples
+        tensors, seen = [], set()
+        for value in state_dict().values():
+            tensors.extend(value if isinstance(value, tuple) else [value])
+        total = 0
+        for tensor in tensors:
+            if hasattr(tensor, "is_quantized") and tensor.is_quantized:
+                key = (id(tensor),)
+            elif hasattr(tensor, "data_ptr"):
+                key = tensor.data_ptr()
+            else:
+                continue
+            if key not in seen:
+                seen.add(key)
+                total += tensor.numel() * tensor.element_size()
+        return total
+    except Exception:
+        return 0
+
+SUMMARIZER_PROFILES = ("fp32", "int8", "distilled")
+
+def parse_cpu_list(spec: str) -> List[int]:
+    """Parse a Linux-style CPU list such as "0-3,6" """
+    cpus = set()
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        first, _, last = part.partition("-")
+        cpus.update(range(int(first), int(last or first) + 1))
+    return sorted(cpus)
+
+def summarizer_model_id(profile: str, model_name: str, distilled_path: str = "") -> str:
+    """Checkpoint and precision that a summarizer inference profile runs"""
+    if profile not in SUMMARIZER_PROFILES:
+        raise ValueError(f"Unknown summarizer profile {profile!r}, expected one of {SUMMARIZER_PROFILES}")
+    if profile == "distilled":
+        if not distilled_path:
+            raise ValueError("The distilled summarizer profile needs SUMMARIZER_DISTILLED_PATH")
+        return distilled_path
+    return model_name if profile == "fp32" else f"{model_name}:{profile}"
+
+def load_summarizer(model_name: str, profile: str = "fp32", local_files_only: bool = False,
+                    num_threads: int = 0, cpu_affinity: Optional[List[int]] = None):
+    """Build a CPU summarization pipeline for an inference profile (fp32, int8 or distilled)"""
+    if profile not in SUMMARIZER_PROFILES:
+        raise ValueError(f"Unknown summarizer profile {profile!r}, expected one of {SUMMARIZER_PROFILES}")
+    import torch
+    from transformers import AutoModelForSeq2SeqLM, AutoTokenizer, pipeline
+    
+    # Pin before torch spins up its intra-op pool so worker threads inherit the mask
+    if cpu_affinity and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cpu_affinity)
+    if num_threads > 0:
+        torch.set_num_threads(num_threads)
+    
+    tokenizer = AutoTokenizer.from_pretrained(model_name, local_files_only=local_files_only)
+    model = AutoModelForSeq2SeqLM.from_pretrained(model_name, local_files_only=local_files_only)
+    model.eval()
+    if profile == "int8":
+        model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    return pipeline("summarization", model=model, tokenizer=tokenizer, device=-1)
+
+class ModelManager:
+    """Loads models on first use and unloads them when idle or over the memory budget"""
+    
+    def __init__(self, idle_timeout: float = 900, memory_limit: int = 0, reap_interval: float = 30):
+        self.idle_timeout = idle_timeout
+        self.memory_limit = memory_limit
+        self.reap_interval = reap_interval
+        self._models: "OrderedDict[str, Dict]" = OrderedDict()
+        self._lock = threading.RLock()
+        self._reaper = None
+    
+    def register(self, name: str, loader: Callable[[], object], size_bytes: int = 0):
+        """Register a loader; ``size_bytes`` is used when the size can't be measured"""
+        with self._lock:
+            self._models[name] = {
+                "loader": loader,
+                "model": None,
+                "loaded": False,
+                "load_lock": threading.Lock(),
+                "size_bytes": size_bytes,
+                "estimated_bytes": size_bytes,
+                "last_used": 0.0,
+                "loads": 0,
+                "unloads": 0,
+                "load_seconds": None,
+                "unload_seconds": None
+            }
+    
+    def get(self, name: str):
+        """Return the model, loading it (and evicting others if needed) on first use"""
+        entry = self._models[name]
+        with self._lock:
+            if entry["loaded"]:
+                entry["last_used"] = time.time()
+                self._models.move_to_end(name)
+                return entry["model"]
+        
+        with entry["load_lock"]:
+            if entry["loaded"]:
+                return self.get(name)
+            self._make_room(name, entry["estimated_bytes"])
+            
+            start = time.perf_counter()
+            model = entry["loader"]()
+            elapsed = time.perf_counter() - start
+            
+            with self._lock:
+                entry["model"] = model
+                entry["loaded"] = True
+                entry["size_bytes"] = estimate_model_bytes(model) or entry["estimated_bytes"]
+                entry["last_used"] = time.time()
+                entry["loads"] += 1
+                entry["load_seconds"] = round(elapsed, 3)
+                self._models.move_to_end(name)
+                self._make_room(name, 0)
+            logger.info(f"Loaded model {name} in {elapsed:.2f}s ({entry['size_bytes'] / 2**20:.0f} MB)")
+        
+        self._start_reaper()
+        return model
+    
+    def _make_room(self, name: str, incoming_bytes: int):
+        """Evict least recently used models until ``incoming_bytes`` fits the budget"""
+        if not self.memory_limit:
+            return
+        with self._lock:
+            for other, entry in list(self._models.items()):
+                used = sum(e["size_bytes"] for e in self._models.values() if e["loaded"])
+                if used + incoming_bytes <= self.memory_limit:
+                    break
+                if other != name and entry["loaded"]:
+                    logger.info(f"Evicting model {other} to stay under the model memory limit")
+                    self.unload(other)
+    
+    def unload(self, name: str):
+        with self._lock:
+            entry = self._models[name]
+            if not entry["loaded"]:
+                return
+            start = time.perf_counter()
+            entry["model"] = None
+            entry["loaded"] = False
+            gc.collect()
+            entry["unloads"] += 1
+            entry["unload_seconds"] = round(time.perf_counter() - start, 3)
+    
+    def warm_up(self, *names: str):
+        """Load models ahead of the first request"""
+        for name in names:
+            if name in self._models:
+                self.get(name)
+            else:
+                logger.warning(f"Cannot warm up unknown model {name}")
+    
+    def unload_idle(self):
+        now = time.time()
+        with self._lock:
+            idle = [name for name, entry in self._models.items()
+                    if entry["loaded"] and now - entry["last_used"] > self.idle_timeout]
+            for name in idle:
+                logger.info(f"Unloading idle model {name}")
+                self.unload(name)
+    
+    def _start_reaper(self):
+        with self._lock:
+            if self._reaper is not None or not self.idle_timeout:
+                return
+            
+            def reap():
+                while True:
+                    time.sleep(self.reap_interval)
+                    self.unload_idle()
+            
+            self._reaper = threading.Thread(target=reap, name="model-reaper", daemon=True)
+            self._reaper.start()
+    
+    def is_loaded(self, name: str) -> bool:
+        return self._models[name]["loaded"]
+    
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                name: {key: entry[key] for key in ("loaded", "size_bytes", "loads", "unloads",
+                                                   "load_seconds", "unload_seconds", "last_used")}
+                for name, entry in self._models.items()
+            }
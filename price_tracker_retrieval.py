@@ -0,0 +1,670 @@
+"""
+Product retrieval
+Catalog, BM25 search index, similar-product vectors and the retrieval cache
+"""
+
+import logging
+import json
+import bisect
+import heapq
+import os
+import re
+import sqlite3
+import hashlib
+import threading
+import time
+import zlib
+from array import array
+from collections import OrderedDict
+from concurrent.futures import Future
+from datetime import datetime
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+import numpy as np
+
+from price_tracker_storage import from_epoch_day
+
+logger = logging.getLogger(__name__)
+
+class TieredCache:
+    """Thread-safe LRU cache with per-namespace TTLs and an optional on-disk SQLite tier"""
+    
+    _MISSING = object()
+    
+    def __init__(self, max_entries: int = 1000, ttl: float = 3600, disk_path: str = "",
+                 namespace_ttls: Optional[Dict[str, float]] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.namespace_ttls = dict(namespace_ttls or {})
+        self._entries: "OrderedDict[str, Tuple[float, object]]" = OrderedDict()
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.coalesced = 0
+        
+        self._disk = None
+        if disk_path:
+            self._disk = sqlite3.connect(disk_path, check_same_thread=False)
+            self._disk.execute("PRAGMA journal_mode=WAL")
+            self._disk.execute(
+                "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._disk.commit()
+    
+    @staticmethod
+    def make_key(*parts: str) -> str:
+        """Stable content hash of the parts that determine a cached value"""
+        digest = hashlib.sha256()
+        for part in parts:
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\x00")
+        return digest.hexdigest()
+    
+    def _remember(self, key: str, expires_at: float, value):
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+    
+    def get(self, key: str, default=None):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                del self._entries[key]
+            
+            if self._disk is not None:
+                row = self._disk.execute("SELECT value, expires_at FROM cache WHERE key = ?", (key,)).fetchone()
+                if row is not None and row[1] > now:
+                    value = json.loads(row[0])
+                    self._remember(key, row[1], value)
+                    self.disk_hits += 1
+                    return value
+                if row is not None:
+                    self._disk.execute("DELETE FROM cache WHERE key = ?", (key,))
+                    self._disk.commit()
+            
+            self.misses += 1
+            return default
+    
+    def peek(self, key: str, default=None):
+        """Look up ``key`` without touching LRU order or hit/miss counters"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                return entry[1]
+            if self._disk is not None:
+                row = self._disk.execute("SELECT value, expires_at FROM cache WHERE key = ?", (key,)).fetchone()
+                if row is not None and row[1] > now:
+                    return json.loads(row[0])
+            return default
+    
+    def ttl_for(self, key: str) -> float:
+        return self.namespace_ttls.get(key.partition(":")[0], self.ttl)
+    
+    def set(self, key: str, value, ttl: Optional[float] = None):
+        expires_at = time.time() + (self.ttl_for(key) if ttl is None else ttl)
+        with self._lock:
+            self._remember(key, expires_at, value)
+            if self._disk is not None:
+                self._disk.execute("INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+                                   (key, json.dumps(value), expires_at))
+                self._disk.commit()
+    
+    def get_or_compute(self, key: str, compute: Callable[[], object], ttl: Optional[float] = None):
+        """Cached value for ``key``; concurrent misses share one ``compute()`` call"""
+        value = self.get(key, self._MISSING)
+        if value is not self._MISSING:
+            return value
+        
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.time():       # filled since our miss
+                return entry[1]
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+            else:
+                self.coalesced += 1
+        if not leader:
+            return future.result()
+        
+        try:
+            value = compute()
+            self.set(key, value, ttl)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(value)
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+        return value
+    
+    def delete(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+            if self._disk is not None:
+                self._disk.execute("DELETE FROM cache WHERE key = ?", (key,))
+                self._disk.commit()
+    
+    def clear(self, prefix: str = ""):
+        """Drop every entry, or only those whose key starts with ``prefix``"""
+        with self._lock:
+            if not prefix:
+                self._entries.clear()
+            else:
+                for key in [key for key in self._entries if key.startswith(prefix)]:
+                    del self._entries[key]
+            if self._disk is not None:
+                self._disk.execute("DELETE FROM cache WHERE substr(key, 1, ?) = ?", (len(prefix), prefix))
+                self._disk.commit()
+    
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "coalesced": self.coalesced,
+                "in_flight": len(self._inflight),
+                "hit_rate": round((self.hits + self.disk_hits) / lookups, 3) if lookups else 0.0
+            }
+
+class ProductCatalog:
+    """Product records keyed by ID, with category and price-band indexes (records are read-only)"""
+    
+    _EMPTY: Tuple[Dict, ...] = ()
+    
+    def __init__(self, price_bands: Iterable[float] = (1000, 5000, 20000, 50000)):
+        self.band_edges = sorted(price_bands)
+        bounds = [0.0] + self.band_edges
+        self.band_labels = tuple(f"{low:g}-{high:g}" for low, high in zip(bounds, bounds[1:])) + \
+            (f"{bounds[-1]:g}+",)
+        self._products: Dict[str, Dict] = {}
+        self._by_category: Dict[str, Tuple[Dict, ...]] = {}
+        self._by_band: Dict[str, Tuple[Dict, ...]] = {}
+        self.categories: Tuple[str, ...] = ()
+        self.price_range = {"min": None, "max": None}
+        self.last_updated: Optional[str] = None
+    
+    def price_band(self, price: float) -> str:
+        return self.band_labels[bisect.bisect_right(self.band_edges, price)]
+    
+    def load(self, file_path: str) -> int:
+        """Load products from a JSON array file; returns the number loaded"""
+        try:
+            with open(file_path, 'r') as f:
+                self.add_products(json.load(f))
+            logger.info(f"Loaded {len(self)} products from {file_path}")
+        except Exception as e:
+            logger.error(f"Failed to load product catalog: {e}")
+        return len(self)
+    
+    def add_products(self, products: Iterable[Dict]):
+        """Add or replace ``{id, name, category, price}`` products and rebuild the indexes"""
+        for product in products:
+            record = dict(product)
+            record["id"] = str(record["id"])
+            record["price"] = float(record.get("price") or 0)
+            record["price_band"] = self.price_band(record["price"])
+            previous = self._products.get(record["id"])
+            record["latest_price"] = previous["latest_price"] if previous else None
+            record["latest_price_date"] = previous["latest_price_date"] if previous else None
+            self._products[record["id"]] = record
+        
+        by_category: Dict[str, List[Dict]] = {}
+        by_band: Dict[str, List[Dict]] = {}
+        for record in self._products.values():
+            by_category.setdefault(record.get("category", ""), []).append(record)
+            by_band.setdefault(record["price_band"], []).append(record)
+        self._by_category = {category: tuple(records) for category, records in by_category.items()}
+        self._by_band = {band: tuple(records) for band, records in by_band.items()}
+        self.categories = tuple(by_category)
+        prices = [record["price"] for record in self._products.values()]
+        self.price_range = {"min": min(prices, default=None), "max": max(prices, default=None)}
+        self.last_updated = datetime.now().isoformat()
+    
+    def sync_prices(self, latest: Iterable[Tuple[str, int, float]], product_ids: Optional[Iterable[str]] = None):
+        """Join latest ``(product_id, day, price)`` points into the records (all products if ``product_ids`` is None)"""
+        if product_ids is None:
+            for record in self._products.values():
+                record["latest_price"] = record["latest_price_date"] = None
+        for product_id, day, price in latest:
+            record = self._products.get(product_id)
+            if record is not None:
+                record["latest_price"] = price
+                record["latest_price_date"] = from_epoch_day(day)
+        self.last_updated = datetime.now().isoformat()
+    
+    def get(self, product_id: str) -> Optional[Dict]:
+        return self._products.get(product_id)
+    
+    def by_category(self, category: str) -> Tuple[Dict, ...]:
+        return self._by_category.get(category, self._EMPTY)
+    
+    def by_price_band(self, band: str) -> Tuple[Dict, ...]:
+        return self._by_band.get(band, self._EMPTY)
+    
+    def __contains__(self, product_id: str) -> bool:
+        return product_id in self._products
+    
+    def __len__(self) -> int:
+        return len(self._products)
+    
+    def __iter__(self) -> Iterator[Dict]:
+        return iter(self._products.values())
+
+class _TrieNode:
+    __slots__ = ("children", "term")
+    
+    def __init__(self):
+        self.children: Dict[str, "_TrieNode"] = {}
+        self.term: Optional[str] = None
+
+class ProductSearchIndex:
+    """In-memory BM25 full-text index over product text, with typeahead and fuzzy matching"""
+    
+    TOKEN_RE = re.compile(r"[a-z0-9]+")
+    STOPWORDS = frozenset({"a", "an", "and", "for", "in", "of", "on", "the", "to", "with"})
+    FUZZY_WEIGHT = 0.7
+    MAX_FUZZY_EXPANSIONS = 8
+    WEIGHT_CACHE_TERMS = 4096
+    MAX_SEED_DEPTH = 4096
+    RESCORE_DEPTH = 16
+    
+    def __init__(self, k1: float = 1.2, b: float = 0.75, max_dense_postings: int = 0):
+        self.k1 = k1
+        self.b = b
+        self.max_dense_postings = max_dense_postings
+        self._postings: Dict[str, Tuple[array, array]] = {}
+        self._weights: "OrderedDict[str, Tuple[int, Tuple[np.ndarray, ...]]]" = OrderedDict()
+        self._version = 0
+        self._doc_ids: List[str] = []
+        self._doc_of: Dict[str, int] = {}
+        self._doc_len = array("f")
+        self._alive = array("b")
+        self._live_docs = 0
+        self._total_len = 0.0
+        self._doc_arrays: Optional[Tuple[np.ndarray, np.ndarray]] = None
+        self._accumulator = np.zeros(0, dtype=np.float32)
+        self._trie = _TrieNode()
+        self._suggestions: "OrderedDict[Tuple[str, int], List[str]]" = OrderedDict()
+        self._lock = threading.RLock()
+    
+    @classmethod
+    def tokenize(cls, text: str) -> List[str]:
+        return [token for token in cls.TOKEN_RE.findall(text.lower()) if token not in cls.STOPWORDS]
+    
+    @staticmethod
+    def product_text(product: Dict) -> str:
+        return " ".join(str(product.get(field) or "") for field in ("name", "category", "description"))
+    
+    def __len__(self) -> int:
+        return self._live_docs
+    
+    def add(self, product_id: str, text: str):
+        """Index (or re-index) one product's text"""
+        tokens = self.tokenize(text)
+        counts: Dict[str, int] = {}
+        for token in tokens:
+            counts[token] = counts.get(token, 0) + 1
+        
+        with self._lock:
+            self.remove(product_id)
+            doc = len(self._doc_ids)
+            self._doc_ids.append(product_id)
+            self._doc_of[product_id] = doc
+            self._doc_len.append(len(tokens))
+            self._alive.append(1)
+            self._live_docs += 1
+            self._total_len += len(tokens)
+            self._doc_arrays = None
+            self._version += 1
+            for token, count in counts.items():
+                postings = self._postings.get(token)
+                if postings is None:
+                    postings = self._postings[token] = (array("i"), array("f"))
+                    self._insert_term(token)
+                postings[0].append(doc)
+                postings[1].append(count)
+    
+    def add_products(self, products: Iterable[Dict]):
+        for product in products:
+            self.add(str(product["id"]), self.product_text(product))
+    
+    def remove(self, product_id: str):
+        with self._lock:
+            doc = self._doc_of.pop(product_id, None)
+            if doc is not None:
+                self._alive[doc] = 0
+                self._live_docs -= 1
+                self._total_len -= self._doc_len[doc]
+                self._doc_arrays = None
+                self._version += 1
+    
+    def _insert_term(self, term: str):
+        node = self._trie
+        for char in term:
+            child = node.children.get(char)
+            if child is None:
+                child = node.children[char] = _TrieNode()
+            node = child
+        node.term = term
+        self._suggestions.clear()
+    
+    def _doc_state(self) -> Tuple[np.ndarray, np.ndarray]:
+        if self._doc_arrays is None:
+            self._doc_arrays = (np.array(self._doc_len, dtype=np.float32), np.array(self._alive, dtype=bool))
+            if len(self._accumulator) < len(self._doc_ids):
+                self._accumulator = np.zeros(max(1024, 2 * len(self._doc_ids)), dtype=np.float32)
+        return self._doc_arrays
+    
+    def _term_weights(self, term: str) -> Tuple[np.ndarray, ...]:
+        """BM25 weights of ``term``'s live postings in doc and impact order, cached until the index changes"""
+        cached = self._weights.get(term)
+        if cached is not None and cached[0] == self._version:
+            self._weights.move_to_end(term)
+            return cached[1]
+        doc_len, alive = self._doc_state()
+        docs = np.array(self._postings[term][0], dtype=np.int32)
+        tfs = np.array(self._postings[term][1], dtype=np.float32)
+        live = alive[docs]
+        docs, tfs = docs[live], tfs[live]
+        avg_len = max(self._total_len / self._live_docs, 1.0)
+        idf = np.log1p((self._live_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+        norm = self.k1 * (1 - self.b + self.b * doc_len[docs] / avg_len)
+        weights = (idf * tfs * (self.k1 + 1) / (tfs + norm)).astype(np.float32)
+        impact = np.argsort(-weights, kind="stable")
+        entry = (docs, weights, docs[impact], -weights[impact])
+        self._weights[term] = (self._version, entry)
+        if len(self._weights) > self.WEIGHT_CACHE_TERMS:
+            self._weights.popitem(last=False)
+        return entry
+    
+    @staticmethod
+    def _unique(ids: np.ndarray) -> np.ndarray:
+        # Sort-based; np.unique's hash path is far slower on large int32 arrays in recent NumPy
+        ids = np.sort(ids)
+        keep = np.empty(len(ids), dtype=bool)
+        keep[:1] = True
+        np.not_equal(ids[1:], ids[:-1], out=keep[1:])
+        return ids[keep]
+    
+    @staticmethod
+    def _score(terms: List[Tuple[Tuple[np.ndarray, ...], float]], candidates: np.ndarray) -> np.ndarray:
+        scores = np.zeros(len(candidates), dtype=np.float32)
+        for (docs, weights, _, _), factor in terms:
+            if not len(docs):
+                continue
+            positions = np.minimum(np.searchsorted(docs, candidates), len(docs) - 1)
+            scores += np.where(docs[positions] == candidates, weights[positions], 0.0).astype(np.float32) * factor
+        return scores
+    
+    def fuzzy_terms(self, term: str, max_distance: Optional[int] = None) -> List[Tuple[str, int]]:
+        """Indexed terms within ``max_distance`` edits of ``term`` (default scales with its length)"""
+        if max_distance is None:
+            max_distance = 0 if len(term) < 4 else 1 if len(term) < 8 else 2
+        matches = []
+        first_row = list(range(len(term) + 1))
+        with self._lock:
+            # Depth-first Levenshtein over the trie; a branch is pruned once every cell exceeds the bound
+            stack = [(child, char, first_row) for char, child in self._trie.children.items()]
+            while stack:
+                node, char, previous = stack.pop()
+                row = [previous[0] + 1]
+                for i, term_char in enumerate(term, 1):
+                    row.append(min(row[i - 1] + 1, previous[i] + 1, previous[i - 1] + (term_char != char)))
+                if node.term is not None and row[-1] <= max_distance:
+                    matches.append((node.term, row[-1]))
+                if min(row) <= max_distance:
+                    stack.extend((child, next_char, row) for next_char, child in node.children.items())
+            # Closest spellings first, then the most common
+            matches.sort(key=lambda match: (match[1], -len(self._postings[match[0]][0])))
+        return matches
+    
+    def suggest(self, prefix: str, k: int = 10, max_expansions: int = 5000) -> List[str]:
+        """Typeahead: up to ``k`` indexed terms starting with ``prefix``, most frequent first"""
+        prefix = prefix.lower().strip()
+        with self._lock:
+            cached = self._suggestions.get((prefix, k))
+            if cached is not None:
+                self._suggestions.move_to_end((prefix, k))
+                return cached
+            
+            node = self._trie
+            for char in prefix:
+                node = node.children.get(char)
+                if node is None:
+                    return []
+            candidates = []
+            stack = [node]
+            while stack and len(candidates) < max_expansions:
+                node = stack.pop()
+                if node.term is not None:
+                    candidates.append((len(self._postings[node.term][0]), -len(node.term), node.term))
+                stack.extend(node.children.values())
+            
+            # Cached until the vocabulary changes; term frequencies drifting in between is harmless here
+            suggestions = self._suggestions[(prefix, k)] = [term for _, _, term in heapq.nlargest(k, candidates)]
+            if len(self._suggestions) > 10000:
+                self._suggestions.popitem(last=False)
+            return suggestions
+    
+    def _top_candidates(self, terms: List[Tuple[Tuple[np.ndarray, ...], float]], k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Candidate documents and scores that contain the top ``k``"""
+        upper = [-entry[3][0] * factor if len(entry[0]) else 0.0 for entry, factor in terms]
+        total = sum(upper)
+        postings = sum(len(entry[0]) for entry, _ in terms)
+        by_upper = sorted(range(len(terms)), key=upper.__getitem__)
+        if self.max_dense_postings and postings > self.max_dense_postings:
+            return self._accumulate(terms, k, by_upper, postings)
+        
+        # MaxScore: the best postings of each term give a threshold the final top k must beat,
+        # and only postings that could still beat it become candidates
+        depth = k
+        while True:
+            seeds = self._unique(np.concatenate([entry[2][:depth] for entry, _ in terms]))
+            seed_scores = self._score(terms, seeds)
+            theta = float(np.partition(seed_scores, len(seeds) - k)[len(seeds) - k]) if len(seeds) >= k else 0.0
+            # Slack for float32 rounding, so documents tied with the threshold don't all become candidates
+            theta += 1e-6 * total
+            
+            parts = [seeds]
+            covered = 0.0
+            for i in by_upper:
+                covered += upper[i]
+                if covered <= theta:
+                    continue                    # matching only cheaper terms can't reach the threshold
+                (_, _, impact_docs, neg_impact), factor = terms[i]
+                # A document needs at least this much from term i, even with every other term at its maximum
+                needed = theta - (total - upper[i])
+                parts.append(impact_docs[:np.searchsorted(neg_impact, -needed / factor)])
+            candidates = sum(map(len, parts))
+            if candidates <= 16 * depth or depth >= self.MAX_SEED_DEPTH or depth * len(terms) >= postings:
+                break
+            depth *= 4                          # a deeper seed usually tightens the threshold a lot
+        
+        if candidates <= postings // 4 or postings < len(self._doc_ids) // 8:
+            candidates = self._unique(np.concatenate(parts))
+            return candidates, self._score(terms, candidates)
+        
+        # Pruning can't help when many terms are each common: accumulate every posting instead
+        return self._accumulate(terms, k, by_upper, postings)
+    
+    def _accumulate(self, terms: List[Tuple[Tuple[np.ndarray, ...], float]], k: int,
+                    by_upper: List[int], postings: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Score by summing postings into the dense buffer, within ``max_dense_postings``"""
+        dense = terms
+        if self.max_dense_postings and postings > self.max_dense_postings:
+            # Over budget, accumulate the highest-IDF terms only; the rest just rescore the best
+            # partial matches, so a document ranked high mostly by dropped terms can be missed
+            dense, budget = [], self.max_dense_postings
+            for i in reversed(by_upper):
+                if dense and len(terms[i][0][0]) > budget:
+                    break
+                dense.append(terms[i])
+                budget -= len(terms[i][0][0])
+        accumulator = self._accumulator
+        for (docs, weights, _, _), factor in dense:
+            accumulator[docs] += weights * factor if factor != 1.0 else weights
+        candidates = np.flatnonzero(accumulator[:len(self._doc_ids)])
+        scores = accumulator[candidates]
+        accumulator[candidates] = 0.0
+        if len(dense) < len(terms):
+            depth = self.RESCORE_DEPTH * k
+            if len(candidates) > depth:
+                candidates = candidates[np.argpartition(-scores, depth - 1)[:depth]]
+            scores = self._score(terms, candidates)
+        return candidates, scores
+    
+    def search(self, query: str, k: int = 20) -> List[Tuple[str, float]]:
+        """BM25 top-``k`` ``(product_id, score)``; unindexed terms match their closest spellings"""
+        with self._lock:
+            if not self._live_docs:
+                return []
+            
+            expansions = []
+            for token in dict.fromkeys(self.tokenize(query)):
+                if token in self._postings:
+                    expansions.append((token, 1.0))
+                else:
+                    expansions.extend((term, self.FUZZY_WEIGHT)
+                                      for term, _ in self.fuzzy_terms(token)[:self.MAX_FUZZY_EXPANSIONS])
+            if not expansions:
+                return []
+            
+            terms = [(self._term_weights(term), factor) for term, factor in expansions]
+            if len(terms) == 1:
+                (_, _, impact_docs, neg_impact), factor = terms[0]
+                docs, scores = impact_docs[:k], -neg_impact[:k] * factor
+            else:
+                docs, scores = self._top_candidates(terms, k)
+            
+            if len(scores) > k:
+                top = np.argpartition(-scores, k - 1)[:k]
+                docs, scores = docs[top], scores[top]
+            order = np.argsort(-scores, kind="stable")
+            return [(self._doc_ids[doc], float(score)) for doc, score in zip(docs[order], scores[order])]
+
+class ProductVectorIndex:
+    """Hashed TF-IDF vectors of product text for "similar products" lookups"""
+    
+    def __init__(self, dim: int = 256):
+        self.dim = dim
+        self.matrix = np.zeros((0, dim), dtype=np.float32)
+        self.idf = np.ones(dim, dtype=np.float32)
+        self.product_ids: List[str] = []
+        self._row_of: Dict[str, int] = {}
+        self._lock = threading.Lock()
+    
+    def __len__(self) -> int:
+        return len(self.product_ids)
+    
+    def _counts(self, text: str) -> np.ndarray:
+        counts = np.zeros(self.dim, dtype=np.float32)
+        for word in ProductSearchIndex.TOKEN_RE.findall(text.lower()):
+            padded = f" {word} "
+            features = [word] + [padded[i:i + 3] for i in range(len(padded) - 2)]
+            for feature in features:
+                h = zlib.crc32(feature.encode("utf-8"))
+                counts[h % self.dim] += 1.0 if h & 0x80000000 else -1.0
+        return counts
+    
+    def _weigh(self, counts: np.ndarray) -> np.ndarray:
+        # Sublinear TF on the bucket magnitudes, keeping the hash sign
+        vectors = np.sign(counts) * np.log1p(np.abs(counts)) * self.idf
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        return (vectors / np.where(norms > 0, norms, 1.0)).astype(np.float32)
+    
+    def vector(self, text: str) -> np.ndarray:
+        return self._weigh(self._counts(text))
+    
+    def build(self, products: Iterable[Dict]):
+        """(Re)build the matrix and IDF weights from ``{id, name, category, description}`` products"""
+        products = list(products)
+        counts = np.stack([self._counts(ProductSearchIndex.product_text(p)) for p in products]) \
+            if products else np.zeros((0, self.dim), dtype=np.float32)
+        df = np.count_nonzero(counts, axis=0)
+        with self._lock:
+            self.idf = (np.log((1 + len(products)) / (1 + df)) + 1).astype(np.float32)
+            self.matrix = np.ascontiguousarray(self._weigh(counts))
+            self.product_ids = [str(p["id"]) for p in products]
+            self._row_of = {product_id: row for row, product_id in enumerate(self.product_ids)}
+    
+    def add(self, products: Iterable[Dict]):
+        """Add or replace products, weighted with the IDF of the last ``build``"""
+        with self._lock:
+            new_rows = []
+            for product in products:
+                product_id = str(product["id"])
+                vector = self.vector(ProductSearchIndex.product_text(product))
+                row = self._row_of.get(product_id)
+                if row is None:
+                    self._row_of[product_id] = len(self.product_ids)
+                    self.product_ids.append(product_id)
+                    new_rows.append(vector)
+                else:
+                    if not self.matrix.flags.writeable:
+                        self.matrix = np.array(self.matrix)
+                    self.matrix[row] = vector
+            if new_rows:
+                self.matrix = np.concatenate([self.matrix, np.stack(new_rows)])
+    
+    def _top_k(self, query: np.ndarray, k: int, exclude: Optional[int] = None) -> List[Tuple[str, float]]:
+        with self._lock:
+            matrix, product_ids = self.matrix, self.product_ids
+        scores = matrix @ query
+        if exclude is not None:
+            scores[exclude] = -np.inf
+        k = min(k, len(scores) - (exclude is not None))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(product_ids[row], float(scores[row])) for row in top]
+    
+    def similar(self, product_id: str, k: int = 10) -> List[Tuple[str, float]]:
+        """Products most similar to ``product_id`` by cosine similarity (empty if unknown)"""
+        row = self._row_of.get(product_id)
+        if row is None:
+            return []
+        return self._top_k(self.matrix[row], k, exclude=row)
+    
+    def similar_to_text(self, text: str, k: int = 10) -> List[Tuple[str, float]]:
+        return self._top_k(self.vector(text), k)
+    
+    def save(self, path: str):
+        """Write ``<path>.npy`` (matrix), ``<path>.idf.npy`` and ``<path>.ids.npy``"""
+        with self._lock:
+            matrix, idf, product_ids = self.matrix, self.idf, self.product_ids
+        ids = np.array(product_ids, dtype=f"U{max(map(len, product_ids), default=1)}")
+        for suffix, array_ in ((".npy", matrix), (".idf.npy", idf), (".ids.npy", ids)):
+            tmp_path = f"{path}{suffix}.tmp"
+            with open(tmp_path, "wb") as f:
+                np.save(f, array_)
+            os.replace(tmp_path, f"{path}{suffix}")
+    
+    @classmethod
+    def load(cls, path: str) -> "ProductVectorIndex":
+        """Memory-map vectors written by ``save``"""
+        matrix = np.load(f"{path}.npy", mmap_mode="r")
+        index = cls(dim=matrix.shape[1])
+        index.matrix = matrix
+        index.idf = np.load(f"{path}.idf.npy")
+        index.product_ids = np.load(f"{path}.ids.npy").tolist()
+        index._row_of = {product_id: row for row, product_id in enumerate(index.product_ids)}
+        return index
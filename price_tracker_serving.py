@@ -0,0 +1,175 @@
+"""
+HTTP serving
+Thread-pooled WSGI server and the pre-fork multi-process server
+"""
+
+import logging
+import os
+import shutil
+import signal
+import socket
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+from pathlib import Path
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+
+from price_tracker_config import CONFIG
+
+logger = logging.getLogger(__name__)
+
+class PooledWSGIServer(BaseWSGIServer):
+    """Werkzeug WSGI server that handles connections on a fixed-size thread pool"""
+    
+    multithread = True                                       # enables HTTP/1.1 keep-alive in the handler
+    
+    def __init__(self, host: str, port: int, app, threads: int = 8, fd: Optional[int] = None,
+                 keepalive_timeout: float = 5):
+        self._executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="http")
+        handler = type("KeepAliveRequestHandler", (WSGIRequestHandler,), {"timeout": keepalive_timeout})
+        super().__init__(host, port, app, handler=handler, fd=fd)
+        # Workers sharing a listener all wake on a new connection; the losers must not block in accept()
+        self.socket.setblocking(False)
+    
+    def process_request(self, request, client_address):
+        self._executor.submit(self._process_request_thread, request, client_address)
+    
+    def _process_request_thread(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+    
+    def serve_forever(self, poll_interval: float = 0.5):
+        try:
+            super().serve_forever(poll_interval)
+        finally:
+            self._executor.shutdown(wait=True)                  # drain in-flight requests
+
+def _run_worker(create_system: Callable, listener: socket.socket, threads: int, ready_fd: int):
+    """Pre-fork worker body: build the system, report readiness, serve until SIGTERM"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)                # the master turns Ctrl-C into SIGTERM
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    system = create_system()
+    server = PooledWSGIServer(CONFIG["host"], CONFIG["port"], system.app, threads=threads, fd=listener.fileno())
+    listener.close()
+    
+    def drain(signum, frame):
+        system.draining = True
+        # shutdown() blocks until serve_forever returns, so it can't run on this (serving) thread
+        threading.Thread(target=server.shutdown, daemon=True).start()
+    
+    signal.signal(signal.SIGTERM, drain)
+    os.write(ready_fd, b"1")
+    logger.info(f"Worker {os.getpid()} serving with {threads} threads")
+    server.serve_forever()
+    server.server_close()
+    system.shutdown()
+    logger.info(f"Worker {os.getpid()} drained")
+
+def serve(create_system: Callable, prepare: Callable[[], None], workers: int, threads: int,
+          host: Optional[str] = None, port: Optional[int] = None,
+          graceful_timeout: Optional[float] = None, ready_file: Optional[str] = None) -> int:
+    """Pre-fork server: ``workers`` processes x ``threads`` threads sharing one listening socket"""
+    host = CONFIG["host"] if host is None else host
+    port = CONFIG["port"] if port is None else port
+    graceful_timeout = CONFIG["graceful_timeout"] if graceful_timeout is None else graceful_timeout
+    ready_file = CONFIG["ready_file"] if ready_file is None else ready_file
+    CONFIG["host"], CONFIG["port"] = host, port
+    state_dir = None
+    for key, filename in (("session_db", "sessions.db"), ("jobs_db", "jobs.db")):
+        if not CONFIG[key]:
+            # Shared between workers but, as with a single process, they don't outlive the server
+            state_dir = state_dir or tempfile.mkdtemp(prefix="price-tracker-state-")
+            CONFIG[key] = os.path.join(state_dir, filename)
+    
+    prepare()
+    listener = socket.create_server((host, port), backlog=2048)
+    listener.set_inheritable(True)
+    ready_read, ready_write = os.pipe()
+    os.set_blocking(ready_read, False)
+    children: Dict[int, int] = {}
+    started: Dict[int, float] = {}
+    crash_streak = 0
+    stopping = threading.Event()
+    
+    def spawn(index: int):
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                os.close(ready_read)
+                _run_worker(create_system, listener, threads, ready_write)
+            except BaseException as e:
+                logger.error(f"Worker {os.getpid()} failed: {e}")
+                code = 1
+            finally:
+                os._exit(code)
+        children[pid] = index
+        started[pid] = time.monotonic()
+    
+    def request_stop(signum, frame):
+        stopping.set()
+    
+    signal.signal(signal.SIGTERM, request_stop)
+    signal.signal(signal.SIGINT, request_stop)
+    for index in range(workers):
+        spawn(index)
+    logger.info(f"Master {os.getpid()} listening on {host}:{listener.getsockname()[1]} "
+                f"with {workers} workers x {threads} threads")
+    
+    ready = 0
+    while not stopping.is_set():
+        if ready < workers:
+            try:
+                ready += len(os.read(ready_read, workers))
+            except BlockingIOError:
+                pass
+            if ready >= workers:
+                logger.info("All workers ready")
+                if ready_file:
+                    Path(ready_file).touch()
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            pid = 0
+        if pid and pid in children:
+            index = children.pop(pid)
+            # Back off when workers die straight after starting (e.g. a broken config) instead of fork-looping
+            crash_streak = crash_streak + 1 if time.monotonic() - started.pop(pid) < 5 else 0
+            delay = min(30.0, 0.5 * 2 ** crash_streak) if crash_streak else 0.0
+            logger.warning(f"Worker {pid} exited with status {os.waitstatus_to_exitcode(status)}, "
+                           f"restarting in {delay:.1f}s")
+            if not stopping.wait(delay):
+                spawn(index)
+        stopping.wait(0.1)
+    
+    logger.info("Shutting down: draining workers")
+    if ready_file and os.path.exists(ready_file):
+        os.unlink(ready_file)
+    for pid in children:
+        os.kill(pid, signal.SIGTERM)
+    deadline = time.monotonic() + graceful_timeout
+    exit_code = 0
+    while children and time.monotonic() < deadline:
+        pid, status = os.waitpid(-1, os.WNOHANG)
+        if pid:
+            children.pop(pid, None)
+            exit_code = exit_code or os.waitstatus_to_exitcode(status)
+        else:
+            time.sleep(0.05)
+    for pid in children:
+        logger.warning(f"Worker {pid} did not drain within {graceful_timeout}s, killing it")
+        os.kill(pid, signal.SIGKILL)
+        os.waitpid(pid, 0)
+        exit_code = 1
+    listener.close()
+    os.close(ready_read)
+    os.close(ready_write)
+    if state_dir is not None:
+        shutil.rmtree(state_dir, ignore_errors=True)
+    return exit_code
@@ -0,0 +1,820 @@
+"""
+Price history storage
+Columnar per-product series, the memory-mapped snapshot and the SQLite store
+"""
+
+import logging
+import json
+import codecs
+import mmap
+import os
+import re
+import sqlite3
+import struct
+import sys
+import threading
+from collections import OrderedDict
+from datetime import date
+from functools import lru_cache
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+@lru_cache(maxsize=65536)
+def _parse_epoch_day(value: str) -> int:
+    """Parse an ISO date string into days since 1970-01-01 (cached, dates repeat a lot)"""
+    return date.fromisoformat(value[:10]).toordinal() - EPOCH_ORDINAL
+
+def to_epoch_day(value: Union[str, date, int]) -> int:
+    """Convert an ISO date string, date or epoch-day int to an epoch-day int"""
+    if isinstance(value, str):
+        return _parse_epoch_day(value)
+    if isinstance(value, date):
+        return value.toordinal() - EPOCH_ORDINAL
+    return int(value)
+
+def from_epoch_day(day: int) -> str:
+    """Convert an epoch-day int back to an ISO date string"""
+    return date.fromordinal(int(day) + EPOCH_ORDINAL).isoformat()
+
+def iter_lines(stream, chunk_size: int = 1 << 20) -> Iterator[bytes]:
+    """Yield lines from a binary stream, reading it in fixed-size chunks"""
+    pending = b""
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        lines = (pending + chunk).split(b"\n")
+        pending = lines.pop()
+        yield from lines
+    if pending:
+        yield pending
+
+_RECORD_SEPARATORS = re.compile(r"[\s,]*")
+
+def iter_json_records(stream, chunk_size: int = 1 << 20, max_record_bytes: int = 1 << 20) -> Iterator[Dict]:
+    """Incrementally parse records from a JSON array or NDJSON binary stream, in bounded memory"""
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder("utf-8")()
+    buf = ""
+    pos = 0
+    eof = False
+    started = False
+    
+    def refill():
+        nonlocal buf, pos, eof
+        chunk = stream.read(chunk_size)
+        eof = not chunk
+        buf = buf[pos:] + text_decoder.decode(chunk, final=eof)
+        pos = 0
+    
+    while True:
+        pos = _RECORD_SEPARATORS.match(buf, pos).end()
+        if pos >= len(buf):
+            if eof:
+                return
+            refill()
+            continue
+        
+        char = buf[pos]
+        if not started:
+            started = True
+            if char == "[":
+                pos += 1
+                continue
+        if char == "]":
+            return
+        
+        try:
+            record, pos = decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError:
+            # Most likely a record split across chunks; read more unless it can't be
+            if eof or len(buf) - pos > max_record_bytes:
+                raise
+            refill()
+            continue
+        yield record
+
+class PriceSeries:
+    """Columnar price history for one product, sorted by date, with O(1) running trend statistics"""
+
+    __slots__ = ("product_id", "category", "_days", "_prices", "_size",
+                 "_origin", "_sum_x", "_sum_y", "_sum_xx", "_sum_xy", "_mean", "_m2")
+
+    def __init__(self, product_id: str, category: str = "", capacity: int = 8):
+        self.product_id = product_id
+        self.category = category
+        self._days = np.empty(capacity, dtype=np.int32)
+        self._prices = np.empty(capacity, dtype=np.float64)
+        self._size = 0
+        self._origin = 0
+        self._reset_stats()
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def days(self) -> np.ndarray:
+        """Epoch days of every point, ascending"""
+        return self._days[:self._size]
+
+    @property
+    def prices(self) -> np.ndarray:
+        """Prices aligned with ``days``"""
+        return self._prices[:self._size]
+
+    @property
+    def dates(self) -> List[str]:
+        """ISO date strings (materialized on demand, for display only)"""
+        return [from_epoch_day(d) for d in self.days]
+
+    @property
+    def nbytes(self) -> int:
+        return self._days.nbytes + self._prices.nbytes
+
+    def _reserve(self, extra: int):
+        """Make room for ``extra`` more points, copying if the buffers are read-only"""
+        needed = self._size + extra
+        if needed <= len(self._days) and self._days.flags.writeable and self._prices.flags.writeable:
+            return
+        capacity = max(needed, 2 * len(self._days), 8)
+        days = np.empty(capacity, dtype=np.int32)
+        prices = np.empty(capacity, dtype=np.float64)
+        days[:self._size] = self.days
+        prices[:self._size] = self.prices
+        self._days, self._prices = days, prices
+
+    def _reset_stats(self):
+        self._sum_x = self._sum_y = self._sum_xx = self._sum_xy = 0.0
+        self._mean = self._m2 = 0.0
+
+    def _stats_add(self, x: float, y: float, n: int):
+        """Fold one point into the running stats; ``n`` is the count including it"""
+        self._sum_x += x
+        self._sum_y += y
+        self._sum_xx += x * x
+        self._sum_xy += x * y
+        delta = y - self._mean
+        self._mean += delta / n
+        self._m2 += delta * (y - self._mean)
+
+    def _stats_remove(self, x: float, y: float, n: int):
+        """Reverse ``_stats_add``; ``n`` is the count after removing the point"""
+        self._sum_x -= x
+        self._sum_y -= y
+        self._sum_xx -= x * x
+        self._sum_xy -= x * y
+        if n == 0:
+            self._mean = self._m2 = 0.0
+            return
+        delta = y - self._mean
+        self._mean -= delta / n
+        self._m2 -= delta * (y - self._mean)
+
+    def _recompute_stats(self):
+        """Rebuild the running stats from the arrays (after bulk reordering)"""
+        self._reset_stats()
+        if self._size == 0:
+            return
+        x = (self.days - self._origin).astype(np.float64)
+        y = self.prices
+        self._sum_x = float(x.sum())
+        self._sum_y = float(y.sum())
+        self._sum_xx = float(np.dot(x, x))
+        self._sum_xy = float(np.dot(x, y))
+        self._mean = float(y.mean())
+        self._m2 = float(np.sum((y - self._mean) ** 2))
+
+    def insert(self, day: int, price: float) -> Optional[float]:
+        """Insert one point keeping date order; returns the replaced price, or None if the point was new"""
+        size = self._size
+        if size == 0:
+            self._origin = day
+        x = float(day - self._origin)
+
+        if size == 0 or day > self._days[size - 1]:
+            self._reserve(1)
+            self._days[size] = day
+            self._prices[size] = price
+            self._size = size + 1
+            self._stats_add(x, price, size + 1)
+            return None
+
+        pos = int(np.searchsorted(self._days[:size], day))
+        if self._days[pos] == day:
+            old_price = float(self._prices[pos])
+            if old_price != price:
+                self._reserve(0)
+                self._prices[pos] = price
+                self._stats_remove(x, old_price, size - 1)
+                self._stats_add(x, price, size)
+            return old_price
+
+        self._reserve(1)
+        self._days[pos + 1:size + 1] = self._days[pos:size]
+        self._prices[pos + 1:size + 1] = self._prices[pos:size]
+        self._days[pos] = day
+        self._prices[pos] = price
+        self._size = size + 1
+        self._stats_add(x, price, size + 1)
+        return None
+
+    def extend(self, days: np.ndarray, prices: np.ndarray):
+        """Bulk-merge points, keeping date order and the last price per date"""
+        days = np.asarray(days, dtype=np.int32)
+        prices = np.asarray(prices, dtype=np.float64)
+        if len(days) == 0:
+            return
+
+        size = self._size
+        if size == 0:
+            self._origin = int(days.min())
+        in_order = (size == 0 or days[0] > self._days[size - 1]) and bool(np.all(days[1:] > days[:-1]))
+        if not in_order:
+            days = np.concatenate([self.days, days])
+            prices = np.concatenate([self.prices, prices])
+            order = np.argsort(days, kind="stable")
+            days, prices = days[order], prices[order]
+            keep = np.append(days[1:] != days[:-1], True)
+            days, prices = days[keep], prices[keep]
+            self._size = 0
+
+        self._reserve(len(days))
+        start = self._size
+        self._days[start:start + len(days)] = days
+        self._prices[start:start + len(days)] = prices
+        self._size = start + len(days)
+
+        if not in_order:
+            self._recompute_stats()
+            return
+
+        # Chan et al. parallel merge of the appended block into the running stats
+        x = (days - self._origin).astype(np.float64)
+        count = len(days)
+        batch_mean = float(prices.mean())
+        batch_m2 = float(np.sum((prices - batch_mean) ** 2))
+        delta = batch_mean - self._mean
+        self._mean += delta * count / self._size
+        self._m2 += batch_m2 + delta * delta * start * count / self._size
+        self._sum_x += float(x.sum())
+        self._sum_y += float(prices.sum())
+        self._sum_xx += float(np.dot(x, x))
+        self._sum_xy += float(np.dot(x, prices))
+
+    @property
+    def volatility(self) -> float:
+        """Population standard deviation of the prices"""
+        if self._size == 0:
+            return 0.0
+        return float(np.sqrt(max(self._m2, 0.0) / self._size))
+
+    def linear_fit(self, horizon_days: int = 7) -> Tuple[float, float, float]:
+        """``(slope_per_day, r_squared, predicted_price)`` from the running sums, ``horizon_days`` ahead"""
+        n = self._size
+        sxx = self._sum_xx - self._sum_x * self._sum_x / n
+        sxy = self._sum_xy - self._sum_x * self._sum_y / n
+        slope = sxy / sxx if sxx > 0 else 0.0
+        intercept = self._sum_y / n - slope * self._sum_x / n
+
+        ss_tot = max(self._m2, 0.0)
+        ss_res = max(ss_tot - slope * sxy, 0.0)
+        # Treat rounding residue from replaced points as a constant series
+        if ss_tot <= 1e-12 * max(self._mean * self._mean * n, 1.0):
+            r_squared = 1.0
+        else:
+            r_squared = 1.0 - ss_res / ss_tot
+
+        last_x = float(self._days[n - 1] - self._origin)
+        return slope, r_squared, intercept + slope * (last_x + horizon_days)
+
+    def copy(self) -> "PriceSeries":
+        """Independent copy of the points and running stats"""
+        clone = PriceSeries(self.product_id, self.category, capacity=0)
+        clone._days = self.days.copy()
+        clone._prices = self.prices.copy()
+        for name in ("_size", "_origin", "_sum_x", "_sum_y", "_sum_xx", "_sum_xy", "_mean", "_m2"):
+            setattr(clone, name, getattr(self, name))
+        return clone
+
+    def shrink_to_fit(self):
+        """Release spare capacity left over from geometric growth"""
+        if len(self._days) > self._size:
+            self._days = self.days.copy()
+            self._prices = self.prices.copy()
+
+SNAPSHOT_MAGIC = b"PTSNAP\x00\x00"
+SNAPSHOT_VERSION = 1
+# magic, version, flags, n_products, n_points, strings/index/days/prices offsets, strings length
+SNAPSHOT_HEADER = struct.Struct("<8sIIQQQQQQQ")
+SNAPSHOT_INDEX_DTYPE = np.dtype([
+    ("offset", "<u8"), ("count", "<u8"), ("category", "<i4"), ("origin", "<i4"),
+    ("sum_x", "<f8"), ("sum_y", "<f8"), ("sum_xx", "<f8"), ("sum_xy", "<f8"),
+    ("mean", "<f8"), ("m2", "<f8"),
+])
+
+def _align8(value: int) -> int:
+    return (value + 7) & ~7
+
+class PriceHistoryStore:
+    """Columnar price history for all products, with interned IDs and categories"""
+
+    supports_snapshots = True                                # the whole history is in memory
+
+    def __init__(self):
+        self._series: Dict[str, PriceSeries] = {}
+        self._categories: Dict[str, str] = {}
+        self._mmap = None
+
+    def _intern_category(self, category: str) -> str:
+        interned = self._categories.get(category)
+        if interned is None:
+            interned = self._categories[category] = sys.intern(category)
+        return interned
+
+    def series(self, product_id: str, category: str = "") -> PriceSeries:
+        """Return the series for a product, creating it on first use"""
+        series = self._series.get(product_id)
+        if series is None:
+            product_id = sys.intern(product_id)
+            series = self._series[product_id] = PriceSeries(product_id, self._intern_category(category))
+        elif category and not series.category:
+            series.category = self._intern_category(category)
+        return series
+
+    def set_category(self, product_id: str, category: str):
+        """Tag an existing product with a category"""
+        series = self._series.get(product_id)
+        if series is not None:
+            series.category = self._intern_category(category)
+
+    def add(self, product_id: str, day: Union[str, date, int], price: float, category: str = "") -> bool:
+        """Add a single price point; returns False if it replaced an existing date"""
+        if category:
+            self.series(product_id, category)
+        return self.insert(product_id, to_epoch_day(day), float(price)) is None
+
+    def insert(self, product_id: str, day: int, price: float) -> Optional[float]:
+        """Insert one point (see ``PriceSeries.insert``); returns the replaced price, if any"""
+        return self.series(product_id).insert(day, price)
+
+    def extend(self, product_id: str, days: np.ndarray, prices: np.ndarray):
+        """Bulk-merge points into one product (see ``PriceSeries.extend``)"""
+        self.series(product_id).extend(days, prices)
+
+    def flush(self):
+        """Persist buffered writes (no-op for the in-memory store)"""
+
+    def add_many(self, entries: Iterable[Tuple[str, Union[str, int], float]]) -> int:
+        """Add ``(product_id, date, price)`` tuples grouped per product; returns the count"""
+        grouped: Dict[str, Tuple[List[int], List[float]]] = {}
+        count = 0
+        for product_id, day, price in entries:
+            bucket = grouped.get(product_id)
+            if bucket is None:
+                bucket = grouped[product_id] = ([], [])
+            bucket[0].append(to_epoch_day(day))
+            bucket[1].append(price)
+            count += 1
+
+        for product_id, (days, prices) in grouped.items():
+            self.extend(product_id, np.array(days, dtype=np.int32), np.array(prices, dtype=np.float64))
+        return count
+
+    def get(self, product_id: str, default=None) -> Optional[PriceSeries]:
+        return self._series.get(product_id, default)
+
+    def __getitem__(self, product_id: str) -> PriceSeries:
+        return self._series[product_id]
+
+    def __contains__(self, product_id: str) -> bool:
+        return product_id in self._series
+
+    def __len__(self) -> int:
+        return len(self._series)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._series)
+
+    def keys(self):
+        return self._series.keys()
+
+    def values(self):
+        return self._series.values()
+
+    def items(self):
+        return self._series.items()
+
+    def product_ids(self, category: Optional[str] = None) -> List[str]:
+        """All product IDs, optionally restricted to one category"""
+        if category is None:
+            return list(self._series)
+        return [pid for pid, series in self._series.items() if series.category == category]
+
+    def categories(self) -> List[str]:
+        return [c for c in self._categories if c]
+
+    def latest_pairs(self) -> Iterator[Tuple[str, float, float]]:
+        """Yield ``(product_id, current_price, previous_price)`` for products with 2+ points"""
+        for product_id, series in self._series.items():
+            size = len(series)
+            if size >= 2:
+                prices = series.prices
+                yield product_id, float(prices[size - 1]), float(prices[size - 2])
+
+    def latest_points(self, product_ids: Optional[Iterable[str]] = None) -> Iterator[Tuple[str, int, float]]:
+        """Yield ``(product_id, day, price)`` of the newest point per product (all products by default)"""
+        for product_id in self._series if product_ids is None else product_ids:
+            series = self._series.get(product_id)
+            if series is not None and len(series):
+                yield product_id, int(series.days[-1]), float(series.prices[-1])
+
+    def to_flat(self, product_ids: Iterable[str]) -> Tuple[List[str], np.ndarray, np.ndarray, np.ndarray]:
+        """``(found_ids, offsets, days, prices)`` of the given products in one CSR-style layout"""
+        found = [series for series in map(self.get, product_ids) if series is not None]
+        counts = np.fromiter((len(series) for series in found), dtype=np.int64, count=len(found))
+        offsets = np.zeros(len(found) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        days = np.empty(offsets[-1], dtype=np.int32)
+        prices = np.empty(offsets[-1], dtype=np.float64)
+        for i, series in enumerate(found):
+            days[offsets[i]:offsets[i + 1]] = series.days
+            prices[offsets[i]:offsets[i + 1]] = series.prices
+        return [series.product_id for series in found], offsets, days, prices
+
+    def shrink_to_fit(self):
+        for series in self._series.values():
+            series.shrink_to_fit()
+
+    def save_snapshot(self, path: str):
+        """Atomically write a versioned binary snapshot that ``load_snapshot`` can mmap"""
+        series_list = list(self._series.values())
+        categories = [""] + [c for c in self._categories if c]
+        category_codes = {c: i for i, c in enumerate(categories)}
+        strings = json.dumps({
+            "products": [series.product_id for series in series_list],
+            "categories": categories
+        }).encode("utf-8")
+        
+        index = np.zeros(len(series_list), dtype=SNAPSHOT_INDEX_DTYPE)
+        offset = 0
+        for i, series in enumerate(series_list):
+            index[i] = (offset, len(series), category_codes[series.category], series._origin,
+                        series._sum_x, series._sum_y, series._sum_xx, series._sum_xy,
+                        series._mean, series._m2)
+            offset += len(series)
+        n_points = offset
+        
+        strings_offset = SNAPSHOT_HEADER.size
+        index_offset = _align8(strings_offset + len(strings))
+        days_offset = _align8(index_offset + index.nbytes)
+        prices_offset = _align8(days_offset + 4 * n_points)
+        
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, 0, len(series_list), n_points,
+                                         strings_offset, index_offset, days_offset, prices_offset,
+                                         len(strings)))
+            f.write(strings)
+            f.seek(index_offset)
+            f.write(index.tobytes())
+            f.seek(days_offset)
+            for series in series_list:
+                series.days.astype("<i4", copy=False).tofile(f)
+            f.seek(prices_offset)
+            for series in series_list:
+                series.prices.astype("<f8", copy=False).tofile(f)
+        os.replace(tmp_path, path)
+        logger.info(f"Saved price snapshot with {n_points} points to {path}")
+    
+    @classmethod
+    def load_snapshot(cls, path: str) -> "PriceHistoryStore":
+        """Memory-map a snapshot written by ``save_snapshot``; series are copied only when modified"""
+        store = cls()
+        with open(path, "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        
+        (magic, version, _, n_products, n_points, strings_offset, index_offset,
+         days_offset, prices_offset, strings_len) = SNAPSHOT_HEADER.unpack_from(mapped, 0)
+        if magic != SNAPSHOT_MAGIC:
+            raise ValueError(f"{path} is not a price snapshot")
+        if version != SNAPSHOT_VERSION:
+            raise ValueError(f"Unsupported snapshot version {version} (expected {SNAPSHOT_VERSION})")
+        
+        strings = json.loads(mapped[strings_offset:strings_offset + strings_len].decode("utf-8"))
+        index = np.frombuffer(mapped, dtype=SNAPSHOT_INDEX_DTYPE, count=n_products, offset=index_offset)
+        days = np.frombuffer(mapped, dtype="<i4", count=n_points, offset=days_offset)
+        prices = np.frombuffer(mapped, dtype="<f8", count=n_points, offset=prices_offset)
+        
+        categories = [store._intern_category(c) for c in strings["categories"]]
+        for product_id, entry in zip(strings["products"], index.tolist()):
+            offset, count, category, origin, sum_x, sum_y, sum_xx, sum_xy, mean, m2 = entry
+            series = PriceSeries(sys.intern(product_id), categories[category], capacity=0)
+            series._days = days[offset:offset + count]
+            series._prices = prices[offset:offset + count]
+            series._size = count
+            series._origin = origin
+            series._sum_x, series._sum_y, series._sum_xx, series._sum_xy = sum_x, sum_y, sum_xx, sum_xy
+            series._mean, series._m2 = mean, m2
+            store._series[series.product_id] = series
+        
+        store._mmap = mapped
+        return store
+    
+    @property
+    def total_points(self) -> int:
+        return sum(len(series) for series in self._series.values())
+
+    @property
+    def nbytes(self) -> int:
+        return sum(series.nbytes for series in self._series.values())
+
+def sqlite_path_from_url(url: str) -> Optional[str]:
+    """Extract the file path from a ``sqlite:///path`` URL (None for other schemes)"""
+    prefix = "sqlite:///"
+    if not url.startswith(prefix):
+        return None
+    return url[len(prefix):] or ":memory:"
+
+class SQLitePriceStore(PriceHistoryStore):
+    """SQLite-backed price history with a bounded LRU of hot products"""
+    
+    supports_snapshots = False                               # memory holds only the hot LRU; the database is durable
+    
+    def __init__(self, path: str, cache_size: int = 10000, flush_rows: int = 50000):
+        super().__init__()
+        self._series: "OrderedDict[str, PriceSeries]" = OrderedDict()
+        self.path = path
+        self.cache_size = cache_size
+        self.flush_rows = flush_rows
+        self._pending: List[Tuple[str, int, float]] = []
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS products (
+                product_id TEXT PRIMARY KEY,
+                category TEXT NOT NULL DEFAULT ''
+            );
+            CREATE TABLE IF NOT EXISTS prices (
+                product_id TEXT NOT NULL,
+                day INTEGER NOT NULL,
+                price REAL NOT NULL,
+                PRIMARY KEY (product_id, day)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS idx_products_category ON products(category);
+        """)
+        self._conn.commit()
+        self._data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+    
+    def _cache(self, series: PriceSeries) -> PriceSeries:
+        self._series[series.product_id] = series
+        self._series.move_to_end(series.product_id)
+        while len(self._series) > self.cache_size:
+            self._series.popitem(last=False)
+        return series
+    
+    def _load(self, product_id: str) -> Optional[PriceSeries]:
+        """Return the cached series, reading it from the database on a miss"""
+        series = self._series.get(product_id)
+        if series is not None:
+            self._series.move_to_end(product_id)
+            self.hits += 1
+            return series
+        
+        self.misses += 1
+        row = self._conn.execute("SELECT category FROM products WHERE product_id = ?", (product_id,)).fetchone()
+        if row is None:
+            return None
+        self.flush()
+        rows = self._conn.execute(
+            "SELECT day, price FROM prices WHERE product_id = ? ORDER BY day", (product_id,)
+        ).fetchall()
+        series = PriceSeries(sys.intern(product_id), self._intern_category(row[0]), capacity=len(rows))
+        if rows:
+            points = np.array(rows, dtype=np.float64)
+            series.extend(points[:, 0].astype(np.int32), points[:, 1])
+        return self._cache(series)
+    
+    def series(self, product_id: str, category: str = "") -> PriceSeries:
+        with self._lock:
+            series = self._load(product_id)
+            if series is None:
+                self._conn.execute("INSERT OR IGNORE INTO products (product_id, category) VALUES (?, ?)",
+                                   (product_id, category))
+                series = self._cache(PriceSeries(sys.intern(product_id), self._intern_category(category)))
+            elif category and not series.category:
+                self.set_category(product_id, category)
+            return series
+    
+    def set_category(self, product_id: str, category: str):
+        with self._lock:
+            self._conn.execute("UPDATE products SET category = ? WHERE product_id = ?", (category, product_id))
+            series = self._series.get(product_id)
+            if series is not None:
+                series.category = self._intern_category(category)
+    
+    def insert(self, product_id: str, day: int, price: float) -> Optional[float]:
+        with self._lock:
+            old_price = self.series(product_id).insert(day, price)
+            if old_price != price:
+                self._buffer([(product_id, int(day), float(price))])
+            return old_price
+    
+    def extend(self, product_id: str, days: np.ndarray, prices: np.ndarray):
+        with self._lock:
+            # Cold products are written straight through without being loaded
+            series = self._series.get(product_id)
+            if series is not None:
+                series.extend(days, prices)
+            else:
+                self._conn.execute("INSERT OR IGNORE INTO products (product_id) VALUES (?)", (product_id,))
+            self._buffer(zip([product_id] * len(days), np.asarray(days).tolist(), np.asarray(prices).tolist()))
+    
+    def _buffer(self, rows: Iterable[Tuple[str, int, float]]):
+        self._pending.extend(rows)
+        if len(self._pending) >= self.flush_rows:
+            self.flush()
+    
+    def flush(self):
+        """Write buffered points with one ``executemany`` and commit"""
+        with self._lock:
+            if self._pending:
+                self._conn.executemany(
+                    "INSERT INTO prices (product_id, day, price) VALUES (?, ?, ?) "
+                    "ON CONFLICT(product_id, day) DO UPDATE SET price = excluded.price",
+                    self._pending
+                )
+                self._pending = []
+            self._conn.commit()
+    
+    def refresh(self) -> bool:
+        """Drop the hot cache if another connection committed since the last check; True if it did"""
+        with self._lock:
+            version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+            if version == self._data_version:
+                return False
+            self.flush()
+            self._data_version = version
+            self._series.clear()
+            return True
+    
+    def get(self, product_id: str, default=None) -> Optional[PriceSeries]:
+        with self._lock:
+            series = self._load(product_id)
+        return default if series is None else series
+    
+    def __getitem__(self, product_id: str) -> PriceSeries:
+        series = self.get(product_id)
+        if series is None:
+            raise KeyError(product_id)
+        return series
+    
+    def __contains__(self, product_id: str) -> bool:
+        with self._lock:
+            if product_id in self._series:
+                return True
+            return self._conn.execute("SELECT 1 FROM products WHERE product_id = ?", (product_id,)).fetchone() is not None
+    
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM products").fetchone()[0]
+    
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.product_ids())
+    
+    def keys(self):
+        return self.product_ids()
+    
+    def values(self):
+        return (self[product_id] for product_id in self.product_ids())
+    
+    def items(self):
+        return ((product_id, self[product_id]) for product_id in self.product_ids())
+    
+    def product_ids(self, category: Optional[str] = None) -> List[str]:
+        with self._lock:
+            if category is None:
+                rows = self._conn.execute("SELECT product_id FROM products ORDER BY rowid")
+            else:
+                rows = self._conn.execute("SELECT product_id FROM products WHERE category = ? ORDER BY rowid", (category,))
+            return [row[0] for row in rows]
+    
+    def categories(self) -> List[str]:
+        with self._lock:
+            return [row[0] for row in self._conn.execute("SELECT DISTINCT category FROM products WHERE category != ''")]
+    
+    def latest_pairs(self) -> Iterator[Tuple[str, float, float]]:
+        """Latest two prices per product, computed in SQL without loading series"""
+        with self._lock:
+            self.flush()
+            rows = self._conn.execute("""
+                SELECT product_id, price FROM (
+                    SELECT product_id, price,
+                           ROW_NUMBER() OVER (PARTITION BY product_id ORDER BY day DESC) AS recency
+                    FROM prices
+                ) WHERE recency <= 2 ORDER BY product_id, recency
+            """).fetchall()
+        for i in range(len(rows) - 1):
+            if rows[i][0] == rows[i + 1][0]:
+                yield rows[i][0], rows[i][1], rows[i + 1][1]
+    
+    def latest_points(self, product_ids: Optional[Iterable[str]] = None) -> Iterator[Tuple[str, int, float]]:
+        """Newest point per product, read from SQL without loading series"""
+        with self._lock:
+            self.flush()
+            if product_ids is None:
+                rows = self._conn.execute("""
+                    SELECT product_id, day, price FROM (
+                        SELECT product_id, day, price,
+                               ROW_NUMBER() OVER (PARTITION BY product_id ORDER BY day DESC) AS recency
+                        FROM prices
+                    ) WHERE recency = 1
+                """).fetchall()
+            else:
+                rows = []
+                for product_id in product_ids:
+                    row = self._conn.execute(
+                        "SELECT product_id, day, price FROM prices WHERE product_id = ? ORDER BY day DESC LIMIT 1",
+                        (product_id,)
+                    ).fetchone()
+                    if row is not None:
+                        rows.append(row)
+        yield from rows
+    
+    def shrink_to_fit(self):
+        self.flush()
+    
+    @property
+    def total_points(self) -> int:
+        with self._lock:
+            self.flush()
+            return self._conn.execute("SELECT COUNT(*) FROM prices").fetchone()[0]
+    
+    def close(self):
+        with self._lock:
+            self.flush()
+            self._conn.close()
+
+def batch_trend_stats(offsets: np.ndarray, days: np.ndarray, prices: np.ndarray,
+                      horizon_days: int = 7) -> Dict[str, np.ndarray]:
+    """Grouped trend statistics over the ``PriceHistoryStore.to_flat`` layout in one NumPy pass"""
+    counts = np.diff(offsets)
+    starts = offsets[:-1]
+    ends = offsets[1:]
+    groups = np.repeat(np.arange(len(counts)), counts)
+    n = counts.astype(np.float64)
+
+    x = (days - days[starts][groups]).astype(np.float64)
+    y = prices.astype(np.float64, copy=False)
+    mean_x = np.add.reduceat(x, starts) / n
+    mean_y = np.add.reduceat(y, starts) / n
+
+    # Centered two-pass sums avoid cancellation on large epoch-day values
+    xc = x - mean_x[groups]
+    yc = y - mean_y[groups]
+    sxx = np.add.reduceat(xc * xc, starts)
+    sxy = np.add.reduceat(xc * yc, starts)
+    syy = np.add.reduceat(yc * yc, starts)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        slope = np.where(sxx > 0, sxy / sxx, 0.0)
+        intercept = mean_y - slope * mean_x
+        ss_res = np.maximum(syy - slope * sxy, 0.0)
+        # Same convention as sklearn's r2_score for constant targets
+        r_squared = np.where(syy > 0, 1.0 - ss_res / syy, np.where(ss_res > 0, 0.0, 1.0))
+
+    current = y[ends - 1]
+    previous = y[ends - 2]
+    change = current - previous
+    # NaN where the previous price is zero, which analyze_batch reports as None
+    change_percent = np.divide(change, previous, out=np.full_like(change, np.nan), where=previous != 0) * 100
+
+    return {
+        "current_price": current,
+        "previous_price": previous,
+        "price_change": change,
+        "price_change_percent": change_percent,
+        "trend": np.sign(change).astype(np.int8),
+        "volatility": np.sqrt(syy / n),
+        "slope": slope,
+        "intercept": intercept,
+        "r_squared": r_squared,
+        "predicted_price": intercept + slope * (x[ends - 1] + horizon_days),
+        "data_points": counts,
+    }
+
+def file_stamp(path: str) -> Optional[Tuple[int, int]]:
+    """``(inode, mtime_ns)`` of ``path``, which changes whenever the file is replaced; None if missing"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns
@@ -12,7 +12,7 @@ from pathlib import Path
 def check_dependencies():
     """Check if required dependencies are installed"""
     required_packages = [
-        'flask', 'numpy', 'pandas', 'sklearn', 'openai', 
+        'flask', 'numpy', 'openai', 
         'transformers', 'spacy', 'cryptography', 'jwt'
     ]
     
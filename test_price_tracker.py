@@ -4,14 +4,36 @@ Test script for the Price Tracker Agent System
 Demonstrates the functionality without requiring the full system to run
 """
 
+import os
+import sys
+import gzip
 import json
 import asyncio
+import tempfile
+import threading
+import time
+import subprocess
+import numpy as np
 from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from price_tracker_agent import (
     PriceData, 
+    PriceHistoryStore,
+    SQLitePriceStore,
+    TieredCache,
+    InsightJobManager,
+    InsightBatcher,
+    ModelManager,
+    parse_cpu_list,
+    summarizer_model_id,
+    LLMAgent,
     SecurityManager, 
+    TokenStore,
     PriceAnalysisAgent, 
-    InformationRetrievalAgent
+    InformationRetrievalAgent,
+    ProductSearchIndex,
+    ProductVectorIndex,
+    CONFIG
 )
 
 def test_price_analysis():
@@ -31,17 +53,9 @@ def test_price_analysis():
         {"product_id": "f1", "date": "2025-08-20", "price": 2450}
     ]
     
-    # Convert to PriceData objects
+    # Append into the columnar price history store
     for entry in test_data:
-        product_id = entry['product_id']
-        if product_id not in agent.price_history:
-            agent.price_history[product_id] = []
-        
-        agent.price_history[product_id].append(PriceData(
-            product_id=product_id,
-            date=entry['date'],
-            price=entry['price']
-        ))
+        agent.price_history.add(entry['product_id'], entry['date'], entry['price'])
     
     # Test analysis
     print("\n📊 Price Analysis Results:")
@@ -60,6 +74,561 @@ def test_price_analysis():
     for alert in alerts:
         print(f"  {alert['product_id']}: {alert['change_percent']}% change")
 
+def test_price_history_store():
+    """Test the columnar price history store"""
+    print("\n🗄️  Testing Price History Store...")
+    
+    store = PriceHistoryStore()
+    
+    # Out-of-order and duplicate dates
+    store.add("e1", "2025-08-20", 4950, category="Electronics")
+    store.add("e1", "2025-08-01", 5100)
+    store.add("e1", "2025-08-10", 5000)
+    replaced = not store.add("e1", "2025-08-10", 5050)
+    
+    series = store["e1"]
+    assert series.dates == ["2025-08-01", "2025-08-10", "2025-08-20"]
+    assert series.prices.tolist() == [5100.0, 5050.0, 4950.0]
+    assert replaced
+    print(f"✅ Points kept sorted by date: {series.dates}")
+    
+    # Bulk merge keeps order and last price per date
+    store.add_many([("e1", "2025-08-05", 5080), ("e1", "2025-08-20", 4900), ("f1", "2025-08-01", 2600)])
+    assert store["e1"].dates == ["2025-08-01", "2025-08-05", "2025-08-10", "2025-08-20"]
+    assert store["e1"].prices[-1] == 4900.0
+    print(f"✅ Bulk merge: {store.total_points} points across {len(store)} products")
+    
+    # Category and product IDs are interned
+    store.add("e2", "2025-08-01", 18000, category="".join(["Electro", "nics"]))
+    assert store["e2"].category is store["e1"].category
+    assert store.product_ids("Electronics") == ["e1", "e2"]
+    print(f"✅ Interned categories: {store.categories()}")
+
+def test_batch_analysis():
+    """Test that the vectorized batch engine matches per-product analysis"""
+    print("\n📦 Testing Batch Trend Analysis...")
+    
+    agent = PriceAnalysisAgent()
+    agent.load_price_data("frontend/src/data/pricehistory.json")
+    agent.load_categories("frontend/src/data/products.json")
+    agent.price_history.add("single", "2025-08-01", 100)
+    agent.price_history.add("zero", "2025-08-01", 0)
+    agent.price_history.add("zero", "2025-08-02", 40)
+    
+    product_ids = list(agent.price_history.keys())
+    batch = agent.analyze_batch(product_ids + ["missing"])
+    assert len(batch) == len(product_ids) + 1
+    assert batch[-1]["error"] == "Product not found"
+    
+    for result in batch[:-1]:
+        expected = agent.analyze_product_trends(result["product_id"])
+        if "error" in expected:
+            assert result["error"] == expected["error"]
+            continue
+        assert result.keys() == expected.keys()
+        for key, value in expected.items():
+            if isinstance(value, float):
+                assert abs(result[key] - value) <= 1e-6 * max(1.0, abs(value)) + 0.011, (key, result, expected)
+            else:
+                assert result[key] == value, (key, result, expected)
+    print(f"✅ Batch results match per-product analysis for {len(product_ids)} products")
+    
+    zero = agent.analyze_batch(["zero"])[0]
+    assert zero["price_change_percent"] is None and zero == agent.analyze_product_trends("zero")
+    print("✅ A zero previous price gives price_change_percent None in both paths")
+    
+    electronics = agent.analyze_batch(category="Electronics")
+    assert electronics and all(r["product_id"].startswith("e") for r in electronics)
+    print(f"✅ Category batch: {len(electronics)} Electronics products")
+
+def test_streaming_ingest():
+    """Test NDJSON ingestion with incremental running statistics"""
+    print("\n📥 Testing Streaming Ingestion...")
+    
+    agent = PriceAnalysisAgent()
+    rng = np.random.default_rng(42)
+    days = rng.permutation(60)[:40]
+    lines = [
+        json.dumps({"product_id": "e1", "date": (datetime(2025, 8, 1) + timedelta(days=int(d))).strftime("%Y-%m-%d"),
+                    "price": float(5000 + 10 * d + rng.normal(0, 25))})
+        for d in days
+    ]
+    lines.append(lines[3])                                                    # duplicate
+    lines.append(json.dumps({**json.loads(lines[5]), "price": 4000}))         # correction
+    lines.append('{"product_id": "e1", "date": "not-a-date", "price": 1}')    # rejected
+    lines.append("{broken")                                                   # rejected
+    
+    result = agent.ingest_ndjson(lines, batch_size=7)
+    assert (result["accepted"], result["duplicates"], result["updated"], result["rejected"]) == (40, 1, 1, 2), result
+    print(f"✅ Ingest result: {result['accepted']} accepted, {result['updated']} updated, "
+          f"{result['duplicates']} duplicates, {result['rejected']} rejected")
+    
+    # Running stats must agree with a fresh grouped computation over the arrays
+    incremental = agent.analyze_product_trends("e1")
+    recomputed = agent.analyze_batch(["e1"])[0]
+    assert agent.price_history["e1"].dates == sorted(agent.price_history["e1"].dates)
+    for key in ("volatility", "predicted_price", "prediction_confidence"):
+        assert abs(incremental[key] - recomputed[key]) <= 0.011, (key, incremental, recomputed)
+    print(f"✅ O(1) stats match full recomputation: predicted {incremental['predicted_price']}")
+    
+    # Insight jobs get a snapshot that later ingests don't touch
+    snapshot = agent.snapshot_series("e1")
+    before = (snapshot.prices.tolist(), snapshot.linear_fit())
+    agent.ingest_prices([{"product_id": "e1", "date": "2025-11-30", "price": 9999}])
+    assert (snapshot.prices.tolist(), snapshot.linear_fit()) == before
+    assert len(agent.price_history["e1"]) == len(snapshot) + 1
+    print("✅ Series snapshots are isolated from later ingests")
+    
+    # A zero price is rejected at ingest; one already in the history must not break alerts or analysis
+    result = agent.ingest_prices([{"product_id": "e1", "date": "2025-12-01", "price": 0}])
+    assert result["rejected"] == 1 and result["accepted"] == 0
+    agent.price_history.add("z1", "2025-08-01", 0)
+    agent.price_history.add("z1", "2025-08-02", 50)
+    assert "z1" not in [alert["product_id"] for alert in agent.get_price_alerts(5.0)]
+    analysis = agent.analyze_product_trends("z1")
+    assert analysis["price_change_percent"] is None and analysis["trend"] == "increasing"
+    print("✅ Zero prices rejected at ingest; a zero previous price leaves the change percent undefined")
+
+def test_streaming_loader():
+    """Test the chunked loader on JSON array, NDJSON and gzip inputs"""
+    print("\n🌊 Testing Streaming Loader...")
+    
+    with open("frontend/src/data/pricehistory.json") as f:
+        entries = json.load(f)
+    expected = PriceAnalysisAgent()
+    expected.price_history.add_many((e["product_id"], e["date"], e["price"]) for e in entries)
+    
+    ndjson = "\n".join(json.dumps(e) for e in entries).encode()
+    variants = {
+        "array.json": json.dumps(entries, indent=2).encode(),
+        "lines.ndjson": ndjson,
+        "lines.ndjson.gz": gzip.compress(ndjson),
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, payload in variants.items():
+            path = os.path.join(tmp, name)
+            with open(path, "wb") as f:
+                f.write(payload)
+            
+            agent = PriceAnalysisAgent()
+            updates = []
+            # Tiny chunks and batches force records to straddle read boundaries
+            loaded = agent.load_price_data(path, chunk_size=37, memory_limit=0,
+                                           progress=lambda *args: updates.append(args))
+            assert loaded == len(entries), (name, loaded)
+            assert updates[-1] == (len(payload), len(payload), len(entries))
+            for product_id, series in expected.price_history.items():
+                assert agent.price_history[product_id].prices.tolist() == series.prices.tolist()
+            print(f"✅ {name}: {loaded} points in {len(updates)} progress updates")
+
+def test_price_snapshot():
+    """Test saving and memory-mapping a binary price snapshot"""
+    print("\n💾 Testing Price Snapshot...")
+    
+    agent = PriceAnalysisAgent()
+    agent.load_price_data("frontend/src/data/pricehistory.json")
+    agent.load_categories("frontend/src/data/products.json")
+    expected = {pid: agent.analyze_product_trends(pid) for pid in agent.price_history}
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "prices.snap")
+        agent.save_snapshot(path)
+        
+        restored = PriceAnalysisAgent()
+        assert restored.load_snapshot(path)
+        assert len(restored.price_history) == len(expected)
+        assert not restored.price_history["e1"].prices.flags.writeable
+        assert restored.price_history["e1"].category == "Electronics"
+        for product_id, analysis in expected.items():
+            assert restored.analyze_product_trends(product_id) == analysis
+        print(f"✅ Mapped {restored.price_history.total_points} points, analysis identical")
+        
+        # Writes copy the touched series out of the read-only mapping
+        restored.ingest_prices([{"product_id": "e1", "date": "2025-09-01", "price": 4800}])
+        assert restored.price_history["e1"].prices[-1] == 4800
+        assert restored.price_history["e2"].prices.tolist() == agent.price_history["e2"].prices.tolist()
+        print("✅ Copy-on-write ingest after mapping")
+        
+        # A snapshot older than its source JSON is ignored
+        source = os.path.join(tmp, "history.json")
+        with open(source, "w") as f:
+            f.write("[]")
+        os.utime(path, (0, 0))
+        assert not PriceAnalysisAgent().load_snapshot(path, source_path=source)
+        print("✅ Stale snapshot rejected")
+
+def test_sqlite_price_store():
+    """Test the SQLite-backed price store with lazy per-product loading"""
+    print("\n🗃️  Testing SQLite Price Store...")
+    
+    expected = PriceAnalysisAgent()
+    expected.load_price_data("frontend/src/data/pricehistory.json")
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "prices.db")
+        store = SQLitePriceStore(path, cache_size=5)
+        agent = PriceAnalysisAgent(store)
+        agent.load_price_data("frontend/src/data/pricehistory.json")
+        agent.load_categories("frontend/src/data/products.json")
+        assert len(store) == len(expected.price_history)
+        assert store.total_points == expected.price_history.total_points
+        
+        for product_id in expected.price_history:
+            assert agent.analyze_product_trends(product_id) == expected.analyze_product_trends(product_id)
+        assert len(store._series) <= 5
+        def alert_key(alerts):
+            return sorted((a["product_id"], a["current_price"], a["previous_price"]) for a in alerts)
+        assert alert_key(agent.get_price_alerts(3.0)) == alert_key(expected.get_price_alerts(3.0))
+        print(f"✅ {len(store)} products analyzed lazily with {len(store._series)} kept hot "
+              f"({store.hits} hits / {store.misses} misses)")
+        
+        agent.ingest_prices([{"product_id": "e1", "date": "2025-09-01", "price": 4800},
+                             {"product_id": "new", "date": "2025-09-01", "price": 10}])
+        store.close()
+        
+        reopened = PriceAnalysisAgent(SQLitePriceStore(path))
+        assert reopened.price_history["e1"].prices[-1] == 4800
+        assert "new" in reopened.price_history
+        assert reopened.price_history.product_ids("Electronics")[:2] == ["e1", "e2"]
+        print("✅ Ingested points persisted across reopen")
+        
+        # The database is the durable copy, so snapshot calls are declined rather than written
+        snapshot_path = os.path.join(tmp, "prices.snap")
+        assert not reopened.save_snapshot(snapshot_path) and not os.path.exists(snapshot_path)
+        expected.save_snapshot(snapshot_path)
+        assert not reopened.load_snapshot(snapshot_path)
+        assert isinstance(reopened.price_history, SQLitePriceStore)
+        reopened.price_history.close()
+
+def test_tiered_cache():
+    """Test the LRU/TTL cache with its on-disk tier"""
+    print("\n🧊 Testing Tiered Cache...")
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "cache.db")
+        cache = TieredCache(max_entries=2, ttl=60, disk_path=path)
+        key = TieredCache.make_key("gpt-3.5-turbo", "system prompt", "summary")
+        assert key == TieredCache.make_key("gpt-3.5-turbo", "system prompt", "summary")
+        assert key != TieredCache.make_key("gpt-4", "system prompt", "summary")
+        
+        assert cache.get(key) is None
+        cache.set(key, "insight")
+        cache.set("b", "B")
+        cache.set("c", "C")
+        assert cache.get("a") is None and cache.stats()["evictions"] == 1
+        assert cache.get(key) == "insight"                  # evicted from memory, served from disk
+        cache.set("short", "lived", ttl=-1)
+        assert cache.get("short") is None
+        stats = cache.stats()
+        assert (stats["disk_hits"], stats["misses"]) == (1, 3), stats
+        print(f"✅ LRU + TTL + disk tier: {stats}")
+        
+        restarted = TieredCache(max_entries=2, ttl=60, disk_path=path)
+        assert restarted.get(key) == "insight"
+        print("✅ Entries survive a restart")
+
+def test_insight_jobs():
+    """Test background LLM insight jobs with bounded concurrency"""
+    print("\n⏳ Testing Insight Job Manager...")
+    
+    class SlowLLM:
+        def __init__(self):
+            self.active = 0
+            self.peak = 0
+            self.lock = threading.Lock()
+        
+        def analyze_price_trends(self, price_data, timeout=None):
+            with self.lock:
+                self.active += 1
+                self.peak = max(self.peak, self.active)
+            time.sleep(0.05)
+            with self.lock:
+                self.active -= 1
+            return f"insight for {price_data.product_id} (timeout={timeout})"
+    
+    store = PriceHistoryStore()
+    store.add("e1", "2025-08-01", 5100)
+    llm = SlowLLM()
+    jobs = InsightJobManager(llm, max_workers=2, timeout=5, max_pending=6)
+    
+    job_ids = [jobs.submit("e1", store["e1"]) for _ in range(6)]
+    assert jobs.submit("e1", store["e1"]) is None          # queue full
+    assert jobs.get(job_ids[-1])["status"] in ("pending", "running")
+    
+    results = [jobs.wait(job_id, timeout=5) for job_id in job_ids]
+    assert all(job["status"] == "done" for job in results)
+    assert results[0]["llm_insights"] == "insight for e1 (timeout=5)"
+    assert llm.peak == 2
+    print(f"✅ {len(results)} jobs completed with at most {llm.peak} concurrent LLM calls")
+    jobs.shutdown()
+    
+    # A failing completion surfaces as a failed job instead of a fallback insight
+    class BrokenBatcher:
+        def submit(self, summary):
+            raise ConnectionError("LLM endpoint unreachable")
+        request_one = submit
+    
+    agent = LLMAgent()
+    agent.insight_batcher = BrokenBatcher()
+    jobs = InsightJobManager(agent, max_workers=1, timeout=5)
+    store.add("e1", "2025-08-02", 5000)
+    job = jobs.wait(jobs.submit("e1", store["e1"]), timeout=5)
+    assert job["status"] == "failed" and job["llm_insights"] is None
+    assert job["error"] == "LLM endpoint unreachable"
+    print("✅ LLM errors mark the job failed")
+    jobs.shutdown()
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    """Minimal local stand-in for the OpenAI chat completions endpoint"""
+    
+    requests = []
+    break_batches = False
+    
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        FakeOpenAIHandler.requests.append(body)
+        prompt = body["messages"][-1]["content"]
+        if "for each product" in prompt:
+            keyed = json.loads(prompt.split(": ", 1)[1])
+            content = "not json" if FakeOpenAIHandler.break_batches else \
+                "```json\n" + json.dumps({key: f"batched: {summary}" for key, summary in keyed.items()}) + "\n```"
+        else:
+            content = f"single: {prompt.split(': ', 1)[1]}"
+        
+        payload = json.dumps({
+            "id": "chatcmpl-test", "object": "chat.completion", "created": 0, "model": body["model"],
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": content}}],
+            "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2}
+        }).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+    
+    def log_message(self, *args):
+        pass
+
+def test_insight_batching():
+    """Test micro-batched LLM prompts against a local fake OpenAI server"""
+    print("\n🧺 Testing Insight Batching...")
+    import openai
+    
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeOpenAIHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    client = openai.OpenAI(api_key="test", base_url=f"http://127.0.0.1:{server.server_port}/v1")
+    
+    try:
+        for break_batches in (False, True):
+            FakeOpenAIHandler.requests = []
+            FakeOpenAIHandler.break_batches = break_batches
+            batcher = InsightBatcher(client, "gpt-3.5-turbo", "You are a price analysis expert.",
+                                     window=0.05, max_wait=0.5, max_batch=8, timeout=10)
+            summaries = [f"summary {i}" for i in range(10)] + ["summary 0"]
+            futures = [batcher.submit(summary) for summary in summaries]
+            results = [future.result(timeout=10) for future in futures]
+            
+            prefix = "single" if break_batches else "batched"
+            assert results == [f"{prefix}: {summary}" for summary in summaries], results
+            batched_calls = sum("for each product" in r["messages"][-1]["content"] for r in FakeOpenAIHandler.requests)
+            assert batched_calls == 2, FakeOpenAIHandler.requests
+            if break_batches:
+                assert batcher.stats()["fallbacks"] == len(FakeOpenAIHandler.requests) - batched_calls
+            else:
+                assert len(FakeOpenAIHandler.requests) == 2
+            print(f"✅ {len(summaries)} requests -> {len(FakeOpenAIHandler.requests)} completions "
+                  f"({'with per-product fallback' if break_batches else 'batched'})")
+    finally:
+        server.shutdown()
+
+def test_import_time():
+    """Guard against heavy ML libraries leaking back into the module import"""
+    print("\n⏱️  Testing Import Time...")
+    
+    heavy = ["torch", "transformers", "spacy", "openai", "sklearn", "pandas"]
+    probe = (
+        "import json, sys, time; start = time.perf_counter(); import price_tracker_agent; "
+        "elapsed = time.perf_counter() - start; "
+        f"print(json.dumps({{'seconds': elapsed, 'loaded': [m for m in {heavy!r} if m in sys.modules]}}))"
+    )
+    result = subprocess.run([sys.executable, "-c", probe], capture_output=True, text=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__)), check=True)
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+    
+    assert report["loaded"] == [], f"heavy modules imported eagerly: {report['loaded']}"
+    budget = float(os.getenv("IMPORT_TIME_BUDGET", "2.0"))
+    assert report["seconds"] < budget, f"import took {report['seconds']:.2f}s (budget {budget}s)"
+    print(f"✅ price_tracker_agent imported in {report['seconds'] * 1000:.0f} ms without {', '.join(heavy)}")
+
+def test_model_manager():
+    """Test lazy model loading, LRU eviction under a memory cap and idle unloading"""
+    print("\n🧠 Testing Model Manager...")
+    
+    loads = []
+    def loader(name):
+        def load():
+            loads.append(name)
+            return {"model": name}
+        return load
+    
+    models = ModelManager(idle_timeout=0, memory_limit=120)
+    models.register("summarizer", loader("summarizer"), size_bytes=60)
+    models.register("ner", loader("ner"), size_bytes=30)
+    models.register("other", loader("other"), size_bytes=50)
+    assert loads == []
+    
+    assert models.get("summarizer") == {"model": "summarizer"}
+    assert models.get("ner") == {"model": "ner"}
+    models.get("summarizer")                               # summarizer is now most recently used
+    assert loads == ["summarizer", "ner"]
+    
+    models.get("other")                                    # 60 + 30 + 50 > 120: evicts only ner (LRU)
+    stats = models.stats()
+    resident = sorted(name for name, entry in stats.items() if entry["loaded"])
+    assert resident == ["other", "summarizer"], resident
+    assert stats["ner"]["unloads"] == 1
+    assert stats["summarizer"]["load_seconds"] is not None
+    print(f"✅ Loaded lazily and evicted LRU: {[n for n, e in stats.items() if e['loaded']]} resident")
+    
+    models.idle_timeout = 0.01
+    time.sleep(0.02)
+    models.unload_idle()
+    assert not any(entry["loaded"] for entry in models.stats().values())
+    print("✅ Idle models unloaded")
+    
+    agent = LLMAgent()
+    assert not any(entry["loaded"] for entry in agent.models.stats().values())
+    assert agent.summarize_text("short text") == "short text"
+    print("✅ LLMAgent starts without loading summarizer or NER models")
+
+class FakeSummarizer:
+    """Stands in for the Hugging Face pipeline: one token per word, records each batch"""
+    
+    def __init__(self):
+        self.batches = []
+        self.tokenizer = lambda texts, truncation: {"input_ids": [text.split() for text in texts]}
+    
+    def __call__(self, texts, **kwargs):
+        self.batches.append([len(text.split()) for text in texts])
+        return [{"summary_text": f"summary of {len(text.split())} words"} for text in texts]
+
+def test_batched_summarization():
+    """Test length-bucketed batch summarization and the short-text bypass"""
+    print("\n📝 Testing Batched Summarization...")
+    
+    agent = LLMAgent()
+    summarizer = FakeSummarizer()
+    agent.models.register("summarizer", lambda: summarizer)
+    
+    word_counts = [40, 200, 25, 180, 60, 30, 210, 45]
+    texts = [" ".join(["word"] * n) for n in word_counts]
+    texts.insert(3, "too short to summarize")
+    results = agent.summarize_many(texts, batch_size=3)
+    
+    assert results[3] == "too short to summarize"
+    expected = [f"summary of {n} words" for n in word_counts]
+    assert results[:3] + results[4:] == expected
+    assert summarizer.batches == [[25, 30, 40], [45, 60, 180], [200, 210]], summarizer.batches
+    print(f"✅ {len(word_counts)} texts summarized in {len(summarizer.batches)} length-sorted batches")
+    
+    assert agent.summarize_text(texts[0]) == "summary of 40 words"
+    assert agent.summarize_many([]) == []
+    print("✅ summarize_text delegates to the batched path")
+
+def test_bulk_entity_extraction():
+    """Test nlp.pipe entity extraction with components NER doesn't need disabled"""
+    print("\n🏷️ Testing Bulk Entity Extraction...")
+    import spacy
+    from spacy.language import Language
+    
+    parsed = []
+    
+    @Language.component("record_parse")
+    def record_parse(doc):
+        parsed.append(doc.text)
+        return doc
+    
+    nlp = spacy.blank("en")
+    nlp.add_pipe("record_parse", name="parser")
+    ruler = nlp.add_pipe("entity_ruler")
+    ruler.add_patterns([{"label": "ORG", "pattern": "Apple"}, {"label": "PRODUCT", "pattern": "iPhone"}])
+    parsed.clear()                                          # the ruler runs its pattern texts through nlp
+    
+    agent = LLMAgent()
+    agent.models.register("ner", lambda: nlp)
+    texts = ["Apple cut the iPhone price", "no entities here", "iPhone"]
+    results = agent.extract_entities_many(texts)
+    
+    assert results[0] == [
+        {"text": "Apple", "label": "ORG", "start": 0, "end": 5},
+        {"text": "iPhone", "label": "PRODUCT", "start": 14, "end": 20}
+    ]
+    assert results[1] == []
+    assert results[2][0]["label"] == "PRODUCT"
+    assert parsed == [], "parser should be disabled for NER"
+    print(f"✅ {sum(map(len, results))} entities from {len(texts)} texts, parser skipped")
+    
+    assert agent.extract_entities("Apple stock") == ["Apple"]
+    assert nlp("Apple").ents and parsed == ["Apple"]   # pipeline itself left intact
+    print("✅ extract_entities delegates to the bulk path")
+
+def test_inference_profile():
+    """Test summarizer inference profile selection and CPU list parsing"""
+    print("\n⚙️ Testing Summarizer Inference Profiles...")
+    
+    assert parse_cpu_list("0-3,6") == [0, 1, 2, 3, 6]
+    assert parse_cpu_list("") == []
+    assert summarizer_model_id("fp32", "facebook/bart-large-cnn") == "facebook/bart-large-cnn"
+    assert summarizer_model_id("int8", "facebook/bart-large-cnn") == "facebook/bart-large-cnn:int8"
+    assert summarizer_model_id("distilled", "facebook/bart-large-cnn", "/models/distilbart") == "/models/distilbart"
+    for profile, path in (("fp16", ""), ("distilled", "")):
+        try:
+            summarizer_model_id(profile, "facebook/bart-large-cnn", path)
+            assert False, f"{profile} without a checkpoint should be rejected"
+        except ValueError:
+            pass
+    print("✅ Profiles resolve to distinct cache identities; invalid profiles rejected")
+
+def test_nlp_cache():
+    """Test content-addressed caching of summaries and entities, across restarts and model changes"""
+    print("\n🗃️ Testing NLP Result Cache...")
+    
+    text = "The new phone ships with a larger battery and a faster chip. " * 4
+    with tempfile.TemporaryDirectory() as tmp:
+        saved = {key: CONFIG[key] for key in ("nlp_cache_path", "summarizer_model")}
+        CONFIG["nlp_cache_path"] = os.path.join(tmp, "nlp_cache.db")
+        try:
+            agent = LLMAgent()
+            summarizer = FakeSummarizer()
+            agent.models.register("summarizer", lambda: summarizer)
+            first = agent.summarize_many([text, text])
+            assert agent.summarize_text(text) == first[0] == first[1]
+            assert len(summarizer.batches) == 1
+            
+            # A fresh agent (restart) is served from the disk tier without loading the model
+            restarted = LLMAgent()
+            assert restarted.summarize_text(text) == first[0]
+            assert not restarted.models.is_loaded("summarizer")
+            stats = restarted.nlp_cache.stats()
+            assert stats["disk_hits"] == 1
+            print(f"✅ Summary served from cache after restart (hit rate {agent.nlp_cache.stats()['hit_rate']})")
+            
+            # Switching models invalidates entries produced by the old one
+            CONFIG["summarizer_model"] = "sshleifer/distilbart-cnn-12-6"
+            swapped = LLMAgent()
+            swapped_summarizer = FakeSummarizer()
+            swapped.models.register("summarizer", lambda: swapped_summarizer)
+            swapped.summarize_text(text)
+            assert len(swapped_summarizer.batches) == 1
+            
+            swapped.invalidate_nlp_cache("summary")
+            swapped.summarize_text(text)
+            assert len(swapped_summarizer.batches) == 2
+            print("✅ Cache invalidated on model change and on request")
+        finally:
+            CONFIG.update(saved)
+
 def test_security():
     """Test the security functionality"""
     print("\n🔐 Testing Security Manager...")
@@ -91,6 +660,44 @@ def test_security():
     decrypted = security.decrypt_data(encrypted)
     print(f"✅ Encryption/Decryption: '{test_data}' -> '{decrypted}'")
 
+def test_token_store():
+    """Test expiry-ordered eviction, the hard cap and the verified-token cache"""
+    print("\n🎟️ Testing Token Store...")
+    
+    now = time.time()
+    store = TokenStore(max_tokens=3, verify_ttl=60)
+    store.add("expired", now - 1)
+    store.add("a", now + 300)
+    store.add("b", now + 100)
+    store.add("c", now + 200)                              # purges "expired" first, so no eviction
+    assert len(store) == 3 and "expired" not in store
+    store.add("d", now + 400)                              # at the cap: evicts "b", closest to expiry
+    assert "b" not in store and all(t in store for t in ("a", "c", "d"))
+    stats = store.stats()
+    assert stats["expirations"] == 1 and stats["evictions"] == 1
+    print(f"✅ Expired and soonest-expiring tokens evicted under the cap: {stats}")
+    
+    store.mark_verified("a")
+    assert store.is_verified("a") and not store.is_verified("c")
+    store.discard("a")
+    assert not store.is_verified("a") and "a" not in store
+    
+    # A discarded token left at the head of the heap must not drag a live token out with it
+    store = TokenStore(max_tokens=10)
+    store.add("stale", now + 0.05)
+    store.add("live", now + 300)
+    store.discard("stale")
+    time.sleep(0.06)
+    store.add("new", now + 600)                            # purges past the stale head
+    assert "live" in store and "new" in store and store.stats()["expirations"] == 0
+    
+    security = SecurityManager()
+    token = security.authenticate_user("admin", "admin123")
+    assert security.verify_token(token) and security.verify_token(token)
+    assert security.active_tokens.stats()["verify_cache_hits"] == 1
+    assert not security.verify_token(token + "x")
+    print("✅ Repeat verification served from the verified-token cache")
+
 def test_information_retrieval():
     """Test the information retrieval functionality"""
     print("\n🔍 Testing Information Retrieval Agent...")
@@ -114,6 +721,188 @@ def test_information_retrieval():
     for key, value in insights.items():
         print(f"   {key}: {value}")
 
+def test_retrieval_cache():
+    """Test namespace TTLs, request coalescing and invalidation in the retrieval cache"""
+    print("\n🧊 Testing Retrieval Cache...")
+    
+    cache = TieredCache(max_entries=2, ttl=3600, namespace_ttls={"search": 0.05})
+    assert cache.ttl_for("search:q") == 0.05 and cache.ttl_for("product:e1") == 3600
+    cache.set("search:q", ["e1"])
+    cache.set("product:e1", {"id": "e1"})
+    time.sleep(0.06)
+    assert cache.get("search:q") is None and cache.get("product:e1") == {"id": "e1"}
+    cache.set("product:e2", {})
+    cache.set("product:e3", {})
+    assert cache.stats()["evictions"] == 1 and cache.get("product:e1") is None
+    print("✅ Per-namespace TTLs expire independently; LRU bounds the size")
+    
+    calls = []
+    release = threading.Event()
+    def slow_search():
+        calls.append(1)
+        release.wait(5)
+        return ["e1", "e2"]
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_compute("search:mouse", slow_search)))
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    while cache.stats()["coalesced"] < 7:
+        time.sleep(0.001)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1 and results == [["e1", "e2"]] * 8
+    assert cache.get_or_compute("search:mouse", slow_search) == ["e1", "e2"] and len(calls) == 1
+    
+    def failing():
+        raise RuntimeError("index unavailable")
+    for _ in range(2):
+        try:
+            cache.get_or_compute("search:broken", failing)
+            assert False, "exception not propagated"
+        except RuntimeError:
+            pass
+    assert cache.peek("search:broken") is None and cache.stats()["in_flight"] == 0
+    print(f"✅ 8 concurrent misses ran one computation ({cache.stats()['coalesced']} coalesced); failures are not cached")
+    
+    agent = InformationRetrievalAgent()
+    first = agent.search_products("Wireless  Mouse")
+    assert agent.search_products("wireless mouse") == first
+    assert agent.get_product_details("e1") is agent.catalog.get("e1")      # plain dict lookup, never cached
+    stats = agent.cache.stats()
+    assert stats["hits"] == 1 and stats["misses"] == 1
+    
+    # Similar products cache the ranking only, so a price change shows up without invalidation
+    prices = PriceAnalysisAgent()
+    prices.ingest_prices([{"product_id": record["id"], "date": "2025-08-01", "price": 100} for record in agent.catalog])
+    priced = InformationRetrievalAgent(price_agent=prices)
+    neighbour = priced.similar_products("e1", 3)[0]["id"]
+    prices.ingest_prices([{"product_id": neighbour, "date": "2025-08-02", "price": 77}])
+    again = priced.similar_products("e1", 3)
+    assert again[0]["id"] == neighbour and again[0]["latest_price"] == 77
+    assert priced.cache.stats()["hits"] == 1
+    agent.add_products([{"id": "z1", "name": "Wireless Mouse Pro", "category": "Electronics", "price": 9000}])
+    assert "z1" in [product["id"] for product in agent.search_products("wireless mouse")]
+    assert agent.get_market_insights()["total_products"] == 101
+    print("✅ Search and similar lookups cached, fresh prices on read, invalidated when products change")
+
+def test_product_catalog():
+    """Test the products.json catalog indexes and the latest-price join"""
+    print("\n🗂️ Testing Product Catalog...")
+    
+    price_agent = PriceAnalysisAgent()
+    price_agent.ingest_prices([
+        {"product_id": "e1", "date": "2025-08-01", "price": 5100},
+        {"product_id": "e1", "date": "2025-08-10", "price": 4900}
+    ])
+    agent = InformationRetrievalAgent(price_agent=price_agent)
+    catalog = agent.catalog
+    assert len(catalog) == 100
+    
+    mouse = agent.get_product_details("e1")
+    assert mouse["name"] == "Wireless Mouse" and mouse["price_band"] == "5000-20000"
+    assert mouse["latest_price"] == 4900 and mouse["latest_price_date"] == "2025-08-10"
+    assert agent.get_product_details("e1") is mouse                # no per-call allocation
+    assert catalog.by_category("Electronics") is catalog.by_category("Electronics")
+    assert len(catalog.by_category("Electronics")) == 20 and catalog.by_category("Toys") == ()
+    assert all(p["price"] < 1000 for p in catalog.by_price_band("0-1000"))
+    assert sum(len(catalog.by_price_band(band)) for band in catalog.band_labels) == 100
+    print(f"✅ {len(catalog)} products indexed across {len(catalog.categories)} categories and "
+          f"{len(catalog.band_labels)} price bands")
+    
+    price_agent.ingest_prices([{"product_id": "e1", "date": "2025-08-20", "price": 4700}])
+    assert mouse["latest_price"] == 4700 and mouse["latest_price_date"] == "2025-08-20"
+    assert agent.get_market_insights()["total_products"] == 100
+    assert agent.search_products("wireless mouse")[0]["id"] == "e1"
+    print("✅ Latest prices joined in place as new prices arrive")
+
+def test_search_index():
+    """Test BM25 ranking, pruning exactness, fuzzy matching, typeahead and incremental updates"""
+    print("\n🔎 Testing Product Search Index...")
+    import random
+    rng = random.Random(7)
+    
+    adjectives = ["wireless", "portable", "premium", "classic", "smart", "organic", "leather", "cotton"]
+    nouns = ["mouse", "keyboard", "shirt", "cleanser", "blender", "lamp", "headphones", "jacket"]
+    categories = ["Electronics", "Fashion", "Beauty", "Kitchen", "Home"]
+    index = ProductSearchIndex()
+    for i in range(5000):
+        filler = " ".join(f"w{rng.randrange(300)}" for _ in range(rng.randrange(12)))
+        index.add(f"p{i}", f"{rng.choice(adjectives)} {rng.choice(adjectives)} {rng.choice(nouns)} "
+                            f"{rng.choice(categories)} {filler}")
+    
+    def brute_force(query, k):
+        totals = {}
+        for term in dict.fromkeys(index.tokenize(query)):
+            docs, weights, _, _ = index._term_weights(term)
+            for doc, weight in zip(docs.tolist(), weights.tolist()):
+                totals[doc] = totals.get(doc, 0.0) + weight
+        return sorted(totals.values(), reverse=True)[:k]
+    
+    for query in ["wireless mouse", "premium leather jacket fashion", "organic cleanser beauty w7", "lamp"]:
+        scores = [score for _, score in index.search(query, 10)]
+        assert np.allclose(scores, brute_force(query, 10), rtol=1e-4), query
+    print("✅ Pruned BM25 top-k matches exhaustive scoring")
+    
+    # Past the postings budget only the highest-IDF terms are accumulated: scores stay exact,
+    # but a document ranked mostly by the dropped terms can be missed
+    query = "wireless portable premium electronics fashion"
+    exact = [score for _, score in index.search(query, 10)]
+    index.max_dense_postings = 2000
+    capped = index.search(query, 10)
+    index.max_dense_postings = 0
+    full = dict(index.search(query, len(index)))
+    assert capped[0][1] == exact[0] and all(c <= e * (1 + 1e-6) for (_, c), e in zip(capped, exact))
+    assert np.allclose([score for _, score in capped], [full[pid] for pid, _ in capped], rtol=1e-4)
+    print(f"✅ Capped accumulation keeps exact scores (top-10 score sum {sum(s for _, s in capped):.2f} "
+          f"vs exact {sum(exact):.2f})")
+    
+    assert index.search("hedphones", 5) and all(index.search("hedphones", 5))
+    assert ("headphones", 1) in index.fuzzy_terms("hedphones")
+    assert index.suggest("head") == ["headphones"] and index.suggest("zzz") == []
+    print("✅ Misspellings matched within edit distance; typeahead completes prefixes")
+    
+    index.add("new1", "Ergonomic vertical mouse")
+    assert index.search("ergonomic", 1)[0][0] == "new1"
+    index.add("new1", "Ceramic teapot")                    # re-indexing replaces the old text
+    assert index.search("ergonomic", 1) == [] and index.search("teapot", 1)[0][0] == "new1"
+    assert len(index) == 5001
+    print("✅ Products added and re-indexed incrementally")
+
+def test_vector_similarity():
+    """Test hashed TF-IDF vectors, top-k cosine similarity and memory-mapped persistence"""
+    print("\n🧭 Testing Product Vector Similarity...")
+    
+    with open("frontend/src/data/products.json", 'r') as f:
+        products = json.load(f)
+    index = ProductVectorIndex(dim=256)
+    index.build(products)
+    assert index.matrix.dtype == np.float32 and index.matrix.flags.c_contiguous
+    assert index.matrix.shape == (len(products), 256)
+    assert np.allclose(np.linalg.norm(index.matrix, axis=1), 1.0, atol=1e-5)
+    
+    similar = index.similar("e1", 5)
+    assert len(similar) == 5 and "e1" not in [pid for pid, _ in similar]
+    scores = [score for _, score in similar]
+    assert scores == sorted(scores, reverse=True)
+    brute = sorted((float(index.matrix[row] @ index.matrix[0]), pid)
+                   for row, pid in enumerate(index.product_ids) if pid != "e1")[::-1][:5]
+    assert np.allclose(scores, [score for score, _ in brute], atol=1e-6)
+    assert index.similar("missing") == []
+    assert index.similar_to_text(ProductSearchIndex.product_text(products[3]), 1)[0][0] == products[3]["id"]
+    print(f"✅ Top-k by cosine matches exhaustive scoring (nearest to e1: {similar[0][0]})")
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "vectors")
+        index.save(path)
+        loaded = ProductVectorIndex.load(path)
+        assert isinstance(loaded.matrix, np.memmap)
+        assert loaded.similar("e1", 5) == similar
+        loaded.add([dict(products[0], id="x1")])
+        assert loaded.similar("e1", 1)[0][0] == "x1" and len(loaded) == len(products) + 1
+    print("✅ Vectors persisted, memory-mapped back and extended incrementally")
+
 def test_data_loading():
     """Test loading data from the JSON file"""
     print("\n📁 Testing Data Loading...")
@@ -132,7 +921,7 @@ def test_data_loading():
         # Show price range
         all_prices = []
         for product_data in agent.price_history.values():
-            all_prices.extend([p.price for p in product_data])
+            all_prices.extend(product_data.prices.tolist())
         
         print(f"   Price range: Rs. {min(all_prices):,} - Rs. {max(all_prices):,}")
         
@@ -141,6 +930,453 @@ def test_data_loading():
     except Exception as e:
         print(f"❌ Error loading data: {e}")
 
+def test_message_bus():
+    """Test per-agent queues, worker concurrency, backpressure and bus metrics"""
+    print("\n🚌 Testing Agent Message Bus...")
+    from price_tracker_agent import CommunicationManager
+    
+    class SleepyAgent:
+        def __init__(self, delay):
+            self.delay = delay
+            self.handled = []
+        
+        async def handle_message(self, message_data):
+            await asyncio.sleep(self.delay)
+            self.handled.append(message_data["message"]["n"])
+    
+    async def scenario():
+        bus = CommunicationManager(queue_size=100, workers=1)
+        slow, fast = SleepyAgent(0.5), SleepyAgent(0.01)
+        parallel = SleepyAgent(0.05)
+        bus.register_agent("slow", slow)
+        bus.register_agent("fast", fast)
+        bus.register_agent("parallel", parallel, workers=8)
+        bus.register_agent("passive", object())             # no handle_message: registered but not on the bus
+        processor = asyncio.create_task(bus.process_messages())
+        
+        await bus.send_message("test", "slow", {"n": 0})
+        for n in range(5):
+            await bus.send_message("test", "fast", {"n": n})
+        start = time.perf_counter()
+        for n in range(16):
+            await bus.send_message("test", "parallel", {"n": n})
+        while len(fast.handled) < 5 or len(parallel.handled) < 16:
+            await asyncio.sleep(0.005)
+        elapsed = time.perf_counter() - start
+        assert not slow.handled, "fast agents waited on the slow one"
+        assert elapsed < 0.3, f"8 workers took {elapsed:.2f}s for 16 x 50 ms"
+        
+        delivered = await bus.broadcast_message("test", {"n": 99})
+        assert delivered == {"slow": True, "fast": True, "parallel": True}
+        assert await bus.send_message("test", "passive", {"n": 0}) is False and "passive" in bus.agents
+        await bus.join()
+        stats = bus.stats()
+        assert "passive" not in stats and all(agent["errors"] == 0 for agent in stats.values())
+        assert stats["parallel"]["processed"] == 17 and stats["parallel"]["workers"] == 8
+        assert stats["slow"]["latency_ms"]["max"] >= 400 and stats["fast"]["queue_depth"] == 0
+        assert await bus.send_message("test", "nobody", {"n": 0}) is False
+        bus.stop()
+        await processor
+        return elapsed
+    
+    async def backpressure():
+        gate = asyncio.Event()
+        class GatedAgent:
+            async def handle_message(self, message_data):
+                await gate.wait()
+        
+        rejecting = CommunicationManager(queue_size=2, workers=1, backpressure="reject")
+        rejecting.register_agent("gated", GatedAgent())
+        results = [await rejecting.send_message("test", "gated", {"n": n}) for n in range(4)]
+        assert results == [True, True, False, False] and rejecting.stats()["gated"]["rejected"] == 2
+        
+        blocking = CommunicationManager(queue_size=2, workers=1, backpressure="block")
+        blocking.register_agent("gated", GatedAgent())
+        processor = asyncio.create_task(blocking.process_messages())
+        for n in range(3):                                   # one in the handler, two queued
+            await blocking.send_message("test", "gated", {"n": n})
+        await asyncio.sleep(0.01)
+        pending = asyncio.create_task(blocking.send_message("test", "gated", {"n": 3}))
+        await asyncio.sleep(0.05)
+        assert not pending.done(), "sender should wait while the queue is full"
+        gate.set()
+        assert await asyncio.wait_for(pending, 1) is True
+        processor.cancel()
+        await processor
+    
+    elapsed = asyncio.run(scenario())
+    print(f"✅ Slow agent isolated; 16 x 50 ms handled by 8 workers in {elapsed * 1000:.0f} ms")
+    asyncio.run(backpressure())
+    print("✅ Full queues reject or block senders according to the backpressure mode")
+
+class WorkerProcessAgent:
+    """Agent for the out-of-process tests (module level so worker processes can import it)"""
+    
+    async def handle_message(self, message_data):
+        message = message_data["message"]
+        if message["type"] == "pid":
+            return os.getpid()
+        if message["type"] == "echo":
+            return message["payload"]
+        if message["type"] == "fail":
+            raise ValueError("bad request")
+        if message["type"] == "crash":
+            os._exit(3)
+
+def test_remote_agent():
+    """Test length-prefixed framing, out-of-process agents and worker restarts"""
+    print("\n🔌 Testing Out-of-Process Agents...")
+    from price_tracker_bus import CommunicationManager, RemoteAgent, encode_frame, read_frame
+    
+    async def framing():
+        reader = asyncio.StreamReader()
+        message = {"to": "llm", "message": {"texts": ["x" * 100000]}}
+        frame = encode_frame(message)
+        reader.feed_data(frame[:3])
+        reader.feed_data(frame[3:] + encode_frame(42))
+        reader.feed_eof()
+        assert await read_frame(reader) == message and await read_frame(reader) == 42
+        try:
+            await read_frame(reader)
+            assert False, "expected EOF"
+        except asyncio.IncompleteReadError:
+            pass
+    asyncio.run(framing())
+    print("✅ Frames round-trip across split reads")
+    
+    bus = CommunicationManager(workers=2)
+    remote = RemoteAgent(WorkerProcessAgent, "test")
+    bus.register_agent("worker", remote)
+    try:
+        worker_pid = bus.call("worker", {"type": "pid"}, timeout=60)
+        assert worker_pid != os.getpid() and worker_pid == remote.pid
+        payload = {"blob": bytes(range(256)) * 4096, "n": [1, 2, 3]}
+        assert bus.call("worker", {"type": "echo", "payload": payload}, timeout=10) == payload
+        try:
+            bus.call("worker", {"type": "fail"}, timeout=10)
+            assert False, "remote exception not propagated"
+        except ValueError:
+            pass
+        print(f"✅ Requests served by worker process {worker_pid}; errors propagate")
+        
+        try:
+            bus.call("worker", {"type": "crash"}, timeout=10)
+            assert False, "expected the crash to surface"
+        except ConnectionError:
+            pass
+        restarted_pid = bus.call("worker", {"type": "pid"}, timeout=60)
+        assert restarted_pid != worker_pid and remote.restarts == 1
+        assert bus.stats()["worker"]["process"]["alive"]
+        print(f"✅ Crashed worker restarted as process {restarted_pid}")
+    finally:
+        bus.close()
+    assert not remote.is_alive() and not os.path.exists(remote.socket_path)
+
+def test_worker_pool():
+    """Test the pre-warmed process pool: snapshot-backed analysis, queue limits and timeouts"""
+    print("\n🏭 Testing Worker Process Pool...")
+    from price_tracker_agent import WorkerPool, pool_analyze_batch
+    
+    agent = PriceAnalysisAgent()
+    agent.ingest_prices([{"product_id": f"p{i}", "date": f"2025-08-{day:02d}", "price": 100 + i * day}
+                         for i in range(50) for day in range(1, 11)])
+    with tempfile.TemporaryDirectory() as tmp:
+        snapshot_path = os.path.join(tmp, "history.snap")
+        agent.save_snapshot(snapshot_path)
+        pool = WorkerPool(2, max_pending=2, timeout=10, snapshot_path=snapshot_path)
+        try:
+            pids = pool.warm_up()
+            assert pids and os.getpid() not in pids
+            
+            future = pool.submit(pool_analyze_batch, ["p3", "p7", "missing"], None)
+            assert pool.result(future) == agent.analyze_batch(["p3", "p7", "missing"])
+            print(f"✅ Workers {pids} analyze from the mapped snapshot, matching in-process results")
+            
+            # Workers remap a rewritten snapshot on their next task
+            agent.ingest_prices([{"product_id": "p3", "date": "2025-08-11", "price": 999}])
+            time.sleep(0.01)
+            agent.save_snapshot(snapshot_path)
+            refreshed = pool.result(pool.submit(pool_analyze_batch, ["p3"], None))
+            assert refreshed[0]["current_price"] == 999
+            
+            busy = [pool.submit(time.sleep, 0.5) for _ in range(2)]
+            assert pool.submit(time.sleep, 0) is None and pool.stats()["rejected"] == 1
+            try:
+                pool.result(busy[0], timeout=0.05)
+                assert False, "expected a timeout"
+            except TimeoutError:
+                pass
+            pool.result(busy[1])
+            stats = pool.stats()
+            assert stats["timeouts"] == 1 and stats["completed"] >= 3
+            print("✅ Saturated pool rejects new work; slow tasks time out for the caller")
+        finally:
+            pool.shutdown()
+
+def test_prefork_server():
+    """Test the pooled WSGI server, state shared across workers and pre-fork serve() with a graceful drain"""
+    print("\n🍴 Testing Pre-fork Serving...")
+    import http.client
+    from price_tracker_serving import PooledWSGIServer
+    
+    active, peak, completed, lock = [0], [0], [0], threading.Lock()
+    
+    def app(environ, start_response):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.2)
+        with lock:
+            active[0] -= 1
+            completed[0] += 1
+        start_response("200 OK", [("Content-Type", "text/plain"), ("Content-Length", "2")])
+        return [b"ok"]
+    
+    def get(port, results):
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+        try:
+            conn.request("GET", "/")
+            results.append(conn.getresponse().status)
+        except (OSError, http.client.HTTPException):
+            results.append(None)                           # not yet accepted when the server closed
+        finally:
+            conn.close()
+    
+    server = PooledWSGIServer("127.0.0.1", 0, app, threads=2)
+    port = server.server_address[1]
+    serving = threading.Thread(target=server.serve_forever)
+    serving.start()
+    results = []
+    clients = [threading.Thread(target=get, args=(port, results)) for _ in range(5)]
+    for client in clients:
+        client.start()
+    time.sleep(0.1)
+    server.shutdown()                                      # returns only after in-flight requests finish
+    serving.join()
+    assert active[0] == 0 and completed[0] >= 2
+    server.server_close()
+    for client in clients:
+        client.join()
+    assert peak[0] == 2 and results.count(200) == completed[0]
+    print(f"✅ Thread pool caps concurrency at {peak[0]}; shutdown drained {completed[0]} in-flight requests")
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        previous = CONFIG["session_db"]
+        CONFIG["session_db"] = os.path.join(tmp, "sessions.db")
+        try:
+            issuer, other = SecurityManager(), SecurityManager()
+            token = issuer.authenticate_user("admin", "admin123")
+            assert other.verify_token(token) and not SecurityManager().verify_token(token + "x")
+        finally:
+            CONFIG["session_db"] = previous
+        print("✅ Tokens issued by one worker are accepted by the others")
+        
+        # Insight jobs and SQLite-backed prices written by one process are visible to the others
+        jobs_db = os.path.join(tmp, "jobs.db")
+        llm = type("InstantLLM", (), {"analyze_price_trends": lambda self, data, timeout=None: "steady"})()
+        starter, other = InsightJobManager(llm, db_path=jobs_db), InsightJobManager(llm, db_path=jobs_db)
+        store = PriceHistoryStore()
+        store.add("e1", "2025-08-01", 5100)
+        job_id = starter.submit("e1", store["e1"])
+        assert other.wait(job_id, timeout=5)["llm_insights"] == "steady" and other.get(job_id)["status"] == "done"
+        assert other.get("missing") is None
+        starter.shutdown()
+        other.shutdown()
+        
+        prices_db = os.path.join(tmp, "prices.db")
+        writer = PriceAnalysisAgent(SQLitePriceStore(prices_db))
+        reader = PriceAnalysisAgent(SQLitePriceStore(prices_db))
+        writer.ingest_prices([{"product_id": "e1", "date": "2025-08-01", "price": 5100}])
+        reader.refresh_store()
+        assert reader.price_history["e1"].prices[-1] == 5100 and not reader.refresh_store()
+        writer.ingest_prices([{"product_id": "e1", "date": "2025-08-02", "price": 4900}])
+        assert reader.price_history["e1"].prices[-1] == 5100                  # still the cached series
+        assert reader.refresh_store() and reader.price_history["e1"].prices[-1] == 4900
+        writer.price_history.close()
+        reader.price_history.close()
+        print("✅ Insight jobs and SQLite price changes are visible across processes")
+        
+        fake_llm = ThreadingHTTPServer(("127.0.0.1", 0), FakeOpenAIHandler)
+        threading.Thread(target=fake_llm.serve_forever, daemon=True).start()
+        FakeOpenAIHandler.break_batches = False
+        try:
+            for backend, database_url in (("snapshot", ""), ("sqlite", f"sqlite:///{tmp}/served.db")):
+                pids = _check_prefork_server(tmp, fake_llm.server_port, database_url)
+                print(f"✅ {backend}: login, ingest and insight job all seen by {len(pids)} workers; "
+                      f"SIGTERM drained and removed the ready file")
+        finally:
+            fake_llm.shutdown()
+
+def _check_prefork_server(tmp: str, llm_port: int, database_url: str) -> set:
+    """Run ``price_tracker_agent.py`` with two workers and check that state written on one is seen by both"""
+    import signal
+    import socket
+    import http.client
+    
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    ready_file = os.path.join(tmp, "ready")
+    env = dict(os.environ, SERVER_WORKERS="2", SERVER_THREADS="2", HOST="127.0.0.1", PORT=str(port),
+               READY_FILE=ready_file, GRACEFUL_TIMEOUT="10", PRODUCT_VECTORS_PATH="", DATABASE_URL=database_url,
+               PRICE_SNAPSHOT_PATH=os.path.join(tmp, "prices.snap"), LLM_BATCH_WINDOW_MS="0",
+               OPENAI_API_KEY="test", OPENAI_BASE_URL=f"http://127.0.0.1:{llm_port}/v1")
+    server = subprocess.Popen([sys.executable, "price_tracker_agent.py"], env=env,
+                              cwd=os.path.dirname(os.path.abspath(__file__)),
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    
+    def call(conn, method, path, body=None):
+        payload = body if body is None or isinstance(body, str) else json.dumps(body)
+        conn.request(method, path, payload, {"Authorization": f"Bearer {token}", "Content-Type": "application/json"})
+        response = conn.getresponse()
+        return response.status, json.loads(response.read())
+    
+    try:
+        deadline = time.time() + 120
+        while not os.path.exists(ready_file):
+            assert server.poll() is None and time.time() < deadline, "server did not become ready"
+            time.sleep(0.2)
+        token = ""
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+        token = call(conn, "POST", "/api/auth/login", {"username": "admin", "password": "admin123"})[1]["token"]
+        status, ingested = call(conn, "POST", "/api/prices/ingest",
+                                '{"product_id": "e1", "date": "2030-01-01", "price": 4321}\n')
+        assert status == 200 and ingested["accepted"] == 1
+        status, analysis = call(conn, "GET", "/api/analyze/e1?async=1")
+        assert status == 202 and analysis["current_price"] == 4321
+        job_id = analysis["llm_job"]["id"]
+        conn.close()
+        
+        # Each fresh connection lands on either worker; keep-alive pins the follow-up requests to it
+        pids = set()
+        for _ in range(200):
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+            pid = call(conn, "GET", "/api/ready")[1]["pid"]
+            status, batch = call(conn, "POST", "/api/analyze/batch", {"product_ids": ["e1"]})
+            assert status == 200 and batch["results"][0]["current_price"] == 4321
+            status, job = call(conn, "GET", f"/api/jobs/{job_id}")
+            assert status == 200 and job["product_id"] == "e1"
+            conn.request("GET", f"/api/jobs/{job_id}/events?token={token}")
+            events = conn.getresponse().read().decode()
+            assert "event: done" in events and "single: " in events
+            conn.close()
+            pids.add(pid)
+            if len(pids) == 2:
+                break
+        assert len(pids) == 2 and server.pid not in pids
+        
+        server.send_signal(signal.SIGTERM)
+        assert server.wait(timeout=30) == 0 and not os.path.exists(ready_file)
+    finally:
+        if server.poll() is None:
+            server.kill()
+            server.wait()
+    return pids
+
+def test_pool_snapshot_refresh():
+    """Test that ingests re-snapshot for the pool instead of bypassing it for good"""
+    print("\n🔁 Testing Pool Snapshot Refresh...")
+    from price_tracker_agent import PriceTrackerSystem
+    
+    overrides = {"pool_workers": 1, "snapshot_debounce": 0.05, "product_vectors_path": "", "database_url": ""}
+    with tempfile.TemporaryDirectory() as tmp:
+        overrides["price_snapshot_path"] = os.path.join(tmp, "prices.snap")
+        previous = {key: CONFIG[key] for key in overrides}
+        CONFIG.update(overrides)
+        try:
+            system = PriceTrackerSystem()
+        finally:
+            CONFIG.update(previous)
+        try:
+            client = system.app.test_client()
+            token = client.post('/api/auth/login', json={"username": "admin", "password": "admin123"}).json["token"]
+            headers = {"Authorization": f"Bearer {token}"}
+            
+            ingested = client.post('/api/prices/ingest', headers=headers,
+                                   data='{"product_id": "e1", "date": "2030-01-01", "price": 1234}\n')
+            assert ingested.json["accepted"] == 1
+            batch = client.post('/api/analyze/batch', headers=headers, json={"product_ids": ["e1"]}).json
+            assert batch["results"][0]["current_price"] == 1234                # served in-process meanwhile
+            assert not client.get('/api/stats/pool', headers=headers).json["snapshot"]["in_sync"]
+            
+            deadline = time.time() + 5
+            while not client.get('/api/stats/pool', headers=headers).json["snapshot"]["in_sync"]:
+                assert time.time() < deadline, "snapshot was not refreshed"
+                time.sleep(0.05)
+            completed = system.worker_pool.stats()["completed"]
+            batch = client.post('/api/analyze/batch', headers=headers, json={"product_ids": ["e1"]}).json
+            assert batch["results"][0]["current_price"] == 1234
+            stats = client.get('/api/stats/pool', headers=headers).json
+            assert stats["completed"] == completed + 1 and stats["snapshot"]["batches_bypassed"] == 1
+            print(f"✅ Pool back in use after the debounced re-snapshot: {stats['snapshot']}")
+        finally:
+            system.shutdown()
+
+def test_agent_rpc():
+    """Test request/response over the bus: replies, deadlines, errors and thread fan-out"""
+    print("\n📞 Testing Agent Request/Response...")
+    from price_tracker_agent import CommunicationManager
+    
+    class EchoAgent:
+        def __init__(self, delay):
+            self.delay = delay
+            self.handled = 0
+        
+        async def handle_message(self, message_data):
+            message = message_data["message"]
+            await asyncio.sleep(message.get("delay", self.delay))
+            if message.get("fail"):
+                raise ValueError("bad request")
+            self.handled += 1
+            return {"echo": message["n"], "correlation_id": message_data["correlation_id"]}
+    
+    async def scenario():
+        bus = CommunicationManager(queue_size=100, workers=1)
+        echo = EchoAgent(0.0)
+        bus.register_agent("echo", echo)
+        processor = asyncio.create_task(bus.process_messages())
+        
+        replies = await asyncio.gather(*(bus.request("echo", {"n": n}, timeout=1) for n in range(5)))
+        assert [reply["echo"] for reply in replies] == list(range(5))
+        assert len({reply["correlation_id"] for reply in replies}) == 5
+        
+        try:
+            await bus.request("echo", {"n": 0, "fail": True}, timeout=1)
+            assert False, "handler error not propagated"
+        except ValueError:
+            pass
+        
+        # A request stuck behind a slow one expires in the queue and is never handled
+        slow = asyncio.create_task(bus.request("echo", {"n": 1, "delay": 0.2}, timeout=1))
+        await asyncio.sleep(0.01)
+        try:
+            await bus.request("echo", {"n": 2}, timeout=0.05)
+            assert False, "expected a timeout"
+        except TimeoutError:
+            pass
+        await slow
+        await bus.join()
+        stats = bus.stats()["echo"]["requests"]
+        assert stats["timeouts"] == 1 and stats["expired"] == 1 and echo.handled == 6
+        assert stats["count"] == 8 and stats["latency_ms"]["max"] >= 150
+        bus.stop()
+        await processor
+    
+    asyncio.run(scenario())
+    print("✅ Replies matched by correlation ID; errors propagate; expired requests are skipped")
+    
+    # Flask-style callers: blocking fan-out from a plain thread onto a background bus loop
+    bus = CommunicationManager(workers=1)
+    bus.register_agent("a", EchoAgent(0.1))
+    bus.register_agent("b", EchoAgent(0.1))
+    start = time.perf_counter()
+    first, second = bus.call_many([("a", {"n": 1}), ("b", {"n": 2})], timeout=2)
+    elapsed = time.perf_counter() - start
+    assert (first["echo"], second["echo"]) == (1, 2) and elapsed < 0.18
+    assert bus.call("a", {"n": 3})["echo"] == 3
+    bus.stop()
+    print(f"✅ Two 100 ms agents answered in parallel in {elapsed * 1000:.0f} ms")
+
 async def test_communication():
     """Test the communication system"""
     print("\n🌐 Testing Communication System...")
@@ -198,9 +1434,35 @@ def main():
     
     # Run tests
     test_price_analysis()
+    test_price_history_store()
+    test_batch_analysis()
+    test_streaming_ingest()
+    test_streaming_loader()
+    test_price_snapshot()
+    test_sqlite_price_store()
+    test_tiered_cache()
+    test_insight_jobs()
+    test_insight_batching()
+    test_import_time()
+    test_model_manager()
+    test_batched_summarization()
+    test_bulk_entity_extraction()
+    test_inference_profile()
+    test_nlp_cache()
     test_security()
+    test_token_store()
     test_information_retrieval()
+    test_retrieval_cache()
+    test_product_catalog()
+    test_search_index()
+    test_vector_similarity()
     test_data_loading()
+    test_message_bus()
+    test_worker_pool()
+    test_pool_snapshot_refresh()
+    test_agent_rpc()
+    test_remote_agent()
+    test_prefork_server()
     
     # Run async tests
     print("\n🔄 Running async tests...")